@@ -3,11 +3,19 @@ import pandas as pd
 import logging
 import os
 import sys
+import bisect
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 # Use the standard datetime library
 import datetime
-import altair as alt
 import json
 import numpy as np
+import storage # Shared SQLite connections (WAL, tuned pragmas)
+import migrations # Lot tables and their dimension tables
+import sale_calendar # Integer (year, sale_no) sale keys and their order
+import instrumentation # Stage spans (TEATRADE_TRACE)
+import shared_frames # DataFrames in shared memory for worker processes
+import report_json # Report JSON encoding (orjson when installed)
 
 # =============================================================================
 # Configuration (V12 - Absolute Paths)
@@ -24,6 +32,17 @@ DB_FILE = os.path.abspath(os.path.join(REPO_PATH, "market_reports.db"))
 DATA_OUTPUT_DIR = os.path.abspath(os.path.join(REPO_PATH, "report_data"))
 INDEX_FILE = os.path.join(DATA_OUTPUT_DIR, "mombasa_index.json")
 
+# Incremental builds: the input watermark each sale's report was built from (see report_input_watermarks)
+REPORT_BUILD_LOG_TABLE = 'report_build_log'
+# Bump when the report JSON changes, so that every report is rebuilt on the next run
+REPORT_BUILD_VERSION = 5
+
+# The chart specs are the same for every sale (the data is injected by name in the viewer), so they are written
+# once to a shared file that reports reference by version. Bump when a chart changes: the file of the new version
+# is then built on the next run, the only time altair is imported.
+CHART_SPEC_VERSION = 1
+# Relative to DATA_OUTPUT_DIR, as to the report files in the viewer
+CHART_SPEC_FILE = f"specs/v{CHART_SPEC_VERSION}.json"
 
 PRIMARY_COLOR = "#4285F4" # Google Blue
 LIGHTER_BLUE = "#a6c8ff"  # Lighter Blue (for inactive elements)
@@ -36,6 +55,29 @@ DATA_SOURCE_WEEK = 'source_sales_week'
 DATA_SOURCE_PREV_GRADE = 'source_prev_grade_metrics'
 DATA_SOURCE_PREV_BROKER = 'source_prev_broker_metrics'
 DATA_SOURCE_MOVEMENT = 'source_movement_data'
+# The candlestick's garden dropdown (its options are the sale's marks)
+CANDLESTICK_PARAM = 'garden_select'
+
+# The rows of the viewer's lot table (paged into shards, not a chart data source)
+DATA_SOURCE_LOT_TABLE = 'lot_table'
+
+# Compact (columnar) report data sources: only the columns the viewer uses (its charts and the lot table), as one
+# array per column. The text columns below are dictionary-encoded: indexes into the report's 'dictionaries'.
+REPORT_FORMAT = 'columnar'
+DATA_SOURCE_COLUMNS = {
+    DATA_SOURCE_WEEK: ['grade', 'broker', 'buyer', 'price', 'total_weight_kgs', 'value_usd'],
+    DATA_SOURCE_LOT_TABLE: ['mark', 'grade', 'lot_number', 'total_weight_kgs', 'price', 'buyer', 'broker'],
+    DATA_SOURCE_PREV_GRADE: ['grade', 'prev_avg_price'],
+    DATA_SOURCE_PREV_BROKER: ['broker', 'prev_total_value'],
+    DATA_SOURCE_MOVEMENT: ['mark', 'grade', 'open', 'close', 'high', 'low', 'change_pct', 'color'],
+}
+DICTIONARY_COLUMNS = ['mark', 'grade', 'buyer', 'broker']
+
+# Sharded reports: the report file is a summary (metadata, KPIs, tables, the small data sources) whose manifest
+# lists the data shards, written to a directory named after it and fetched by the viewer when needed
+SHARDED_DATA_SOURCES = {DATA_SOURCE_WEEK: 'lots', DATA_SOURCE_MOVEMENT: 'movement'}
+# Lots per lot table shard
+LOT_TABLE_PAGE_ROWS = 1000
 
 
 # Configure logging
@@ -43,7 +85,9 @@ DATA_SOURCE_MOVEMENT = 'source_movement_data'
 logging.basicConfig(level=logging.INFO, format='ANALYZER: %(levelname)s: %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
 
 NOISE_VALUES = {'NAN', 'NONE', '', '-', 'NIL', 'N/A', 'NULL', 'UNKNOWN'}
-alt.data_transformers.disable_max_rows()
+
+# altair, once load_altair() has imported it (only to build the shared chart specs)
+alt = None
 
 # =============================================================================
 # Helper Functions (Database, Cleaning, and Data Prep)
@@ -56,99 +100,173 @@ def connect_db():
     if not os.path.exists(DB_FILE):
         logging.warning(f"[DB_DIAGNOSTIC] Database file not found: {DB_FILE}. Analysis cannot proceed.");
         return None 
-    try: return sqlite3.connect(DB_FILE)
+    try: return storage.connect(DB_FILE)
     except sqlite3.Error as e:
         logging.error(f"Database connection error: {e}"); sys.exit(1)
 
 def clean_text_column(df, column_name):
     if column_name in df.columns:
+        if isinstance(df[column_name].dtype, pd.CategoricalDtype):
+            df[column_name] = clean_categorical_column(df[column_name])
+            return df
         df[column_name] = df[column_name].astype(str).str.strip().str.upper()
         df[column_name] = df[column_name].replace(NOISE_VALUES, pd.NA)
     return df
 
-def get_previous_week_df(sales_df_all, current_sale_number):
-    if sales_df_all.empty or current_sale_number is None:
-        return pd.DataFrame()
-    try:
-        # Ensure comparison is robust by casting both to string for safety
-        current_sale_str = str(current_sale_number)
-        previous_sales = sales_df_all[sales_df_all['sale_number'].astype(str) < current_sale_str]
-    except Exception as e:
-        logging.warning(f"Error during previous week comparison: {e}")
-        return pd.DataFrame()
-        
-    if not previous_sales.empty:
-        # Find the max sale number among the previous sales
-        previous_sale_number = previous_sales['sale_number'].max()
-        return sales_df_all[sales_df_all['sale_number'] == previous_sale_number]
-    return pd.DataFrame()
+def clean_categorical_column(series):
+    """
+    clean_text_column() for a Categorical: only the categories are cleaned, then rows are re-coded (categories that
+    clean to the same text merge; noise becomes missing). Categories stay sorted, so groupby and sort order match text columns.
+    """
+    categories = pd.Series(series.cat.categories.astype(str)).str.strip().str.upper()
+    categories = categories.where(~categories.isin(NOISE_VALUES))
+    category_codes, cleaned = pd.factorize(categories, sort=True)
+    codes = series.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, category_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=cleaned), index=series.index, name=series.name)
+
+def fill_categorical_column(series, value):
+    """fillna() for a Categorical, adding value as a category (in sorted position) if needed."""
+    if value not in series.cat.categories:
+        series = series.cat.set_categories(sorted([*series.cat.categories, value]))
+    return series.fillna(value)
+
+def table_exists(conn, name, types=('table', 'view')):
+    placeholders = ', '.join('?' for _ in types)
+    row = conn.execute(f"SELECT name FROM sqlite_master WHERE name = ? AND type IN ({placeholders})", (name, *types)).fetchone()
+    return row is not None
+
+def decode_dimension_columns(conn, df):
+    """
+    Builds broker/mark/grade/buyer as Categoricals from the <column>_id columns and the small dim_ tables,
+    instead of joining the text into every row.
+    """
+    for column, dim_table in migrations.DIMENSION_TABLES:
+        id_column = f"{column}_id"
+        if id_column not in df.columns:
+            continue
+        dimension = pd.read_sql_query(f"SELECT id, name FROM {dim_table}", conn)
+        # Missing ids (NULL, or not in the dimension) get code -1, i.e. a missing value
+        codes = pd.Index(dimension['id']).get_indexer(df[id_column])
+        df[column] = pd.Categorical.from_codes(codes, categories=dimension['name'])
+    return df
+
+def read_lot_table(conn, table_name):
+    """
+    Reads auction_sales or auction_offers. When the table is a view over a fact table, the fact rows are read with
+    their dimension ids (see decode_dimension_columns).
+    """
+    fact_table = migrations.FACT_TABLES.get(table_name)
+    if fact_table is None or not table_exists(conn, fact_table, types=('table',)):
+        return pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+
+    df = decode_dimension_columns(conn, pd.read_sql_query(f"SELECT * FROM {fact_table}", conn))
+    columns = migrations.LOT_TABLE_COLUMNS[table_name]
+    return df[[col for col in columns if col in df.columns]]
+
+def lot_columns(df, table_name):
+    """The columns of a lot view, plus the sale keys when the rows carry them (see label_calendar_sales)."""
+    return migrations.LOT_TABLE_COLUMNS[table_name] + [col for col in sale_calendar.SALE_KEY_COLUMNS if col in df.columns]
+
+def read_lots_table(conn):
+    """
+    Reads auction_lots once and returns (sales_df, offers_df): the rows of each role with the columns of its view.
+    """
+    df = decode_dimension_columns(conn, pd.read_sql_query(f"SELECT * FROM {migrations.LOTS_TABLE}", conn))
+    frames = []
+    for table_name in ['auction_sales', 'auction_offers']:
+        role_df = df[df[migrations.LOT_ROLES[table_name]] == 1]
+        frames.append(role_df[lot_columns(df, table_name)].reset_index(drop=True))
+    return tuple(frames)
 
 # *** UPDATED FUNCTION: Includes BLOB/Bytes decoding ***
 def fetch_data(conn):
     if conn is None: return pd.DataFrame(), pd.DataFrame()
     try:
-        # Check table existence
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='auction_sales';")
-        sales_exists = cursor.fetchone() is not None
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='auction_offers';")
-        offers_exists = cursor.fetchone() is not None
+        # Check table existence (views since the dimension tables migration)
+        sales_exists = table_exists(conn, 'auction_sales')
+        offers_exists = table_exists(conn, 'auction_offers')
 
         if not sales_exists and not offers_exists:
              logging.warning("Essential tables not found. Returning empty dataframes.")
              return pd.DataFrame(), pd.DataFrame()
 
-        sales_df = pd.read_sql_query("SELECT * FROM auction_sales", conn) if sales_exists else pd.DataFrame()
-        offers_df = pd.read_sql_query("SELECT * FROM auction_offers", conn) if offers_exists else pd.DataFrame()
-
-        # FIX: Robust numeric conversion handling potential BLOBs (bytes)
-        def robust_to_numeric(series):
-            # Check if the series contains bytes (often indicates BLOB storage)
-            if series.dtype == 'object' and series.apply(lambda x: isinstance(x, bytes)).any():
-                logging.info(f"[BLOB_FIX] Detected bytes (BLOB) in column '{series.name}'. Attempting to decode.")
-                try:
-                    # Decode bytes to string (e.g., b'40' -> '40'). Use errors='ignore' for safety.
-                    series = series.apply(lambda x: x.decode('utf-8', errors='ignore') if isinstance(x, bytes) else x)
-                except Exception as e:
-                    logging.error(f"[BLOB_FIX] Failed during decoding process for '{series.name}': {e}")
-            # Convert the resulting data (now strings or numbers) to numeric
-            return pd.to_numeric(series, errors='coerce')
-
-        sales_cols = ['price', 'quantity_kgs', 'package_count']
-        offers_cols = ['valuation_or_rp', 'quantity_kgs', 'package_count']
-
-        # CRITICAL: Ensure columns are numeric immediately upon fetching from DB.
-        for df, cols in [(sales_df, sales_cols), (offers_df, offers_cols)]:
-            for col in cols:
-                # Use the robust converter instead of the basic pd.to_numeric
-                if col in df.columns:
-                    # Apply the fix here
-                    df[col] = robust_to_numeric(df[col])
-
-        text_cols_common = ['mark', 'grade', 'broker', 'lot_number', 'sale_number', 'sale_date']
-        for df in [sales_df, offers_df]:
-            for col in text_cols_common: df = clean_text_column(df, col)
-
-        if 'buyer' in sales_df.columns: sales_df = clean_text_column(sales_df, 'buyer')
-
-        # Basic validation of keys
-        keys = ['broker', 'lot_number', 'sale_number', 'sale_date']
-        if not sales_df.empty and all(k in sales_df.columns for k in keys):
-            sales_df = sales_df.dropna(subset=keys)
-            if 'sale_number' in sales_df.columns: sales_df = sales_df[sales_df['sale_number'].notna()]
-
-        if not offers_df.empty and all(k in offers_df.columns for k in keys):
-            offers_df = offers_df.dropna(subset=keys)
-            if 'sale_number' in offers_df.columns: offers_df = offers_df[offers_df['sale_number'].notna()]
-
-        # Ensure sale_number is treated as a string consistently
-        if 'sale_number' in sales_df.columns: sales_df['sale_number'] = sales_df['sale_number'].astype(str)
-        if 'sale_number' in offers_df.columns: offers_df['sale_number'] = offers_df['sale_number'].astype(str)
-
-        return sales_df, offers_df
+        if table_exists(conn, migrations.LOTS_TABLE, types=('table',)):
+            sales_df, offers_df = read_lots_table(conn)
+        else:
+            sales_df = read_lot_table(conn, 'auction_sales') if sales_exists else pd.DataFrame()
+            offers_df = read_lot_table(conn, 'auction_offers') if offers_exists else pd.DataFrame()
+
+        return clean_lot_frames(sales_df, offers_df)
     except Exception as e:
         logging.error(f"Error fetching data: {e}", exc_info=True); sys.exit(1)
 
+# FIX: Robust numeric conversion handling potential BLOBs (bytes)
+def robust_to_numeric(series):
+    # Check if the series contains bytes (often indicates BLOB storage)
+    if series.dtype == 'object' and series.apply(lambda x: isinstance(x, bytes)).any():
+        logging.info(f"[BLOB_FIX] Detected bytes (BLOB) in column '{series.name}'. Attempting to decode.")
+        try:
+            # Decode bytes to string (e.g., b'40' -> '40'). Use errors='ignore' for safety.
+            series = series.apply(lambda x: x.decode('utf-8', errors='ignore') if isinstance(x, bytes) else x)
+        except Exception as e:
+            logging.error(f"[BLOB_FIX] Failed during decoding process for '{series.name}': {e}")
+    # Convert the resulting data (now strings or numbers) to numeric
+    return pd.to_numeric(series, errors='coerce')
+
+def clean_lot_frames(sales_df, offers_df):
+    """
+    Numeric conversion, text cleaning and key validation of the sales and offers rows as read from the database
+    (the whole history, or one sale from the query layer). Returns the cleaned (sales_df, offers_df).
+    """
+    sales_cols = ['price', 'quantity_kgs', 'package_count']
+    offers_cols = ['valuation_or_rp', 'quantity_kgs', 'package_count']
+
+    # CRITICAL: Ensure columns are numeric immediately upon fetching from DB.
+    for df, cols in [(sales_df, sales_cols), (offers_df, offers_cols)]:
+        for col in cols:
+            # Use the robust converter instead of the basic pd.to_numeric
+            if col in df.columns:
+                # Apply the fix here
+                df[col] = robust_to_numeric(df[col])
+
+    text_cols_common = ['mark', 'grade', 'broker', 'lot_number', 'sale_number', 'sale_date']
+    for df in [sales_df, offers_df]:
+        for col in text_cols_common: df = clean_text_column(df, col)
+
+    if 'buyer' in sales_df.columns: sales_df = clean_text_column(sales_df, 'buyer')
+
+    # Basic validation of keys
+    keys = ['broker', 'lot_number', 'sale_number', 'sale_date']
+    if not sales_df.empty and all(k in sales_df.columns for k in keys):
+        sales_df = sales_df.dropna(subset=keys)
+        if 'sale_number' in sales_df.columns: sales_df = sales_df[sales_df['sale_number'].notna()]
+
+    if not offers_df.empty and all(k in offers_df.columns for k in keys):
+        offers_df = offers_df.dropna(subset=keys)
+        if 'sale_number' in offers_df.columns: offers_df = offers_df[offers_df['sale_number'].notna()]
+
+    # Ensure sale_number is treated as a string consistently
+    if 'sale_number' in sales_df.columns: sales_df['sale_number'] = sales_df['sale_number'].astype(str)
+    if 'sale_number' in offers_df.columns: offers_df['sale_number'] = offers_df['sale_number'].astype(str)
+
+    return label_calendar_sales(sales_df), label_calendar_sales(offers_df)
+
+def label_calendar_sales(df):
+    """
+    Replaces sale_number by the calendar label ('2025-07') for rows whose sale has a year: stored '35' and '2025-35'
+    are the same report, and sales of different years no longer merge. The sale keys come from the rows when they
+    carry them (auction_lots), otherwise they are parsed here. Rows without a year keep their sale_number.
+    """
+    if df.empty or 'sale_number' not in df.columns:
+        return df
+    if not all(col in df.columns for col in sale_calendar.SALE_KEY_COLUMNS):
+        df = sale_calendar.assign_sale_keys(df)
+    years, sale_nos = df['sale_year'].astype('Int64'), df['sale_no'].astype('Int64')
+    labels = years.astype(str) + '-' + sale_nos.astype(str).str.zfill(2)
+    df['sale_number'] = labels.where(years.notna() & sale_nos.notna(), df['sale_number'])
+    return df.drop(columns=sale_calendar.SALE_KEY_COLUMNS)
+
 # Centralized Robust Total Weight Calculation (KGs * Packages) with Diagnostics
 # NOTE: This function's logic was already robust; it now benefits from the clean data provided by the updated fetch_data.
 def calculate_total_weight(df_raw, data_type="Data"):
@@ -227,7 +345,10 @@ def prepare_sales_data(sales_df_raw):
 
     analytical_cols = ['mark', 'grade', 'buyer', 'broker']
     for col in analytical_cols:
-        if col in sales_df.columns:
+        if col in sales_df.columns and isinstance(sales_df[col].dtype, pd.CategoricalDtype):
+            # Categoricals (dimension columns) keep their dtype, so groupbys work on integer codes
+            sales_df[col] = fill_categorical_column(sales_df[col], PLACEHOLDER)
+        elif col in sales_df.columns:
             sales_df[col] = sales_df[col].astype(str).fillna(PLACEHOLDER)
             sales_df[col] = sales_df[col].replace(['nan', '<NA>'], PLACEHOLDER)
         # Ensure columns exist even if missing in raw data
@@ -255,7 +376,7 @@ def prepare_offers_data(offers_df_raw):
 
 # ... (The rest of the script remains identical to the user's provided version) ...
 
-def analyze_kpis_and_forecast(sales_df_week, sales_df_all, sales_df_week_raw, offers_df_week):
+def analyze_kpis_and_forecast(sales_df_week, previous_sale, sales_df_week_raw, offers_df_week):
     kpis = {}; tables = {'sell_through': [], 'realization': []}
 
     # KPIs rely on the prepared 'sales_df_week' which now has the corrected 'total_weight_kgs'
@@ -268,11 +389,10 @@ def analyze_kpis_and_forecast(sales_df_week, sales_df_all, sales_df_week_raw, of
         kpis['TOTAL_VOLUME'] = f"{total_volume:,.0f}"; kpis['AVG_PRICE'] = f"${avg_price:.2f}"
 
         if not sales_df_week.empty:
-            current_sale_number = sales_df_week['sale_number'].iloc[0]
-            prev_week_df = get_previous_week_df(sales_df_all, current_sale_number)
-            if not prev_week_df.empty and 'value_usd' in prev_week_df.columns and 'total_weight_kgs' in prev_week_df.columns:
-                prev_volume = prev_week_df['total_weight_kgs'].sum()
-                prev_avg_price = prev_week_df['value_usd'].sum() / prev_volume if prev_volume > 0 else 0
+            # previous_sale: totals and metrics of the previous sale (see summarize_previous_sale), or None
+            if previous_sale is not None:
+                prev_volume = previous_sale['volume']
+                prev_avg_price = previous_sale['value_usd'] / prev_volume if prev_volume > 0 else 0
                 if prev_avg_price > 0:
                     change = ((avg_price - prev_avg_price) / prev_avg_price) * 100
                     kpis['PRICE_CHANGE_NUMERIC'] = change
@@ -599,7 +719,7 @@ def create_buyer_components():
 # Advanced Analysis (Candlestick and Insights)
 # =============================================================================
 
-def analyze_price_movements(sales_df_week, sales_df_all):
+def analyze_price_movements(sales_df_week, previous_sale):
     required_cols = ['price', 'total_weight_kgs', 'sale_number']
     if sales_df_week.empty or not all(c in sales_df_week.columns for c in required_cols):
         return pd.DataFrame(), "Awaiting current week data or missing key columns for trend analysis."
@@ -607,10 +727,7 @@ def analyze_price_movements(sales_df_week, sales_df_all):
     if sales_df_week.empty:
          return pd.DataFrame(), "Awaiting current week data for trend analysis."
          
-    current_sale_number = sales_df_week['sale_number'].iloc[0]
-    prev_week_df = get_previous_week_df(sales_df_all, current_sale_number)
-
-    if prev_week_df.empty or not all(c in prev_week_df.columns for c in required_cols):
+    if previous_sale is None:
         return pd.DataFrame(), "First sale recorded; no historical data for comparison."
 
     # Grouping by 'mark' and 'grade' which are guaranteed to exist now
@@ -618,7 +735,7 @@ def analyze_price_movements(sales_df_week, sales_df_all):
         close=('price', 'mean'), high=('price', 'max'), low=('price', 'min'), volume=('total_weight_kgs', 'sum')
     ).reset_index()
 
-    prev_metrics = prev_week_df.groupby(['mark', 'grade']).agg(open=('price', 'mean')).reset_index()
+    prev_metrics = previous_sale['mark_grade_metrics']
     movement_df = pd.merge(current_metrics, prev_metrics, on=['mark', 'grade'], how='inner')
     
     if movement_df.empty:
@@ -650,22 +767,21 @@ def analyze_price_movements(sales_df_week, sales_df_all):
     return movement_df, "\n".join(insights)
 
 
-def create_candlestick_chart(marks):
-    """Generates the Candlestick chart specification using named data."""
-    if not marks:
-        return {}
-
-    input_dropdown = alt.binding_select(options=marks, name='Select Garden: ')
+def create_candlestick_chart():
+    """
+    Generates the Candlestick chart specification using named data. The dropdown has no options here: the viewer
+    fills in the sale's marks (the report's candlestick_marks) and selects the first.
+    """
+    input_dropdown = alt.binding_select(options=[], name='Select Garden: ')
     
     # Define the selection parameter
     selection = alt.param(
-        name='garden_select',
+        name=CANDLESTICK_PARAM,
         select={
             'type': 'point',
             'fields': ['mark']
         },
-        bind=input_dropdown,
-        value=[{'mark': marks[0]}] # Initialize with the first mark
+        bind=input_dropdown
     )
 
     # Base chart definition
@@ -717,229 +833,694 @@ def create_candlestick_chart(marks):
 # Data Export and Forward Outlook
 # =============================================================================
 
-def generate_raw_data_export(sales_df_week):
-    if sales_df_week.empty: return []
-    cols_to_export = ['mark', 'grade', 'lot_number', 'total_weight_kgs', 'price', 'buyer', 'broker']
-    available_cols = [col for col in cols_to_export if col in sales_df_week.columns]
-    if not available_cols: return []
-    export_df = sales_df_week[available_cols].copy()
-    rename_map = {
-        'mark': 'Mark', 'grade': 'Grade', 'lot_number': 'Lot', 'total_weight_kgs': 'KGs',
-        'price': 'Price (USD)', 'buyer': 'Buyer', 'broker': 'Broker'
-    }
-    export_df = export_df.rename(columns=rename_map)
-    if 'Lot' in export_df.columns:
-        # Handle cases where Lot might be numeric or mixed types before converting to string
-        export_df['Lot'] = export_df['Lot'].fillna('').astype(str)
-
-    export_df = export_df.replace({np.nan: None})
-    return export_df.to_dict(orient='records')
-
-def generate_forecast_outlook(week_number, location, offers_df_all):
+def encode_data_sources(frames):
+    """
+    The data source frames in the compact report format: ({name: {'length': rows, 'columns': {column: values}}},
+    dictionaries). Only the DATA_SOURCE_COLUMNS are kept; DICTIONARY_COLUMNS hold indexes into their dictionary
+    (the sorted distinct values of that column across every source) and missing values are null.
+    """
+    frames = {name: df[[col for col in DATA_SOURCE_COLUMNS[name] if col in df.columns]] for name, df in frames.items()}
+    dictionaries = {}
+    for col in DICTIONARY_COLUMNS:
+        values = set()
+        for df in frames.values():
+            if col in df.columns:
+                values.update(df[col].dropna().unique().tolist())
+        dictionaries[col] = sorted(values)
+
+    data_sources = {}
+    for name, df in frames.items():
+        columns = {}
+        for col in df.columns:
+            if col in dictionaries:
+                # -1 for missing values; a categorical column is matched on its values, not its own categories
+                codes = pd.Index(dictionaries[col]).get_indexer(df[col].astype(object))
+                columns[col] = report_json.code_values(codes)
+            else:
+                columns[col] = report_json.column_values(df[col])
+        data_sources[name] = {'length': len(df), 'columns': columns}
+    return data_sources, dictionaries
+
+def page_data_source(source, page_rows):
+    """An encoded data source (encode_data_sources) split into sources of at most page_rows rows."""
+    return [{'length': min(page_rows, source['length'] - start),
+             'columns': {col: values[start:start + page_rows] for col, values in source['columns'].items()}}
+            for start in range(0, source['length'], page_rows)]
+
+def write_report_shards(shard_dir, shards, pretty=False):
+    """
+    Writes {shard name: payload} as DATA_OUTPUT_DIR/shard_dir/<name>.json and removes the other files of that
+    directory (shards of an earlier build). Returns {shard name: {'url', 'bytes'}}, URLs relative to DATA_OUTPUT_DIR.
+    """
+    directory = os.path.join(DATA_OUTPUT_DIR, shard_dir)
+    os.makedirs(directory, exist_ok=True)
+    written = {}
+    for name, payload in shards.items():
+        data = report_json.dumps(payload, pretty=pretty)
+        with open(os.path.join(directory, f"{name}.json"), 'wb') as f:
+            f.write(data)
+        written[name] = {'url': f"{shard_dir}/{name}.json", 'bytes': len(data)}
+    for stale in set(os.listdir(directory)) - {f"{name}.json" for name in shards}:
+        os.remove(os.path.join(directory, stale))
+    return written
+
+def generate_forecast_outlook(week_number, location, next_offers):
     outlook = {
         "next_sale": "N/A", "forthcoming_offerings_kgs": "Awaiting Catalogues",
         "weather_outlook": f"Seasonal weather patterns are prevailing in the key growing regions supplying {location}. Production levels are reported as stable.",
         "market_prediction": "Based on current demand trends, the market is expected to remain active. Buyers are advised to monitor global economic indicators and currency fluctuations which may impact pricing in the coming weeks."
     }
-    if not week_number or offers_df_all.empty or 'sale_number' not in offers_df_all.columns: return outlook
+    # next_offers: (next sale number with offers, its offered total weight), see neighbour_sales()
+    if not week_number or next_offers is None: return outlook
 
-    try:
-        current_week_str = str(week_number)
-        # Ensure comparison is string-based for 'YYYY-WW' format
-        future_sales = sorted([s for s in offers_df_all['sale_number'].dropna().unique() if str(s) > current_week_str])
-    except TypeError:
-        logging.warning("Could not compare sale numbers (type mismatch). Skipping forecast calculation."); return outlook
-
-    if future_sales:
-        next_sale_number = future_sales[0]
-        outlook["next_sale"] = str(next_sale_number)
-        next_week_offers = offers_df_all[offers_df_all['sale_number'] == next_sale_number]
-        if 'total_weight_kgs' in next_week_offers.columns:
-            forthcoming_volume = next_week_offers['total_weight_kgs'].sum()
-            if pd.notna(forthcoming_volume) and forthcoming_volume > 0:
-                outlook["forthcoming_offerings_kgs"] = f"{forthcoming_volume:,.0f}"
+    next_sale_number, forthcoming_volume = next_offers
+    outlook["next_sale"] = str(next_sale_number)
+    if forthcoming_volume is not None and pd.notna(forthcoming_volume) and forthcoming_volume > 0:
+        outlook["forthcoming_offerings_kgs"] = f"{forthcoming_volume:,.0f}"
     return outlook
 
 
 # =============================================================================
-# Main Processing Loop
+# Incremental Builds
 # =============================================================================
 
-def main():
-    logging.info("Starting Mombasa Data Analysis (V12 Comprehensive Diagnostics)...")
+def ensure_report_build_log(conn):
+    with storage.write_transaction(conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {REPORT_BUILD_LOG_TABLE} (
+                sale_number TEXT PRIMARY KEY, input_watermark TEXT NOT NULL, build_version INTEGER NOT NULL,
+                filename TEXT NOT NULL, index_entry TEXT NOT NULL, built_at TEXT NOT NULL
+            )
+        """)
+
+def load_report_builds(conn):
+    """sale_number -> (input_watermark, build_version, filename, index entry) of each sale's last build."""
+    rows = conn.execute(f"SELECT sale_number, input_watermark, build_version, filename, index_entry FROM {REPORT_BUILD_LOG_TABLE}")
+    return {sale: (watermark, version, filename, json.loads(entry)) for sale, watermark, version, filename, entry in rows}
+
+def record_report_builds(conn, builds):
+    """Stores (sale_number, input_watermark, filename, index entry) for the reports written by this run."""
+    built_at = datetime.datetime.now().isoformat()
+    rows = [(sale, watermark, REPORT_BUILD_VERSION, filename, json.dumps(entry, default=str), built_at)
+            for sale, watermark, filename, entry in builds]
+    with storage.write_transaction(conn):
+        conn.executemany(f"INSERT OR REPLACE INTO {REPORT_BUILD_LOG_TABLE} VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+def report_input_watermarks(history):
+    """
+    sale_number -> the input watermark of its report: the watermarks of the sale's own lots, of the previous sale
+    with sales (week-over-week comparisons) and of the next sale with offers (the outlook).
+    A change to a sale therefore also rebuilds the report of the sale after it.
+    """
+    sales_marks, offers_marks = history['sales_watermarks'], history['offers_watermarks']
+    watermarks = {}
+    for week in history['weeks']:
+        previous_sale, next_offers = neighbour_sales(history, week)
+        watermarks[week] = json.dumps({
+            'sales': sales_marks.get(week), 'offers': offers_marks.get(week),
+            'previous_sale': [previous_sale, sales_marks.get(previous_sale)],
+            'next_offers': [next_offers, offers_marks.get(next_offers)],
+        })
+    return watermarks
 
-    # V12: Ensure the output directory exists
-    if not os.path.exists(DATA_OUTPUT_DIR):
-        try:
-            os.makedirs(DATA_OUTPUT_DIR)
-            logging.info(f"[DIAGNOSTIC] Created output directory: {DATA_OUTPUT_DIR}")
-        except OSError as e:
-            logging.error(f"Could not create output directory {DATA_OUTPUT_DIR}: {e}")
-            sys.exit(1)
+# =============================================================================
+# Report Inputs (whole history in memory: --in-memory)
+# =============================================================================
+# A history is a dict of sale lists shared by both input paths: 'weeks' (every sale to report), 'sale_order' (sale ->
+# integer calendar key, None when the sale has no year), 'sales_weeks' and 'offers_weeks' (calendar sales with
+# prepared sales/offers rows, in calendar order), per-sale watermarks
+# ('rows@latest processed_timestamp' of the lots passing key validation) for each role and 'offers_volume'
+# (offered total weight per sale). The in-memory history also holds the rows partitioned by sale.
 
-    conn = connect_db()
-    # Fetch raw data from the database
-    sales_df_raw, offers_df_raw = fetch_data(conn)
-    
+def sale_watermarks(df):
+    """
+    sale_number -> 'rows@latest processed_timestamp' of a lot frame. Inserted and rewritten lots carry the ingest
+    timestamp, so the watermark moves whenever a sale gains, loses or changes lots.
+    """
+    if df.empty or 'sale_number' not in df.columns or 'processed_timestamp' not in df.columns:
+        return {}
+    stats = df.groupby('sale_number').agg(rows=('sale_number', 'size'), latest=('processed_timestamp', 'max'))
+    return {sale: f"{row.rows}@{row.latest}" for sale, row in stats.iterrows()}
+
+def calendar_order(weeks, sale_order):
+    """The sales of weeks that are in the calendar (sale_order: sale -> integer order key), in calendar order."""
+    return sorted((week for week in weeks if sale_order.get(week) is not None), key=sale_order.__getitem__)
+
+def neighbour_sales(history, week):
+    """
+    (previous sale with sales, next sale with offers) of a sale in calendar order, either None; by bisection of the
+    ordered sale lists on their integer keys. Sales not in the calendar (no year) have no neighbours.
+    """
+    sale_order = history['sale_order']
+    key = sale_order.get(week)
+    if key is None:
+        return None, None
+    sales_weeks, offers_weeks = history['sales_weeks'], history['offers_weeks']
+    position = bisect.bisect_left(sales_weeks, key, key=sale_order.__getitem__)
+    previous_sale = sales_weeks[position - 1] if position > 0 else None
+    position = bisect.bisect_right(offers_weeks, key, key=sale_order.__getitem__)
+    next_offers = offers_weeks[position] if position < len(offers_weeks) else None
+    return previous_sale, next_offers
+
+def partition_by_sale(df):
+    """
+    (sale_number -> the sale's rows, empty frame with the same columns) from a single groupby, so a sale's rows are a
+    dict lookup instead of a boolean mask over the whole history.
+    """
+    if df.empty or 'sale_number' not in df.columns:
+        return {}, pd.DataFrame()
+    return dict(tuple(df.groupby('sale_number', sort=False))), df.iloc[:0]
+
+def load_history(conn):
+    """Reads and prepares the whole history once (the analyzer before the query layer), partitioned by sale."""
+    with instrumentation.span('analyze.fetch') as span:
+        sales_df_raw, offers_df_raw = fetch_data(conn)
+        span.count('sales_rows', len(sales_df_raw))
+        span.count('offers_rows', len(offers_df_raw))
+    return build_history(sales_df_raw, offers_df_raw)
+
+def build_history(sales_df_raw, offers_df_raw):
+    """The history of read_history_sale() from the cleaned sales and offers rows of every sale."""
     # Prepare (Clean and Calculate) the data
     # This step includes the calculation fixes and diagnostics.
-    sales_df_all = prepare_sales_data(sales_df_raw)
-    offers_df_all = prepare_offers_data(offers_df_raw)
+    with instrumentation.span('analyze.prepare'):
+        sales_df_all = prepare_sales_data(sales_df_raw)
+        offers_df_all = prepare_offers_data(offers_df_raw)
 
-    # Determine unique weeks present in the data
-    all_weeks = []
-    if 'sale_number' in sales_df_raw.columns and not sales_df_raw.empty:
-        all_weeks.extend(sales_df_raw['sale_number'].dropna().unique())
-    if 'sale_number' in offers_df_raw.columns and not offers_df_raw.empty:
-        all_weeks.extend(offers_df_raw['sale_number'].dropna().unique())
+    with instrumentation.span('analyze.partition'):
+        sales_raw_parts = partition_by_sale(sales_df_raw)
+        sales_parts = partition_by_sale(sales_df_all)
+        offers_parts = partition_by_sale(offers_df_all)
 
-    # Ensure consistent sorting (string sort is safest for 'YYYY-WW' format)
-    all_weeks = sorted([str(w) for w in list(set(all_weeks))])
+    # Every sale with cleaned rows in either role; string sort as the query layer
+    all_weeks = set(sales_raw_parts[0])
+    if not offers_df_raw.empty and 'sale_number' in offers_df_raw.columns:
+        all_weeks.update(offers_df_raw['sale_number'].dropna().unique())
+    all_weeks = sorted(str(week) for week in all_weeks)
 
-    if len(all_weeks) == 0:
-        logging.info("No sale data found in database. Exiting."); return
+    offers_volume = {}
+    if 'total_weight_kgs' in offers_df_all.columns:
+        offers_volume = offers_df_all.groupby('sale_number', sort=False)['total_weight_kgs'].sum().to_dict()
 
-    report_index = []
+    # Calendar labels carry their (year, sale_no)
+    sale_order = {week: sale_calendar.parse_sale_key(week) for week in all_weeks}
 
-    # Process each week individually
-    for week_number in all_weeks:
-        # Ensure week_number is treated as a string for consistent filtering
-        week_number_str = str(week_number)
-        logging.info(f"Processing Sale: {week_number_str}")
-
-        # Filter data for the specific week
-        # Note: We pass the RAW dataframes here for specific needs (like sell-through calculation)
-        sales_week_raw = sales_df_raw[sales_df_raw['sale_number'] == week_number_str] if not sales_df_raw.empty else pd.DataFrame()
-        
-        # We use the PREPARED dataframes for analysis
-        offers_week = offers_df_all[offers_df_all['sale_number'] == week_number_str] if not offers_df_all.empty else pd.DataFrame()
-        sales_week = sales_df_all[sales_df_all['sale_number'] == week_number_str] if not sales_df_all.empty else pd.DataFrame()
-
-        # Metadata
-        location = 'Mombasa'; week_date = "Unknown"; year = "Unknown"
-        # Try getting date from sales data first (using raw as it's more likely to have the date even if filtered out later)
-        if not sales_week_raw.empty and 'sale_date' in sales_week_raw.columns and not sales_week_raw['sale_date'].dropna().empty:
-             week_date = sales_week_raw['sale_date'].dropna().iloc[0]
-        # Fallback to offers data
-        elif not offers_week.empty and 'sale_date' in offers_week.columns and not offers_week['sale_date'].dropna().empty:
-            week_date = offers_week['sale_date'].dropna().iloc[0]
-
-        if week_date != "Unknown" and week_date is not pd.NA and week_date:
-            try: year = pd.to_datetime(week_date).year
-            except Exception as e: logging.warning(f"Could not parse date '{week_date}': {e}")
-
-        try: 
-            # Attempt to extract the numerical week part (e.g., 39 from 2025-39)
-            sale_num_only = int(week_number_str.split('-')[1])
-        except (IndexError, ValueError): 
-            sale_num_only = week_number_str
-
-        # Run Analysis (KPIs and Forecast)
-        kpis, forecast_tables = analyze_kpis_and_forecast(sales_week, sales_df_all, sales_week_raw, offers_week)
-
-        # Advanced Analysis
-        movement_data, analytical_insights = analyze_price_movements(sales_week, sales_df_all)
-
-        # Calculate Historical Metrics (Needed for data sources)
-        prev_week_df = get_previous_week_df(sales_df_all, week_number_str)
+    return {
+        'weeks': all_weeks, 'sale_order': sale_order,
+        'sales_weeks': calendar_order(sales_parts[0], sale_order), 'offers_weeks': calendar_order(offers_parts[0], sale_order),
+        'sales_watermarks': sale_watermarks(sales_df_raw), 'offers_watermarks': sale_watermarks(offers_df_raw),
+        'sales_raw_parts': sales_raw_parts, 'sales_parts': sales_parts, 'offers_parts': offers_parts,
+        'offers_volume': offers_volume,
+    }
+
+def summarize_previous_sale(prev_week_df):
+    """
+    What a report uses of the previous sale: total volume and value, mean price per grade and per mark/grade, and
+    total value per broker. None when there is no previous sale.
+    """
+    if prev_week_df.empty:
+        return None
+    # Columns 'grade', 'price', 'broker', 'value_usd' are ensured by prepare_sales_data
+    return {
+        'volume': prev_week_df['total_weight_kgs'].sum(),
+        'value_usd': prev_week_df['value_usd'].sum(),
+        'grade_metrics': prev_week_df.groupby('grade').agg(prev_avg_price=('price', 'mean')).reset_index(),
+        'broker_metrics': prev_week_df.groupby('broker').agg(prev_total_value=('value_usd', 'sum')).reset_index(),
+        'mark_grade_metrics': prev_week_df.groupby(['mark', 'grade']).agg(open=('price', 'mean')).reset_index(),
+    }
+
+def sale_partition(parts, week_number_str):
+    partitions, empty = parts
+    return partitions.get(week_number_str, empty)
+
+def read_history_sale(conn, history, week_number_str):
+    """
+    (sales_week_raw, sales_week, offers_week, previous sale summary, next offers) of one sale, from the history
+    in memory. sales_week_raw is cleaned but not prepared (sell-through counts every lot sold).
+    """
+    # Note: We pass the RAW rows here for specific needs (like sell-through calculation)
+    sales_week_raw = sale_partition(history['sales_raw_parts'], week_number_str)
+
+    # We use the PREPARED rows for analysis
+    offers_week = sale_partition(history['offers_parts'], week_number_str)
+    sales_week = sale_partition(history['sales_parts'], week_number_str)
+
+    previous_sale, next_offers = neighbour_sales(history, week_number_str)
+    if previous_sale is not None:
+        previous_sale = summarize_previous_sale(sale_partition(history['sales_parts'], previous_sale))
+    if next_offers is not None:
+        next_offers = (next_offers, history['offers_volume'].get(next_offers))
+    return sales_week_raw, sales_week, offers_week, previous_sale, next_offers
+
+# =============================================================================
+# Query Layer (SQL pushdown, the default)
+# =============================================================================
+# Figures spanning sales (per-sale totals and watermarks, the next sale's offered weight) come from grouped queries over
+# auction_lots; lot-level rows are read only for the sale being rendered and the sale before it (its metrics), so a run
+# does not load the history. The SQL filters mirror clean_lot_frames() and prepare_sales_data()/prepare_offers_data();
+# stored sale numbers are cleaned in Python by the same functions. Sales are identified and
+# ordered by the integer sale keys of sale_calendar (migration 5).
+
+# Characters str.strip() removes that TRIM() does not by default
+SQL_WHITESPACE = "char(32, 9, 10, 11, 12, 13)"
+# Total weight and price as calculate_total_weight()/robust_to_numeric() compute them (missing package count -> 1)
+SQL_LOT_WEIGHT = "CAST(l.quantity_kgs AS REAL) * MAX(COALESCE(CAST(l.package_count AS REAL), 1), 1)"
+SQL_LOT_PRICE = "CAST(l.price AS REAL)"
+# Role flag and the prepare_* row filter of each lot view
+SQL_PREPARED_LOTS = {
+    'auction_sales': ('sold', f"{SQL_LOT_WEIGHT} > 0 AND {SQL_LOT_PRICE} > 0"),
+    'auction_offers': ('listed', f"{SQL_LOT_WEIGHT} > 0"),
+}
+
+def valid_text_sql(expr):
+    """SQL condition: expr is not missing after clean_text_column() (NULL or a NOISE_VALUES entry)."""
+    noise = ', '.join(f"'{value}'" for value in sorted(NOISE_VALUES))
+    return f"({expr} IS NOT NULL AND UPPER(TRIM(CAST({expr} AS TEXT), {SQL_WHITESPACE})) NOT IN ({noise}))"
+
+def valid_lots_sql(role):
+    """FROM/WHERE of the lots of a role that pass the key validation of clean_lot_frames()."""
+    keys = ' AND '.join(valid_text_sql(expr) for expr in ['b.name', 'l.lot_number', 'l.sale_number', 'l.sale_date'])
+    return (f"FROM {migrations.LOTS_TABLE} l LEFT JOIN dim_broker b ON b.id = l.broker_id "
+            f"WHERE l.{role} = 1 AND {keys}")
+
+def clean_sale_numbers(values):
+    """Stored sale_number values -> the analyzer's sale numbers (clean_text_column, then str); missing -> None."""
+    cleaned = clean_text_column(pd.DataFrame({'sale_number': pd.Series(values, dtype=object)}), 'sale_number')['sale_number']
+    return [None if pd.isna(value) else str(value) for value in cleaned]
+
+def query_history(conn):
+    """
+    The history of query_sale(): per-sale totals from one grouped query per lot view, grouped on the integer sale
+    keys (lots without a year: on the stored sale_number). Also keeps, per sale, the SQL filter that reads its lots
+    (an indexed (sale_year, sale_no) lookup) and the offered weight of each sale (the outlook of the sale before it).
+    Calendar sales are ordered by their sale_calendar ordinal.
+    """
+    history = {'weeks': set(), 'sale_order': {}}
+    ordinals = sale_calendar.load_ordinals(conn)
+    with instrumentation.span('analyze.query_history'):
+        for table_name, prefix in [('auction_sales', 'sales'), ('auction_offers', 'offers')]:
+            role, prepared = SQL_PREPARED_LOTS[table_name]
+            stats = pd.read_sql_query(f"""
+                SELECT l.sale_year, l.sale_no, CASE WHEN l.sale_year IS NULL THEN l.sale_number END AS stored_sale_number,
+                       COUNT(*) AS lot_rows, MAX(l.processed_timestamp) AS latest,
+                       SUM({prepared}) AS prepared_rows, SUM(CASE WHEN {prepared} THEN {SQL_LOT_WEIGHT} END) AS volume
+                {valid_lots_sql(role)}
+                GROUP BY l.sale_year, l.sale_no, stored_sale_number
+            """, conn)
+            keyed = stats['sale_year'].notna() & stats['sale_no'].notna()
+            stats['sale_number'] = [
+                sale_calendar.sale_label(year, sale_no) if is_keyed else sale_number
+                for is_keyed, year, sale_no, sale_number
+                in zip(keyed, stats['sale_year'], stats['sale_no'], clean_sale_numbers(stats['stored_sale_number']))]
+            stats = stats.dropna(subset=['sale_number'])
+            grouped = stats.groupby('sale_number').agg(
+                year=('sale_year', 'first'), sale_no=('sale_no', 'first'), stored=('stored_sale_number', list),
+                lot_rows=('lot_rows', 'sum'), latest=('latest', 'max'), prepared_rows=('prepared_rows', 'sum'),
+                volume=('volume', 'sum'))
+
+            filters = {}
+            for sale, row in grouped.iterrows():
+                if pd.notna(row.year):
+                    key = (int(row.year), int(row.sale_no))
+                    history['sale_order'][sale] = ordinals.get(key)
+                    filters[sale] = ("l.sale_year = ? AND l.sale_no = ?", list(key))
+                else:
+                    history['sale_order'][sale] = None
+                    placeholders = ', '.join('?' for _ in row.stored)
+                    filters[sale] = (f"l.sale_year IS NULL AND l.sale_number IN ({placeholders})", list(row.stored))
+            history['weeks'].update(grouped.index)
+            history[f'{prefix}_weeks'] = calendar_order(grouped.index[grouped['prepared_rows'] > 0], history['sale_order'])
+            history[f'{prefix}_watermarks'] = {sale: f"{row.lot_rows}@{row.latest}" for sale, row in grouped.iterrows()}
+            history[f'{prefix}_filters'] = filters
+            history[f'{prefix}_volume'] = grouped['volume'].to_dict()
+    history['weeks'] = sorted(history['weeks'])
+    return history
+
+def query_sale_lots(conn, table_name, sale_filter):
+    """The rows of one lot view matching a sale's filter (see query_history), as read_lots_table() returns them (in id order)."""
+    role = migrations.LOT_ROLES[table_name]
+    where, params = sale_filter or ('0', [])
+    df = pd.read_sql_query(f"SELECT * FROM {migrations.LOTS_TABLE} l WHERE l.{role} = 1 AND {where} ORDER BY l.id",
+                           conn, params=params)
+    df = decode_dimension_columns(conn, df)
+    return df[lot_columns(df, table_name)].reset_index(drop=True)
+
+def query_previous_sale(conn, sale_filter):
+    """
+    summarize_previous_sale() of the previous sale's lots, read like the sale's own (query_sale_lots). Its means are
+    computed by pandas as in the in-memory analysis: a mean from SQL sums can differ in the last bit, which turns an
+    unchanged mark/grade price into a fall in the movement data.
+    """
+    sales_df_raw, _ = clean_lot_frames(query_sale_lots(conn, 'auction_sales', sale_filter), pd.DataFrame())
+    return summarize_previous_sale(prepare_sales_data(sales_df_raw))
+
+def query_sale(conn, history, week_number_str):
+    """read_history_sale() through the query layer: reads the sale's own lots, and aggregates for its neighbours."""
+    sales_df_raw, offers_df_raw = clean_lot_frames(
+        query_sale_lots(conn, 'auction_sales', history['sales_filters'].get(week_number_str)),
+        query_sale_lots(conn, 'auction_offers', history['offers_filters'].get(week_number_str)))
+    sales_week = prepare_sales_data(sales_df_raw)
+    offers_week = prepare_offers_data(offers_df_raw)
+
+    previous_sale, next_offers = neighbour_sales(history, week_number_str)
+    if previous_sale is not None:
+        previous_sale = query_previous_sale(conn, history['sales_filters'][previous_sale])
+    if next_offers is not None:
+        next_offers = (next_offers, history['offers_volume'][next_offers])
+    return sales_df_raw, sales_week, offers_week, previous_sale, next_offers
+
+# =============================================================================
+# Shared Chart Specs
+# =============================================================================
+
+def load_altair():
+    """Imports altair on first use (it adds seconds to startup, and is only needed to build the chart specs)."""
+    global alt
+    if alt is None:
+        import altair
+        altair.data_transformers.disable_max_rows()
+        alt = altair
+    return alt
+
+def build_chart_specs():
+    """The specs of every report chart, by the chart keys of the viewer. The candlestick is the empty-dropdown template."""
+    load_altair()
+    interactive_components = create_interactive_analysis_components()
+    buyer_components = create_buyer_components()
+    return {
+        'interactive_distribution': interactive_components['distribution'],
+        'interactive_grade': interactive_components['grade'],
+        'interactive_broker': interactive_components['broker'],
+        'buyers_main': buyer_components['main'],
+        'buyers_breakdown': buyer_components['breakdown'],
+        'candlestick': create_candlestick_chart(),
+    }
+
+def ensure_chart_specs():
+    """Writes the shared chart specs of CHART_SPEC_VERSION unless the file exists already. Returns its path."""
+    path = os.path.join(DATA_OUTPUT_DIR, *CHART_SPEC_FILE.split('/'))
+    if os.path.exists(path):
+        return path
+    with instrumentation.span('analyze.chart_specs'):
+        payload = report_json.dumps({'version': CHART_SPEC_VERSION, 'charts': build_chart_specs()}, pretty=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written atomically (temporary file + rename): a report must never reference a partial spec file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(temp_path, path)
+    logging.info(f"[CHARTS] Wrote chart specs v{CHART_SPEC_VERSION}: {path}")
+    return path
+
+# =============================================================================
+# Report Build
+# =============================================================================
+
+def build_report(week_number_str, inputs, pretty=False):
+    """
+    Analyses one sale from its read_sale() inputs and writes its report JSON (indented when pretty).
+    Returns (filename, index entry), or None when the report could not be saved.
+    """
+    sales_week_raw, sales_week, offers_week, previous_sale, next_offers = inputs
+
+    # Metadata
+    location = 'Mombasa'; week_date = "Unknown"; year = "Unknown"
+    # Try getting date from sales data first (using raw as it's more likely to have the date even if filtered out later)
+    if not sales_week_raw.empty and 'sale_date' in sales_week_raw.columns and not sales_week_raw['sale_date'].dropna().empty:
+         week_date = sales_week_raw['sale_date'].dropna().iloc[0]
+    # Fallback to offers data
+    elif not offers_week.empty and 'sale_date' in offers_week.columns and not offers_week['sale_date'].dropna().empty:
+        week_date = offers_week['sale_date'].dropna().iloc[0]
+
+    if week_date != "Unknown" and week_date is not pd.NA and week_date:
+        try: year = pd.to_datetime(week_date).year
+        except Exception as e: logging.warning(f"Could not parse date '{week_date}': {e}")
+
+    try: 
+        # Attempt to extract the numerical week part (e.g., 39 from 2025-39)
+        sale_num_only = int(week_number_str.split('-')[1])
+    except (IndexError, ValueError): 
+        sale_num_only = week_number_str
+
+    # Run Analysis (KPIs and Forecast)
+    with instrumentation.span('analyze.kpis', sale=week_number_str):
+        kpis, forecast_tables = analyze_kpis_and_forecast(sales_week, previous_sale, sales_week_raw, offers_week)
+
+    # Advanced Analysis
+    with instrumentation.span('analyze.movements', sale=week_number_str):
+        movement_data, analytical_insights = analyze_price_movements(sales_week, previous_sale)
+
+    # Calculate Historical Metrics (Needed for data sources)
+    with instrumentation.span('analyze.history', sale=week_number_str):
         prev_week_grade_metrics = pd.DataFrame()
         prev_week_broker_metrics = pd.DataFrame()
 
-        if not prev_week_df.empty:
-            # Columns 'grade', 'price', 'broker', 'value_usd' are ensured by prepare_sales_data
-            prev_week_grade_metrics = prev_week_df.groupby('grade').agg(
-                prev_avg_price=('price', 'mean')
-            ).reset_index()
-            
-            prev_week_broker_metrics = prev_week_df.groupby('broker').agg(
-                prev_total_value=('value_usd', 'sum')
-            ).reset_index()
+        if previous_sale is not None:
+            prev_week_grade_metrics = previous_sale['grade_metrics']
+            prev_week_broker_metrics = previous_sale['broker_metrics']
 
+    with instrumentation.span('analyze.charts', sale=week_number_str):
         # Calculate unique marks for the candlestick dropdown
         unique_marks = []
         if not movement_data.empty and 'mark' in movement_data.columns:
              unique_marks = sorted([m for m in movement_data['mark'].unique().tolist() if m != PLACEHOLDER])
 
 
-        # Generate Charts (Structural definition only)
-        charts = {}
-        
-        # Interactive Analysis Components
-        interactive_components = create_interactive_analysis_components()
-        charts['interactive_distribution'] = interactive_components['distribution']
-        charts['interactive_grade'] = interactive_components['grade']
-        charts['interactive_broker'] = interactive_components['broker']
-        
-        # Buyer Components
-        buyer_components = create_buyer_components()
-        charts['buyers_main'] = buyer_components['main']
-        charts['buyers_breakdown'] = buyer_components['breakdown']
-
-        # Candlestick (Pass the unique marks for the dropdown)
-        charts['candlestick'] = create_candlestick_chart(unique_marks)
+        # Charts: the shared specs (CHART_SPEC_FILE), and the marks of the candlestick dropdown
+        charts = {'spec_version': CHART_SPEC_VERSION, 'spec_file': CHART_SPEC_FILE, 'candlestick_marks': unique_marks}
 
+    with instrumentation.span('analyze.tables', sale=week_number_str):
         tables = {
             'sell_through': forecast_tables['sell_through'],
-            'realization': forecast_tables['realization'],
-            'raw_sales_data': generate_raw_data_export(sales_week)
-        }
-        
-        outlook = generate_forecast_outlook(week_number_str, location, offers_df_all)
-
-        # Prepare data sources for embedding
-        # Convert dataframes to records (list of dictionaries) for efficient JSON storage
-        # We must handle potential NaN values during conversion for JSON compatibility.
-        data_sources = {
-            DATA_SOURCE_WEEK: sales_week.replace({np.nan: None}).to_dict(orient='records'),
-            DATA_SOURCE_PREV_GRADE: prev_week_grade_metrics.replace({np.nan: None}).to_dict(orient='records'),
-            DATA_SOURCE_PREV_BROKER: prev_week_broker_metrics.replace({np.nan: None}).to_dict(orient='records'),
-            DATA_SOURCE_MOVEMENT: movement_data.replace({np.nan: None}).to_dict(orient='records')
+            'realization': forecast_tables['realization']
         }
+    
+        outlook = generate_forecast_outlook(week_number_str, location, next_offers)
+
+    # Prepare data sources for embedding, column-oriented (see encode_data_sources)
+    with instrumentation.span('analyze.records', sale=week_number_str):
+        data_sources, dictionaries = encode_data_sources({
+            DATA_SOURCE_WEEK: sales_week,
+            DATA_SOURCE_PREV_GRADE: prev_week_grade_metrics,
+            DATA_SOURCE_PREV_BROKER: prev_week_broker_metrics,
+            DATA_SOURCE_MOVEMENT: movement_data,
+            DATA_SOURCE_LOT_TABLE: sales_week
+        })
+        # The lots, the movement data and the lot table pages go to shards; the metric sources stay in the summary
+        shards = {SHARDED_DATA_SOURCES[name]: data_sources.pop(name) for name in SHARDED_DATA_SOURCES}
+        table_pages = page_data_source(data_sources.pop(DATA_SOURCE_LOT_TABLE), LOT_TABLE_PAGE_ROWS)
+        shards.update((f"table_{page:03d}", source) for page, source in enumerate(table_pages))
+
+
+    # Structure the report data
+    report_data = {
+        'report_format': REPORT_FORMAT,
+        'metadata': {
+            'sale_number': week_number_str,
+            'sale_date': week_date, 'location': location,
+            'year': year, 'sale_num_only': sale_num_only, 'generated_at': datetime.datetime.now().isoformat()
+        },
+        'kpis': kpis,
+        'insights': analytical_insights,
+        'charts': charts,
+        'tables': tables,
+        'outlook': outlook,
+        'data_sources': data_sources, # Add the centralized data sources
+        'dictionaries': dictionaries
+    }
 
+    # Save the report JSON files: the shards first, then the summary that lists them
+    report_name = f"mombasa_{week_number_str.replace('-', '_')}"
+    filename = f"{report_name}.json"
+    filepath = os.path.join(DATA_OUTPUT_DIR, filename)
 
-        # Structure the report data
-        report_data = {
-            'metadata': {
-                'sale_number': week_number_str,
-                'sale_date': week_date, 'location': location,
-                'year': year, 'sale_num_only': sale_num_only, 'generated_at': datetime.datetime.now().isoformat()
-            },
-            'kpis': kpis,
-            'insights': analytical_insights,
-            'charts': charts,
-            'tables': tables,
-            'outlook': outlook,
-            'data_sources': data_sources # Add the centralized data sources
+    try:
+        with instrumentation.span('analyze.shards', sale=week_number_str) as span:
+            written = write_report_shards(report_name, shards, pretty)
+            span.count('bytes', sum(shard['bytes'] for shard in written.values()))
+        report_data['manifest'] = {
+            'data_sources': {name: {**written[shard], 'rows': shards[shard]['length']} for name, shard in SHARDED_DATA_SOURCES.items()},
+            'table_pages': [{**written[f"table_{page:03d}"], 'rows': source['length']} for page, source in enumerate(table_pages)],
         }
+        # Remaining complex types (like datetime if any slipped through) are written as text
+        with instrumentation.span('analyze.serialise', sale=week_number_str) as span:
+            payload = report_json.dumps(report_data, pretty=pretty)
+            span.count('bytes', len(payload))
+        with instrumentation.span('analyze.write', sale=week_number_str):
+            with open(filepath, 'wb') as f:
+                f.write(payload)
+
+        # Add details to index
+        index_entry = {
+            'sale_number': week_number_str,
+            'sale_num_only': sale_num_only,
+            'sale_date': week_date,
+            'year': year,
+            'filename': filename,
+            'location': location,
+            'snapshot': kpis.get('SNAPSHOT', 'Awaiting Data.')
+        }
+        return filename, index_entry
+    except Exception as e:
+        logging.error(f"Error saving JSON for {week_number_str}: {e}", exc_info=True)
+        return None
 
-        # Save the report JSON file
-        filename = f"mombasa_{week_number_str.replace('-', '_')}.json"
-        filepath = os.path.join(DATA_OUTPUT_DIR, filename)
+def build_sale_report(conn, history, read_sale, week_number_str, pretty=False):
+    """Reads one sale (read_history_sale or query_sale) and builds its report; see build_report()."""
+    logging.info(f"Processing Sale: {week_number_str}")
+    # The sale's cleaned (raw) and prepared rows, plus what its report uses of the neighbouring sales
+    with instrumentation.span('analyze.load', sale=week_number_str):
+        inputs = read_sale(conn, history, week_number_str)
+    return build_report(week_number_str, inputs, pretty)
 
+# =============================================================================
+# Parallel Report Build (--workers)
+# =============================================================================
+# Each worker builds whole reports and writes their JSON itself; the parent only records the builds and writes the
+# index. Query layer: a worker opens its own connection and reads each sale from the database. In memory: the
+# partitioned frames are placed in shared memory once (shared_frames) and a worker slices out the sale and its
+# previous sale, instead of every task pickling their DataFrames.
+
+HISTORY_PART_KEYS = ['sales_raw_parts', 'sales_parts', 'offers_parts']
+
+# Per-process state of a report worker (set by _init_report_worker)
+_report_worker = {}
+
+def _init_report_worker(db_file, output_dir, history, in_memory, pretty):
+    """Process-pool initializer: the history, its shared partitions (in memory) or a connection (query layer)."""
+    global DATA_OUTPUT_DIR
+    DATA_OUTPUT_DIR = output_dir
+    _report_worker['pretty'] = pretty
+    if in_memory:
+        history = dict(history)
+        for key in HISTORY_PART_KEYS:
+            attached = shared_frames.AttachedPartitions(history[key])
+            history[key] = (attached, attached.empty)
+        _report_worker.update(conn=None, history=history, read_sale=read_history_sale)
+    else:
+        _report_worker.update(conn=storage.connect(db_file), history=history, read_sale=query_sale)
+
+def _build_report_worker(week_number_str):
+    """Process-pool entry point. Must remain a module-level function so it can be pickled."""
+    state = _report_worker
+    return week_number_str, build_sale_report(state['conn'], state['history'], state['read_sale'], week_number_str, state['pretty'])
+
+def build_reports_parallel(history, in_memory, weeks, workers, pretty=False):
+    """Builds the reports of weeks in a process pool. Yields (sale, build_report() result) in the order of weeks."""
+    shared = []
+    try:
+        worker_history = history
+        if in_memory:
+            worker_history = dict(history)
+            for key in HISTORY_PART_KEYS:
+                frame, ranges, empty = shared_frames.share_partitions(*history[key])
+                shared.append(frame)
+                worker_history[key] = (frame.handle, ranges, empty)
+        logging.info(f"[PARALLEL] Building {len(weeks)} report(s) with {workers} worker process(es).")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_report_worker,
+                                 initargs=(DB_FILE, DATA_OUTPUT_DIR, worker_history, in_memory, pretty)) as executor:
+            # executor.map yields results in submission order, regardless of completion order.
+            yield from executor.map(_build_report_worker, weeks)
+    finally:
+        for frame in shared:
+            frame.close()
+
+# =============================================================================
+# Main Processing Loop
+# =============================================================================
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Mombasa analyzer: builds the weekly report JSON and the report index.")
+    parser.add_argument('--full', action='store_true',
+                        help="Rebuild every report, not only those whose input lots changed since they were last built.")
+    parser.add_argument('--in-memory', action='store_true',
+                        help="Load and prepare the whole history in pandas instead of querying per sale (the pre-query-layer path).")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes used to build the sale reports (default: 1, sequential).")
+    parser.add_argument('--pretty', action='store_true',
+                        help="Write the report JSON indented (for reading and diffing) instead of minified.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    logging.info("Starting Mombasa Data Analysis (V12 Comprehensive Diagnostics)...")
+
+    # V12: Ensure the output directory exists
+    if not os.path.exists(DATA_OUTPUT_DIR):
         try:
-            with open(filepath, 'w') as f:
-                # Use default=str for any remaining complex types (like datetime if any slipped through)
-                json.dump(report_data, f, indent=2, default=str)
-
-            # Add details to index
-            report_index.append({
-                'sale_number': week_number_str,
-                'sale_num_only': sale_num_only,
-                'sale_date': week_date,
-                'year': year,
-                'filename': filename,
-                'location': location,
-                'snapshot': kpis.get('SNAPSHOT', 'Awaiting Data.')
-            })
-        except Exception as e:
-            logging.error(f"Error saving JSON for {week_number_str}: {e}", exc_info=True)
+            os.makedirs(DATA_OUTPUT_DIR)
+            logging.info(f"[DIAGNOSTIC] Created output directory: {DATA_OUTPUT_DIR}")
+        except OSError as e:
+            logging.error(f"Could not create output directory {DATA_OUTPUT_DIR}: {e}")
+            sys.exit(1)
+
+    conn = connect_db()
+    # The query layer reads auction_lots and its sale keys; databases not yet migrated to them are analyzed in memory
+    in_memory = args.in_memory
+    if not in_memory and (conn is None or not table_exists(conn, sale_calendar.CALENDAR_TABLE, types=('table',))):
+        logging.info(f"[QUERY] No {sale_calendar.CALENDAR_TABLE} table (run the processor to migrate); loading the history in memory.")
+        in_memory = True
+    if in_memory:
+        history, read_sale = load_history(conn), read_history_sale
+    else:
+        history, read_sale = query_history(conn), query_sale
+    all_weeks = history['weeks']
+
+    if len(all_weeks) == 0:
+        logging.info("No sale data found in database. Exiting."); return
+
+    try:
+        ensure_chart_specs()
+    except OSError as e:
+        logging.error(f"Could not write chart specs: {e}"); sys.exit(1)
+
+    report_index = []
+
+    # Only reports whose input watermark moved (or that are missing, or of an older build version) are rebuilt
+    watermarks = report_input_watermarks(history)
+    ensure_report_build_log(conn)
+    previous_builds = {} if args.full else load_report_builds(conn)
+    new_builds = []
+    pending = []
+
+    # Process each week individually
+    for week_number in all_weeks:
+        # Ensure week_number is treated as a string for consistent filtering
+        week_number_str = str(week_number)
+        previous_build = previous_builds.get(week_number_str)
+        if previous_build is not None:
+            watermark, version, filename, index_entry = previous_build
+            if (watermark == watermarks[week_number_str] and version == REPORT_BUILD_VERSION
+                    and os.path.exists(os.path.join(DATA_OUTPUT_DIR, filename))):
+                report_index.append(index_entry)
+                continue
+        pending.append(week_number_str)
+
+    if args.workers > 1 and len(pending) > 1:
+        reports = build_reports_parallel(history, in_memory, pending, args.workers, args.pretty)
+    else:
+        reports = ((week_number_str, build_sale_report(conn, history, read_sale, week_number_str, args.pretty)) for week_number_str in pending)
+    # Reports arrive in sale order whichever way they were built
+    for week_number_str, built in reports:
+        if built is not None:
+            filename, index_entry = built
+            report_index.append(index_entry)
+            new_builds.append((week_number_str, watermarks[week_number_str], filename, index_entry))
+
+    unchanged = 'full rebuild' if args.full else f"{len(all_weeks) - len(new_builds)} unchanged"
+    logging.info(f"[INCREMENTAL] Rebuilt {len(new_builds)} of {len(all_weeks)} sale reports ({unchanged}).")
+    try:
+        record_report_builds(conn, new_builds)
+    except sqlite3.Error as e:
+        # The reports are written; without their build records they are rebuilt next run
+        logging.error(f"Error recording report builds: {e}")
 
     # Save the index file
     try:
         # Sort by sale_number string descending (Newest first)
         report_index.sort(key=lambda x: x['sale_number'], reverse=True)
-        with open(INDEX_FILE, 'w') as f:
-            json.dump(report_index, f, indent=2)
+        with open(INDEX_FILE, 'wb') as f:
+            f.write(report_json.dumps(report_index, pretty=True))
         logging.info(f"Generated index file: {INDEX_FILE} with {len(report_index)} entries.")
     except Exception as e:
         logging.error(f"Error saving index file: {e}")
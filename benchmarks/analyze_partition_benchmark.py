@@ -0,0 +1,125 @@
+# analyze_partition_benchmark.py
+# Times the per-sale inputs of the in-memory analyzer (--in-memory) on synthetic lots (generate_auction_data.py):
+#   masked       - the loop before partitioning: boolean masks over the whole history for each sale, a string
+#                  comparison for the previous sale and a re-sort of the offered sales for the next one
+#   partitioned  - analyze_mombasa.build_history() (one groupby per frame) and read_history_sale() lookups
+# Both include preparing the frames; the inputs of every sale are checked to agree before timings are printed.
+# No database is involved: the frames are built as fetch_data() returns them.
+#
+# Usage: python benchmarks/analyze_partition_benchmark.py [--lots 20000] [--sales 200] [--repeat 3]
+import os
+import sys
+import time
+import argparse
+import logging
+import statistics
+
+import pandas as pd
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generate_auction_data
+import analyze_mombasa
+
+# =============================================================================
+# Input Frames
+# =============================================================================
+
+def lot_frames(lots, sales, seed):
+    """
+    (sales_df_raw, offers_df_raw) as fetch_data() returns them: every lot is offered, the sold ones also sold.
+    Sales are numbered within their year (52 a year), as the sale codes are.
+    """
+    df = generate_auction_data.generate_lots(lots, sales, seed=seed)
+    common = pd.DataFrame({
+        'id': range(1, len(df) + 1), 'source_location': 'Mombasa', 'sale_date': df['sale_date'].dt.strftime('%Y-%m-%d'),
+        'sale_number': ((df['sale'] - 1) % 52 + 1).astype(str), 'broker': df['broker'], 'mark': df['mark'], 'grade': df['grade'],
+        'lot_number': df['lot_number'].astype(str), 'invoice_number': df['invoice_number'],
+        'quantity_kgs': df['net_weight'].astype(float), 'package_count': df['bags'],
+        'source_file_identifier': 'benchmark', 'processed_timestamp': '2025-01-01T00:00:00',
+    })
+    offers_df = common.assign(valuation_or_rp=df['valuation'])
+    sold = df['price'].notna()
+    sales_df = common[sold].assign(price=df.loc[sold, 'price'], buyer=df.loc[sold, 'buyer_name'])
+    return analyze_mombasa.clean_lot_frames(
+        sales_df[analyze_mombasa.migrations.LOT_TABLE_COLUMNS['auction_sales']].reset_index(drop=True),
+        offers_df[analyze_mombasa.migrations.LOT_TABLE_COLUMNS['auction_offers']].reset_index(drop=True))
+
+# =============================================================================
+# Per-sale Inputs
+# =============================================================================
+
+def masked_inputs(sales_df_raw, offers_df_raw):
+    """sale -> (sales_week_raw, sales_week, offers_week, previous sale, next offers), masking the history per sale."""
+    sales_df_all = analyze_mombasa.prepare_sales_data(sales_df_raw)
+    offers_df_all = analyze_mombasa.prepare_offers_data(offers_df_raw)
+    weeks = sorted(str(week) for week in set(sales_df_raw['sale_number']) | set(offers_df_raw['sale_number']))
+    inputs = {}
+    for week in weeks:
+        sales_week_raw = sales_df_raw[sales_df_raw['sale_number'] == week]
+        offers_week = offers_df_all[offers_df_all['sale_number'] == week]
+        sales_week = sales_df_all[sales_df_all['sale_number'] == week]
+
+        previous_sale = None
+        previous_sales = sales_df_all[sales_df_all['sale_number'].astype(str) < week]
+        if not previous_sales.empty:
+            prev_week_df = sales_df_all[sales_df_all['sale_number'] == previous_sales['sale_number'].max()]
+            previous_sale = analyze_mombasa.summarize_previous_sale(prev_week_df)
+
+        next_offers = None
+        future_sales = sorted(s for s in offers_df_all['sale_number'].dropna().unique() if str(s) > week)
+        if future_sales:
+            next_week_offers = offers_df_all[offers_df_all['sale_number'] == future_sales[0]]
+            next_offers = (future_sales[0], next_week_offers['total_weight_kgs'].sum())
+        inputs[week] = (sales_week_raw, sales_week, offers_week, previous_sale, next_offers)
+    return inputs
+
+def partitioned_inputs(sales_df_raw, offers_df_raw):
+    history = analyze_mombasa.build_history(sales_df_raw, offers_df_raw)
+    return {week: analyze_mombasa.read_history_sale(None, history, week) for week in history['weeks']}
+
+MODES = [('masked', masked_inputs), ('partitioned', partitioned_inputs)]
+
+def check_agreement(expected, actual):
+    """Raises AssertionError when a sale's frames, previous-sale totals or next offers differ between the modes."""
+    assert list(expected) == list(actual), "sale lists differ"
+    for week, exp, act in zip(expected, expected.values(), actual.values()):
+        for exp_df, act_df in zip(exp[:3], act[:3]):
+            assert exp_df.index.equals(act_df.index), f"sale {week}: rows differ"
+        exp_prev, act_prev = exp[3], act[3]
+        assert (exp_prev is None) == (act_prev is None), f"sale {week}: previous sale differs"
+        if exp_prev is not None:
+            assert (exp_prev['volume'], exp_prev['value_usd']) == (act_prev['volume'], act_prev['value_usd']), \
+                f"sale {week}: previous sale totals differ"
+        assert exp[4] == act[4], f"sale {week}: next offers differ"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-sale masking against a partition-once history.")
+    parser.add_argument('--lots', type=int, default=20000, help="Total lots across all sales (default: 20000).")
+    parser.add_argument('--sales', type=int, default=200, help="Number of weekly sales (default: 200).")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per mode; the median is reported (default: 3).")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # The analyzer logs every weight calculation; only errors are of interest here
+    logging.getLogger().setLevel(logging.ERROR)
+    sales_df_raw, offers_df_raw = lot_frames(args.lots, args.sales, args.seed)
+    print(f"{args.lots} lots over {args.sales} sales ({len(sales_df_raw)} sold); median of {args.repeat} runs")
+
+    timings = {name: [] for name, _ in MODES}
+    results = {}
+    for _ in range(args.repeat):
+        for name, build_inputs in MODES:
+            start = time.perf_counter()
+            results[name] = build_inputs(sales_df_raw, offers_df_raw)
+            timings[name].append(time.perf_counter() - start)
+    check_agreement(results['masked'], results['partitioned'])
+
+    medians = {name: statistics.median(seconds) for name, seconds in timings.items()}
+    for name, seconds in medians.items():
+        print(f"{name:<12} {seconds:>8.3f} s")
+    print(f"speedup      {medians['masked'] / medians['partitioned']:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
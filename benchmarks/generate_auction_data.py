@@ -0,0 +1,296 @@
+# generate_auction_data.py
+# Writes synthetic Mombasa auction workbooks/CSVs with the same layouts as the real files in Mombasa/:
+#   GeneralReport (NN).xlsx/.csv               - 52 columns, a second sub-header row, sales and unsold lots
+#   CompleteOfferLots_YYYY-NN_ddmmyy.xlsx       - one sheet per broker, preamble rows before the header
+#   AuctionSummary_[YYYY-NN]_ddmmyy.xlsx        - Main/Secondary Summary (region/grade blocks) and a Detail sheet
+#   Sale NN_Catalogue_dd_mm_YYYY ....xlsx/.csv  - 'Selling Mark - MF Mark' layout
+# Numerics are mixed like the source data: most are numbers, some are strings with '$' or thousands separators.
+#
+# Usage: python benchmarks/generate_auction_data.py OUTPUT_DIR [--lots 10000] [--sales 5] [--formats xlsx csv] [--seed 0]
+import os
+import sys
+import argparse
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+FILE_KINDS = ['general', 'offers', 'summary', 'catalogue']
+FORMATS = ['xlsx', 'csv']
+# Only these kinds have a CSV counterpart in the real deliveries
+CSV_KINDS = ['general', 'catalogue']
+
+BROKERS = ['ABBL', 'AMBR', 'ANJL', 'ATBL', 'ATLS', 'BICL', 'BTBL', 'CENT', 'COMK', 'CTBL', 'PRME', 'PTBL', 'TBEA', 'TTBL', 'UNTB', 'VENS']
+# (grade, relative frequency, base price USD/kg)
+GRADES = [('BP1', 18, 2.3), ('PF1', 20, 2.2), ('PD', 9, 1.9), ('D1', 8, 1.8), ('DUST1', 7, 1.9), ('FNGS1', 5, 1.4),
+          ('BMF', 3, 1.1), ('BP', 4, 1.7), ('PF', 4, 1.7), ('DUST', 3, 1.5), ('FNGS', 3, 1.2), ('PDUST', 3, 1.6),
+          ('OP1', 4, 2.8), ('OPA', 3, 2.6), ('FBOPF', 4, 2.9)]
+# (country, region label used in the summary sheets, share of lots)
+ORIGINS = [('Kenya', 'Kenya West', 0.35), ('Kenya', 'Kenya East', 0.30), ('Uganda', 'Uganda', 0.12), ('Tanzania', 'Tanzania', 0.08),
+           ('Rwanda', 'Rwanda', 0.08), ('Burundi', 'Burundi', 0.04), ('Malawi', 'Malawi', 0.03)]
+MARK_SYLLABLES = ['KA', 'MO', 'KI', 'CHE', 'NDU', 'RO', 'TI', 'MU', 'GA', 'LA', 'NYA', 'SE', 'BU', 'TE', 'KO', 'RI']
+MARK_COUNT = 400
+BUYER_COUNT = 60
+UNSOLD_SHARE = 0.15
+# Share of numeric cells written as strings ('$1.85', '2,468')
+STRING_NUMERIC_SHARE = 0.1
+FIRST_LOT_NUMBER = 10000
+
+GENERAL_REPORT_HEADER = [
+    'Broker', 'Lot No', 'Selling Mark', 'Grade', 'Invoice No', 'Sub Elevation', 'Sale Code', 'Category', 'RP', 'RA',
+    'Certifications', 'Bags', 'Net Weight', 'Total Weight', 'Primary Standard', 'Primary Adjective', 'Standard 01',
+    'Adjective 01', 'Standard 02', 'Adjective 02', 'Standard 03', 'Adjective 03', 'Remarks', 'Liquor Remarks ',
+    'Valuation', 'Asking Price', 'Baseline Price', 'Registered Bid', '', '', 'Second Highest Bid', '', '', 'Total Price',
+    'Status', 'Purchased Price', 'Buyer', 'Buyer Name', 'Factory', 'Producer Country', 'Warehouse company',
+    'Warehouse location', 'Manufactured Date', 'Outlot Setting Type', 'Selling End Time', 'Producer', 'Final Buyer', '',
+    '', 'Final Price', '', 'Transaction Type']
+GENERAL_REPORT_SUBHEADER = [''] * 25 + ['Amount', '', 'Amount', 'Buyer Code', 'Buyer Company', 'Amount', 'Buyer Code',
+                                        'Buyer Company'] + [''] * 13 + ['Buyer Company Name', 'Buyer Code',
+                                                                        'Buyer Company User', 'Price', 'Total Value', '']
+OFFER_LOTS_HEADER = ['Lot No', 'Re-Print', 'Country', 'Garden', 'Grade', 'Invoice', 'Pkgs', 'TP', 'Nett WT.', 'Kilos',
+                     'Last High', 'Last Low', 'Prev High', 'Prev Low', 'Manf Date', 'Certif.', 'Producer Code.', 'Require Sample?']
+SUMMARY_HEADER = ['Region/Grade', 'Lots', 'Pkgs', 'Kilos']
+DETAIL_HEADER = ['Auction', 'Type', 'Broker', 'LotNo', 'Garden', 'Grade', 'Invoice', 'Pkgs', 'Kilos', 'RP', 'Country', 'Rift',
+                 'Zone', 'RA', 'Whse', 'Producer']
+CATALOGUE_HEADER = ['Broker', 'Category', 'Factory', 'Selling Mark - MF Mark', 'Lot No', 'Reprint', 'Bags', 'Net Weight',
+                    'Grade', 'Invoice No', 'Asking Price', 'Rainforest', 'Certifications', 'Sale Date', 'Total Weight',
+                    'Tare Weight', 'Total Gross Weight', 'Warrant Number', 'Original Weight', 'Warehouse',
+                    'Warehouse Location', 'Manufactured Date', 'Producer Name', 'Producer Code', 'Resale Buyer']
+
+# =============================================================================
+# Lot Generation
+# =============================================================================
+
+def make_marks(rng, count=MARK_COUNT):
+    """Distinct garden names built from syllables (e.g. KAMOTI)."""
+    marks = set()
+    while len(marks) < count:
+        marks.add(''.join(rng.choice(MARK_SYLLABLES, size=rng.integers(2, 4))))
+    return np.array(sorted(marks))
+
+def make_buyers(rng, count=BUYER_COUNT):
+    """(code, company name) pairs."""
+    codes = [''.join(rng.choice(list('ABCDEFGHJKLMNPRSTUVWXYZ'), size=3)) + str(i) for i in range(count)]
+    names = [f"{code} TEA {'EPZ ' if i % 3 == 0 else ''}LTD" for i, code in enumerate(codes)]
+    return np.array(codes), np.array(names)
+
+def generate_lots(lots, sales, year=2025, first_sale=1, seed=0):
+    """
+    Returns one row per lot with the columns every writer draws from. Lots are spread evenly over the sales;
+    lot numbers are unique within a sale. Marks keep a stable origin and grade mix so week-on-week series exist.
+    """
+    rng = np.random.default_rng(seed)
+    marks = make_marks(rng)
+    buyer_codes, buyer_names = make_buyers(rng)
+
+    sale_index = np.arange(lots) * sales // lots
+    df = pd.DataFrame({'sale': first_sale + sale_index})
+    df['lot_number'] = FIRST_LOT_NUMBER + df.groupby('sale').cumcount()
+    df['broker'] = np.array(BROKERS)[rng.integers(0, len(BROKERS), lots)]
+
+    mark_index = rng.integers(0, len(marks), lots)
+    df['mark'] = marks[mark_index]
+    origin_weights = np.array([share for _, _, share in ORIGINS])
+    mark_origin = rng.choice(len(ORIGINS), size=len(marks), p=origin_weights / origin_weights.sum())
+    df['country'] = np.array([country for country, _, _ in ORIGINS])[mark_origin[mark_index]]
+    df['region'] = np.array([region for _, region, _ in ORIGINS])[mark_origin[mark_index]]
+
+    grade_weights = np.array([weight for _, weight, _ in GRADES], dtype=float)
+    grade_index = rng.choice(len(GRADES), size=lots, p=grade_weights / grade_weights.sum())
+    df['grade'] = np.array([grade for grade, _, _ in GRADES])[grade_index]
+    base_price = np.array([price for _, _, price in GRADES])[grade_index]
+
+    df['invoice_number'] = [f"{m[:2]}{year % 100}{n:06d}" for m, n in zip(df['mark'], rng.integers(0, 999999, lots))]
+    df['bags'] = rng.choice([20, 40, 60], size=lots, p=[0.3, 0.6, 0.1])
+    df['net_weight'] = rng.integers(25, 80, lots)
+    df['total_weight'] = df['bags'] * df['net_weight']
+    df['valuation'] = np.round(base_price * rng.uniform(0.8, 1.25, lots), 2)
+    df['asking_price'] = np.round(df['valuation'] * 0.95, 2)
+    df['category'] = 'M' + pd.Series(rng.integers(1, 6, lots)).astype(str)
+    df['auction_type'] = np.where(df['bags'] >= 40, 'MAIN', 'SECONDARY')
+
+    sold = rng.random(lots) >= UNSOLD_SHARE
+    df['price'] = np.where(sold, np.round(df['valuation'] * rng.uniform(0.9, 1.15, lots), 2), np.nan)
+    buyer_index = rng.integers(0, len(buyer_codes), lots)
+    df['buyer_code'] = np.where(sold, buyer_codes[buyer_index], '')
+    df['buyer_name'] = np.where(sold, buyer_names[buyer_index], '')
+
+    df['sale_date'] = pd.Timestamp(year, 1, 6) + pd.to_timedelta((df['sale'] - 1) * 7, unit='D')
+    df['manufactured'] = df['sale_date'] - pd.to_timedelta(rng.integers(20, 90, lots), unit='D')
+    return df
+
+def previous_sale_label(year, sale, weeks_back):
+    """'YYYY/NN' of an earlier sale, wrapping into the previous year (52 sales a year)."""
+    sale -= weeks_back
+    while sale < 1:
+        year, sale = year - 1, sale + 52
+    return f"{year}/{sale:02d}"
+
+def as_mixed_numeric(values, rng, fmt):
+    """Writes a share of the values as formatted strings (e.g. '$1.85', '2,468'); the rest stay numeric."""
+    values = pd.Series(values, dtype=object)
+    mask = (rng.random(len(values)) < STRING_NUMERIC_SHARE) & values.notna().to_numpy()
+    values[mask] = [fmt.format(v) for v in values[mask]]
+    return values.where(values.notna(), '')
+
+# =============================================================================
+# Layouts (one frame of cell values per sheet)
+# =============================================================================
+
+def general_report_rows(sale_lots, year, rng):
+    n = len(sale_lots)
+    blank = [''] * n
+    price = as_mixed_numeric(sale_lots['price'], rng, '${:.2f}')
+    total_price = as_mixed_numeric(np.round(sale_lots['price'] * sale_lots['total_weight'], 2), rng, '{:,.2f}')
+    selling_end = [f"{d:%d/%m/%Y} 09:{i % 60:02d}:{(i * 7) % 60:02d}:{i % 1000:03d}" for i, d in enumerate(sale_lots['sale_date'])]
+    columns = [
+        sale_lots['broker'], sale_lots['lot_number'], sale_lots['mark'], sale_lots['grade'], sale_lots['invoice_number'], blank,
+        [f"Sale {s} - {c}" for s, c in zip(sale_lots['sale'], sale_lots['category'])], sale_lots['category'], blank,
+        np.where(rng.random(n) < 0.7, 'Yes', ''), blank, sale_lots['bags'], sale_lots['net_weight'],
+        as_mixed_numeric(sale_lots['total_weight'], rng, '{:,}'),
+    ] + [blank] * 10 + [
+        as_mixed_numeric(sale_lots['valuation'], rng, '${:.2f}'), sale_lots['asking_price'], blank, price,
+        sale_lots['buyer_code'], sale_lots['buyer_name'], blank, blank, blank, total_price,
+        np.where(sale_lots['price'].notna(), 'Sold', 'Unsold'), price, sale_lots['buyer_code'], sale_lots['buyer_name'],
+        sale_lots['mark'], sale_lots['country'], 'CTCW', 'MIRITINI', [f"{d:%Y/%m/%d}" for d in sale_lots['manufactured']],
+        'Other Factories', selling_end, 'PRODUCER LTD', sale_lots['buyer_name'], sale_lots['buyer_code'], blank, price,
+        total_price, blank,
+    ]
+    frame = pd.DataFrame({i: pd.Series(col, index=sale_lots.index) if not isinstance(col, str) else col
+                          for i, col in enumerate(columns)})
+    return [GENERAL_REPORT_HEADER, GENERAL_REPORT_SUBHEADER] + frame.values.tolist()
+
+def offer_lots_sheets(sale_lots, year, rng):
+    """{broker: rows}: preamble, week header row, header, lots (numbers as text, as in the real catalogue)."""
+    sale = int(sale_lots['sale'].iloc[0])
+    sheets = {}
+    for broker, lots in sale_lots.groupby('broker', sort=True):
+        rows = [[broker], ['DETAILED CATALOGUE'], ['Sale No:', f"{year}/{sale:02d}", '', '', "Pls mark 'X' in last column named Require SAMPLE"],
+                ['Sale Date:', None], [],
+                [''] * 10 + [previous_sale_label(year, sale, 2)] * 2 + [previous_sale_label(year, sale, 3)] * 2,
+                OFFER_LOTS_HEADER]
+        for lot in lots.itertuples(index=False):
+            high = int(lot.valuation * 110)
+            rows.append([str(lot.lot_number), '', lot.country, lot.mark, lot.grade, lot.invoice_number, str(lot.bags), 'TPP',
+                         str(lot.total_weight), str(lot.net_weight), high, high - 10, high + 5, high - 5,
+                         f"{lot.manufactured:%d %b %y}", 'RA', 'KTDA'])
+        sheets[broker] = rows
+    return sheets
+
+def summary_rows(sale_lots, auction_type):
+    """Region blocks: uppercase grade rows followed by a mixed-case region subtotal, then the Grand Total."""
+    lots = sale_lots[sale_lots['auction_type'] == auction_type]
+    rows = [[f"{auction_type} AUCTION"], [], SUMMARY_HEADER]
+    for region, block in lots.groupby('region', sort=False):
+        grades = block.groupby('grade').agg(lots=('lot_number', 'size'), pkgs=('bags', 'sum'), kilos=('total_weight', 'sum'))
+        rows.extend([grade, int(r.lots), int(r.pkgs), int(r.kilos)] for grade, r in grades.iterrows())
+        rows.append([region, len(block), int(block['bags'].sum()), int(block['total_weight'].sum())])
+    rows.append(['Grand Total', len(lots), int(lots['bags'].sum()), int(lots['total_weight'].sum())])
+    return rows
+
+def detail_rows(sale_lots, year):
+    sale = int(sale_lots['sale'].iloc[0])
+    last, prev = previous_sale_label(year, sale, 2), previous_sale_label(year, sale, 3)
+    rows = [DETAIL_HEADER + [f"{last} High", f"{last} Low", f"{prev} High", f"{prev} Low"]]
+    for lot in sale_lots.itertuples(index=False):
+        high = int(lot.valuation * 110)
+        rows.append([f"{year}/{sale:02d}", lot.category, lot.broker, str(lot.lot_number), lot.mark, lot.grade, lot.invoice_number,
+                     int(lot.bags), int(lot.total_weight), '', lot.country, '', '', 'RA', 'BAL078', 'MRUL', high, high - 10, high + 5, high - 5])
+    return rows
+
+def catalogue_rows(sale_lots):
+    rows = [CATALOGUE_HEADER]
+    for lot in sale_lots.itertuples(index=False):
+        rows.append([lot.broker, lot.category, lot.mark, f"{lot.mark} - ", int(lot.lot_number), 'No', int(lot.bags), int(lot.net_weight),
+                     lot.grade, lot.invoice_number, lot.asking_price, 'Yes', '', f"{lot.sale_date:%Y-%m-%d}", int(lot.total_weight),
+                     30, int(lot.total_weight) + 30, '', 0, 'CTCW', '', f"{lot.manufactured:%Y-%m-%d}", 'PRODUCER LTD', 'KTDA', ''])
+    return rows
+
+# =============================================================================
+# Writers
+# =============================================================================
+
+def write_xlsx(path, sheets):
+    """sheets: {title: rows}. Uses openpyxl's write-only mode (streams rows, constant memory)."""
+    wb = openpyxl.Workbook(write_only=True)
+    for title, rows in sheets.items():
+        ws = wb.create_sheet(title=title)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+
+def write_csv(path, rows):
+    width = max(len(row) for row in rows)
+    pd.DataFrame([list(row) + [''] * (width - len(row)) for row in rows]).to_csv(path, header=False, index=False)
+
+def write_sale_files(sale_lots, output_dir, year, rng, kinds=FILE_KINDS, formats=('xlsx',)):
+    """Writes every requested file for one sale. Returns the paths written."""
+    sale = int(sale_lots['sale'].iloc[0])
+    sale_date = sale_lots['sale_date'].iloc[0]
+    catalogue_date = sale_date - timedelta(days=7)
+    paths = []
+
+    def emit(kind, stem, sheets, csv_rows=None):
+        for fmt in formats:
+            if fmt == 'csv' and kind not in CSV_KINDS:
+                continue
+            path = os.path.join(output_dir, f"{stem}.{fmt}")
+            if fmt == 'xlsx':
+                write_xlsx(path, sheets)
+            else:
+                write_csv(path, csv_rows)
+            paths.append(path)
+
+    if 'general' in kinds:
+        rows = general_report_rows(sale_lots, year, rng)
+        emit('general', f"GeneralReport ({100 + sale})", {'General Report': rows}, rows)
+    if 'offers' in kinds:
+        emit('offers', f"CompleteOfferLots_{year}-{sale:02d}_{catalogue_date:%d%m%y}", offer_lots_sheets(sale_lots, year, rng))
+    if 'summary' in kinds:
+        sheets = {'Main Summary': summary_rows(sale_lots, 'MAIN'), 'Secondary Summary': summary_rows(sale_lots, 'SECONDARY'),
+                  'Detail': detail_rows(sale_lots, year)}
+        emit('summary', f"AuctionSummary_[{year}-{sale:02d}]_{catalogue_date:%d%m%y}", sheets)
+    if 'catalogue' in kinds:
+        rows = catalogue_rows(sale_lots)
+        emit('catalogue', f"Sale {sale}_Catalogue_{catalogue_date:%d_%m_%Y} 09_32_31 AM", {'Sheet1': rows}, rows)
+    return paths
+
+def generate_dataset(output_dir, lots, sales, kinds=FILE_KINDS, formats=('xlsx',), year=2025, seed=0):
+    """Generates the lots and writes every sale's files into output_dir. Returns the paths written."""
+    if 'xlsx' in formats and openpyxl is None:
+        raise RuntimeError("openpyxl is required to write .xlsx files (pip install openpyxl).")
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed + 1)
+    all_lots = generate_lots(lots, sales, year=year, seed=seed)
+    paths = []
+    for _, sale_lots in all_lots.groupby('sale', sort=True):
+        paths.extend(write_sale_files(sale_lots.reset_index(drop=True), output_dir, year, rng, kinds, formats))
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Mombasa auction files with the real layouts.")
+    parser.add_argument('output_dir', help="Directory to write the files into (created if missing).")
+    parser.add_argument('--lots', type=int, default=10000, help="Total lots across all sales (default: 10000).")
+    parser.add_argument('--sales', type=int, default=5, help="Number of weekly sales (default: 5).")
+    parser.add_argument('--kinds', nargs='+', choices=FILE_KINDS, default=FILE_KINDS, help="File kinds to write (default: all).")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=['xlsx'], help="Output formats (default: xlsx).")
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.sales < 1 or args.lots < args.sales:
+        sys.exit("--sales must be at least 1 and --lots at least --sales.")
+    paths = generate_dataset(args.output_dir, args.lots, args.sales, args.kinds, args.formats, args.year, args.seed)
+    print(f"Wrote {len(paths)} file(s) to {args.output_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# ingest_batch_benchmark.py
+# Compares a per-file-commit ingest run of process_mombasa_data with a --batch run (one transaction,
+# a savepoint per file) on the files in Mombasa/. Each run starts from an empty database in a temp directory;
+# both read the workbooks from a parse cache warmed beforehand, so the difference is the write path.
+#
+# Commits are counted with a trace callback. They are the durability points: with the rollback journal and
+# synchronous=FULL (--legacy-journal, the sqlite3 defaults) every commit costs at least two fsyncs (journal and
+# database file); with WAL and synchronous=NORMAL (storage.SQLITE_PRAGMAS) commits do not sync and the syncs
+# happen at checkpoints.
+#
+# Usage: python benchmarks/ingest_batch_benchmark.py [--repeat 3] [--legacy-journal]
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import logging
+import statistics
+import warnings
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage
+import process_mombasa_data
+
+# (label, extra processor arguments)
+MODES = [('per-file commits', []), ('--batch', ['--batch'])]
+
+# Pre-storage defaults: rollback journal, full sync
+LEGACY_PRAGMAS = [('journal_mode', 'DELETE'), ('synchronous', 'FULL')]
+
+def install_commit_counter(counts):
+    """Wraps storage.connect so every processor connection counts its commits into counts['commits']."""
+    connect = storage.connect
+
+    def counting_connect(db_file, check_same_thread=True):
+        conn = connect(db_file, check_same_thread=check_same_thread)
+        savepoints = []
+
+        def trace(statement):
+            words = statement.strip().upper().split()
+            if not words:
+                return
+            if words[0] in ('COMMIT', 'END'):
+                counts['commits'] += 1
+                savepoints.clear()
+            elif words[0] == 'ROLLBACK' and 'TO' not in words:
+                savepoints.clear()
+            elif words[0] == 'SAVEPOINT':
+                # A savepoint opened outside a transaction starts one; releasing it commits
+                savepoints.append((words[1], not conn.in_transaction))
+            elif words[0] == 'RELEASE' and savepoints:
+                name = words[-1]
+                while savepoints:
+                    released, outermost = savepoints.pop()
+                    if released == name:
+                        if outermost:
+                            counts['commits'] += 1
+                        break
+
+        conn.set_trace_callback(trace)
+        return conn
+
+    storage.connect = counting_connect
+
+def run_processor(workdir, parse_cache_dir, extra_args):
+    """One ingest run into workdir/market_reports.db. Returns the wall time in seconds."""
+    process_mombasa_data.DB_FILE = os.path.join(workdir, "market_reports.db")
+    process_mombasa_data.PARSE_CACHE_DIR = parse_cache_dir
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(process_mombasa_data.DB_FILE + suffix):
+            os.remove(process_mombasa_data.DB_FILE + suffix)
+    start = time.perf_counter()
+    process_mombasa_data.main(extra_args)
+    storage.close_pools()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-file commits against a single-transaction (--batch) ingest run.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per mode; the median wall time is reported (default: 3).")
+    parser.add_argument('--legacy-journal', action='store_true',
+                        help="Use the rollback journal with synchronous=FULL instead of the storage pragmas (WAL, NORMAL).")
+    args = parser.parse_args()
+
+    if args.legacy_journal:
+        storage.SQLITE_PRAGMAS = LEGACY_PRAGMAS + [p for p in storage.SQLITE_PRAGMAS if p[0] not in ('journal_mode', 'synchronous')]
+    # The processor's per-file log lines would drown the results
+    logging.getLogger().setLevel(logging.ERROR)
+    warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+
+    counts = {'commits': 0}
+    install_commit_counter(counts)
+
+    workdir = tempfile.mkdtemp(prefix="ingest_bench_")
+    try:
+        parse_cache_dir = os.path.join(workdir, "parse_cache")
+        run_processor(workdir, parse_cache_dir, [])
+
+        # Modes are interleaved so drift affects both alike
+        timings = {label: [] for label, _ in MODES}
+        commits = {}
+        for _ in range(args.repeat):
+            for label, extra_args in MODES:
+                counts['commits'] = 0
+                timings[label].append(run_processor(workdir, parse_cache_dir, extra_args))
+                commits[label] = counts['commits']
+        results = {label: (statistics.median(timings[label]), commits[label]) for label, _ in MODES}
+
+        journal = 'rollback journal, synchronous=FULL' if args.legacy_journal else 'WAL, synchronous=NORMAL'
+        print(f"Source: {process_mombasa_data.MOMBASA_DIR} ({journal}); median of {args.repeat} runs")
+        print(f"{'mode':<18} {'wall (s)':>9} {'commits':>8}")
+        for label, (wall, commits) in results.items():
+            print(f"{label:<18} {wall:>9.2f} {commits:>8}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+# ingest_benchmark.py
+# Times the ingestion and analysis stages on synthetic data (generate_auction_data.py) at several sizes:
+#   read_file            - process_mombasa_data.read_file() on every lot-level file
+#   process_lot_details  - cleaning/casting into offers and sales frames
+#   insert_data          - upserts (upsert_lots) into an empty database, one write transaction per file as the processor does
+#   analyze              - analyze_mombasa.main(['--full']) over the resulting database
+# Each size runs in a fresh process, so the peak RSS recorded after each stage belongs to that size alone
+# (it is a high-water mark: a stage's value includes every stage before it).
+# Results are written as JSON (with the git commit) so runs on different commits can be compared with --compare.
+#
+# Usage: python benchmarks/ingest_benchmark.py [--sizes 1000x1,10000x5,100000x20] [--formats xlsx] [--output FILE] [--compare FILE]
+#   Sizes are LOTSxSALES; the generator supports 1k-500k lots and 1-200 sales (e.g. 500000x200).
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import logging
+import subprocess
+import warnings
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: peak RSS is not recorded
+
+import pandas as pd
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generate_auction_data
+
+RESULTS_DIR = os.path.join(REPO_PATH, "benchmarks", "results")
+DEFAULT_SIZES = "1000x1,10000x5,100000x20"
+# GeneralReport (sales), CompleteOfferLots (offers) and AuctionSummary (Detail sheet) - the lot-level files
+DEFAULT_KINDS = ['general', 'offers', 'summary']
+STAGES = ['read_file', 'process_lot_details', 'insert_data', 'analyze']
+# A stage is reported as a regression by --compare when it is this much slower than the baseline
+REGRESSION_THRESHOLD = 1.10
+
+def parse_sizes(text):
+    """'1000x1,10000x5' -> [(1000, 1), (10000, 5)]"""
+    sizes = []
+    for item in text.split(','):
+        lots, _, sales = item.strip().lower().partition('x')
+        sizes.append((int(lots), int(sales or 1)))
+    return sizes
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_PATH, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# =============================================================================
+# Per-size run (executed in a fresh process)
+# =============================================================================
+
+def _quiet():
+    # The processor and analyzer log every file and chart; only errors are of interest here
+    logging.getLogger().setLevel(logging.ERROR)
+    warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+
+def generate_files(data_dir, lots, sales, kinds, formats, seed):
+    return generate_auction_data.generate_dataset(data_dir, lots, sales, kinds, formats, seed=seed)
+
+def run_stages(workdir, paths):
+    """Runs the four stages over the generated files. Returns {stage: {seconds, peak_rss_mb}} and row counts."""
+    import storage
+    import process_mombasa_data as pmd
+    import analyze_mombasa
+    _quiet()
+
+    pmd.DB_FILE = os.path.join(workdir, "market_reports.db")
+    analyze_mombasa.DB_FILE = pmd.DB_FILE
+    analyze_mombasa.DATA_OUTPUT_DIR = os.path.join(workdir, "report_data")
+    analyze_mombasa.INDEX_FILE = os.path.join(analyze_mombasa.DATA_OUTPUT_DIR, "mombasa_index.json")
+    pmd.initialize_database()
+    storage.close_pools()
+
+    stages = {}
+    def record(stage, seconds):
+        stages[stage] = {'seconds': round(seconds, 4), 'peak_rss_mb': peak_rss_mb()}
+
+    start = time.perf_counter()
+    raw_frames = [(path, pmd.read_file(path, pmd.HEADER_KEYWORDS)) for path in paths]
+    record('read_file', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    timestamp = datetime.now().isoformat()
+    parsed = []
+    for path, df in raw_frames:
+        name = os.path.basename(path)
+        metadata = {'file_identifier': f"benchmark:{name}", 'filename': name, 'timestamp': timestamp}
+        parsed.append(pmd.process_lot_details(df, metadata))
+    record('process_lot_details', time.perf_counter() - start)
+    del raw_frames
+
+    rows = {'auction_offers': 0, 'auction_sales': 0}
+    conn = storage.connect(pmd.DB_FILE)
+    try:
+        start = time.perf_counter()
+        for offers_df, sales_df in parsed:
+            with storage.write_transaction(conn):
+                offer_counts, sale_counts = pmd.upsert_lots(conn, offers_df, sales_df)
+                for table_name, counts in [('auction_offers', offer_counts), ('auction_sales', sale_counts)]:
+                    rows[table_name] += counts['inserted'] + counts['updated']
+        record('insert_data', time.perf_counter() - start)
+    finally:
+        conn.close()
+    del parsed
+
+    start = time.perf_counter()
+    analyze_mombasa.main(['--full'])
+    record('analyze', time.perf_counter() - start)
+    storage.close_pools()
+    return stages, rows
+
+def run_size(lots, sales, kinds, formats, seed):
+    """Generates one dataset and times it; generation and the stages each get a fresh process."""
+    workdir = tempfile.mkdtemp(prefix="ingest_bench_")
+    context = multiprocessing.get_context('spawn')
+    try:
+        data_dir = os.path.join(workdir, "Mombasa")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            paths = executor.submit(generate_files, data_dir, lots, sales, kinds, formats, seed).result()
+        generate_seconds = time.perf_counter() - start
+        input_mb = sum(os.path.getsize(path) for path in paths) / (1024 * 1024)
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            stages, rows = executor.submit(run_stages, workdir, paths).result()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'lots': lots, 'sales': sales, 'files': len(paths), 'input_mb': round(input_mb, 2),
+        'generate_seconds': round(generate_seconds, 2), 'rows': rows, 'stages': stages,
+    }
+
+# =============================================================================
+# Reporting
+# =============================================================================
+
+def print_results(results):
+    print(f"{'size':>12} {'stage':<20} {'seconds':>9} {'peak RSS (MB)':>14}")
+    for result in results:
+        size = f"{result['lots']}x{result['sales']}"
+        for stage in STAGES:
+            timing = result['stages'][stage]
+            rss = '-' if timing['peak_rss_mb'] is None else f"{timing['peak_rss_mb']:.1f}"
+            print(f"{size:>12} {stage:<20} {timing['seconds']:>9.3f} {rss:>14}")
+
+def compare_results(results, baseline):
+    """Prints current/baseline time ratios per size and stage. Returns the number of regressions."""
+    baseline_sizes = {(r['lots'], r['sales']): r for r in baseline['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp')}):")
+    for result in results:
+        previous = baseline_sizes.get((result['lots'], result['sales']))
+        if previous is None:
+            continue
+        for stage in STAGES:
+            before, after = previous['stages'][stage]['seconds'], result['stages'][stage]['seconds']
+            ratio = after / before if before else float('inf')
+            flag = ''
+            if ratio > REGRESSION_THRESHOLD:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"{result['lots']:>8}x{result['sales']:<4} {stage:<20} {before:>9.3f} -> {after:>9.3f} ({ratio:.2f}x){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and analysis on synthetic auction data.")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"Comma-separated LOTSxSALES sizes (default: {DEFAULT_SIZES}).")
+    parser.add_argument('--kinds', nargs='+', choices=generate_auction_data.FILE_KINDS, default=DEFAULT_KINDS,
+                        help=f"File kinds to generate (default: {' '.join(DEFAULT_KINDS)}).")
+    parser.add_argument('--formats', nargs='+', choices=generate_auction_data.FORMATS, default=['xlsx'],
+                        help="Input formats (default: xlsx).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/ingest_<commit>_<time>.json).")
+    parser.add_argument('--compare', help="Earlier results file; prints per-stage ratios and exits 1 on a regression.")
+    args = parser.parse_args()
+
+    results = []
+    for lots, sales in parse_sizes(args.sizes):
+        print(f"Running {lots} lots x {sales} sales...", flush=True)
+        results.append(run_size(lots, sales, args.kinds, args.formats, args.seed))
+
+    commit = git_commit()
+    report = {
+        'benchmark': 'ingest', 'commit': commit, 'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'pandas': pd.__version__, 'platform': platform.platform(),
+        'cpu_count': os.cpu_count(), 'kinds': args.kinds, 'formats': args.formats, 'seed': args.seed,
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"ingest_{commit or 'unknown'}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print_results(results)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# report_serialise_benchmark.py
+# Times writing a report's data sources as JSON, on the lots of existing reports (report_data/mombasa_*.json with
+# row-oriented data sources, as the analyzer wrote them before the columnar format):
+#   records       - replace({np.nan: None}).to_dict(orient='records') and json.dumps(indent=2, default=str)
+#   columnar      - analyze_mombasa.encode_data_sources() with the standard json module (report_json without orjson)
+#   orjson        - the same with orjson, minified
+#   orjson-pretty - the same with orjson, indented
+# The columnar payloads are checked to decode to the same JSON before timings are printed; orjson modes are
+# skipped when it is not installed.
+#
+# Usage: python benchmarks/report_serialise_benchmark.py [REPORT.json ...] [--repeat 5]
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import logging
+import statistics
+
+import numpy as np
+import pandas as pd
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+import report_json
+import analyze_mombasa
+
+# =============================================================================
+# Input Frames
+# =============================================================================
+
+def report_frames(path):
+    """The data source frames of a report with row-oriented data sources, or None for other reports."""
+    with open(path) as f:
+        report = json.load(f)
+    sources = report.get('data_sources') if isinstance(report, dict) else None
+    if not sources or report.get('report_format') or not sources.get(analyze_mombasa.DATA_SOURCE_WEEK):
+        return None
+    frames = {name: pd.DataFrame(sources.get(name, [])) for name in analyze_mombasa.DATA_SOURCE_COLUMNS}
+    # The lot table is encoded from the sales week, as in build_report()
+    frames[analyze_mombasa.DATA_SOURCE_LOT_TABLE] = frames[analyze_mombasa.DATA_SOURCE_WEEK]
+    return frames
+
+# =============================================================================
+# Modes
+# =============================================================================
+
+def records_payload(frames):
+    data_sources = {name: df.replace({np.nan: None}).to_dict(orient='records') for name, df in frames.items()
+                    if name != analyze_mombasa.DATA_SOURCE_LOT_TABLE}
+    return json.dumps({'data_sources': data_sources}, indent=2, default=str).encode('utf-8')
+
+def columnar_payload(frames, pretty=False):
+    data_sources, dictionaries = analyze_mombasa.encode_data_sources(frames)
+    return report_json.dumps({'data_sources': data_sources, 'dictionaries': dictionaries}, pretty=pretty)
+
+def stdlib_payload(frames):
+    """columnar_payload() as written without orjson installed."""
+    fast_encoder, report_json.orjson = report_json.orjson, None
+    try:
+        return columnar_payload(frames)
+    finally:
+        report_json.orjson = fast_encoder
+
+MODES = [('records', records_payload), ('columnar', stdlib_payload)]
+if report_json.orjson is not None:
+    MODES += [('orjson', columnar_payload), ('orjson-pretty', lambda frames: columnar_payload(frames, pretty=True))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report JSON encoders on existing reports.")
+    parser.add_argument('reports', nargs='*', help="Report files (default: report_data/mombasa_*.json).")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per mode; the median is reported (default: 5).")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    paths = args.reports or sorted(glob.glob(os.path.join(REPO_PATH, 'report_data', 'mombasa_*.json')))
+    inputs = [frames for frames in map(report_frames, paths) if frames is not None]
+    if not inputs:
+        print("No reports with row-oriented data sources found."); return
+    lots = sum(len(frames[analyze_mombasa.DATA_SOURCE_WEEK]) for frames in inputs)
+    print(f"{len(inputs)} report(s), {lots} lots; median of {args.repeat} runs")
+
+    timings = {name: [] for name, _ in MODES}
+    sizes = {}
+    payloads = {}
+    for _ in range(args.repeat):
+        for name, encode in MODES:
+            start = time.perf_counter()
+            payloads[name] = [encode(frames) for frames in inputs]
+            timings[name].append(time.perf_counter() - start)
+            sizes[name] = sum(len(payload) for payload in payloads[name])
+    for name, _ in MODES[2:]:
+        assert [json.loads(p) for p in payloads[name]] == [json.loads(p) for p in payloads['columnar']], f"{name} output differs"
+
+    baseline = statistics.median(timings['records'])
+    for name, seconds in timings.items():
+        median = statistics.median(seconds)
+        print(f"{name:<14} {median:>8.3f} s  {sizes[name] / 1e6:>7.2f} MB  {baseline / median:>6.2f}x")
+
+if __name__ == '__main__':
+    main()
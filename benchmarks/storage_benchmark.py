@@ -0,0 +1,241 @@
+# storage_benchmark.py
+# Compares default sqlite3 connections with storage.connect() (WAL, synchronous=NORMAL, cache/mmap, temp_store)
+# on a copy of market_reports.db: a serial ingest and analysis, the analyzer reading while an ingest writes (where WAL
+# lets the reader run alongside the writer), and short reads on a fresh vs. a pooled connection.
+# The source database is never modified.
+#
+# Usage: python benchmarks/storage_benchmark.py [--db market_reports.db] [--repeat 5]
+import sqlite3
+import os
+import sys
+import time
+import shutil
+import threading
+import tempfile
+import argparse
+import statistics
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage
+import migrations
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB = os.path.join(REPO_PATH, "market_reports.db")
+
+# Tables replayed by the ingest benchmark (one group of rows per source file, as the processor writes them)
+INGEST_TABLES = ['auction_offers', 'auction_sales']
+
+# Queries run by the analysis benchmark (the analyzer's full-table loads plus typical weekly aggregates)
+ANALYSIS_QUERIES = [
+    "SELECT * FROM auction_sales",
+    "SELECT * FROM auction_offers",
+    "SELECT sale_number, COUNT(*) AS lots, SUM(quantity_kgs) AS kgs, AVG(price) AS avg_price FROM auction_sales GROUP BY sale_number",
+    "SELECT sale_number, grade, COUNT(*) AS lots, AVG(price) AS avg_price FROM auction_sales GROUP BY sale_number, grade",
+    "SELECT sale_number, broker, SUM(quantity_kgs) AS kgs FROM auction_offers GROUP BY sale_number, broker",
+]
+# Run in a loop by the reader of the concurrent benchmark (the weekly aggregates)
+CONCURRENT_QUERIES = ANALYSIS_QUERIES[2:]
+# One short read per connection in the connection benchmark: a sale's lots, as the per-sale reads of the analyzer
+CONNECTION_QUERY = "SELECT COUNT(*), SUM(quantity_kgs) FROM auction_sales WHERE sale_number = ?"
+CONNECTION_READS = 500
+
+def default_connect(db_file):
+    # sqlite3 defaults apart from the busy timeout, so a reader waits for the writer's lock instead of failing
+    return sqlite3.connect(db_file, timeout=storage.BUSY_TIMEOUT_SECONDS)
+
+CONNECTORS = [('sqlite3 defaults', default_connect), ('storage.connect', storage.connect)]
+
+def load_ingest_batches(source_db):
+    """
+    Returns [(table, columns, rows)] grouped by source file, in id order. Where the lot tables are views, the rows
+    of the table behind them are replayed (auction_lots, or the fact tables of schema version 3).
+    """
+    batches = []
+    with sqlite3.connect(source_db) as conn:
+        def is_table(name):
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+        tables = [migrations.LOTS_TABLE] if is_table(migrations.LOTS_TABLE) else INGEST_TABLES
+        for table in tables:
+            if is_table(migrations.FACT_TABLES.get(table, '')):
+                table = migrations.FACT_TABLES[table]
+            df = pd.read_sql_query(f"SELECT * FROM {table} ORDER BY id", conn).drop(columns=['id'])
+            df = df.astype(object).where(df.notna(), None)
+            columns = list(df.columns)
+            for _, group in df.groupby('source_file_identifier', sort=False):
+                batches.append((table, columns, list(group.itertuples(index=False, name=None))))
+    return batches
+
+def create_empty_copy(source_db, target_db):
+    """Creates target_db with the source schema (tables and indexes) and no rows."""
+    with sqlite3.connect(source_db) as src:
+        statements = [row[0] for row in src.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END")]
+    conn = sqlite3.connect(target_db)
+    for sql in statements:
+        conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+def create_ingest_target(source_db, workdir, name="ingest.db"):
+    """An empty copy of the source schema in workdir (any previous copy and its WAL files removed)."""
+    target_db = os.path.join(workdir, name)
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(target_db + suffix):
+            os.remove(target_db + suffix)
+    create_empty_copy(source_db, target_db)
+    return target_db
+
+def replay_batches(conn, batches, conflict='IGNORE'):
+    """Writes every source file as the processor does: one upsert commit plus log and manifest commits."""
+    for i, (table, columns, rows) in enumerate(batches):
+        placeholders = ', '.join('?' for _ in columns)
+        conn.executemany(f"INSERT OR {conflict} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        conn.commit()
+        conn.execute("INSERT OR REPLACE INTO processing_log (file_identifier, processed_timestamp, records_inserted, data_type, status) "
+                     "VALUES (?, ?, ?, ?, ?)", (f"bench-{i}", '2025-01-01T00:00:00', len(rows), table, 'SUCCESS'))
+        conn.commit()
+        conn.execute("UPDATE processing_log SET status = 'SUCCESS' WHERE file_identifier = ?", (f"bench-{i}",))
+        conn.commit()
+
+def bench_ingest(connect, source_db, batches, workdir):
+    """Replays every source file into an empty copy of the database (replay_batches)."""
+    target_db = create_ingest_target(source_db, workdir)
+
+    start = time.perf_counter()
+    conn = connect(target_db)
+    replay_batches(conn, batches)
+    conn.close()
+    return time.perf_counter() - start
+
+def bench_concurrent(connect, source_db, batches, workdir):
+    """
+    The analyzer reading while an ingest writes (e.g. --watch): on a copy holding every batch, a reader thread runs
+    CONCURRENT_QUERIES in a loop while the batches are written again (each row replaced), so the reader always
+    sees the full tables. Returns (ingest seconds, reader round seconds).
+    """
+    target_db = create_ingest_target(source_db, workdir)
+    # The writer connects first, so the tuned configuration has switched the database to WAL before the reader opens it
+    conn = connect(target_db)
+    replay_batches(conn, batches)
+    done = threading.Event()
+    rounds = []
+
+    def read():
+        reader = connect(target_db)
+        while not done.is_set():
+            start = time.perf_counter()
+            for sql in CONCURRENT_QUERIES:
+                reader.execute(sql).fetchall()
+            rounds.append(time.perf_counter() - start)
+        reader.close()
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    start = time.perf_counter()
+    try:
+        replay_batches(conn, batches, conflict='REPLACE')
+        elapsed = time.perf_counter() - start
+    finally:
+        done.set()
+        thread.join()
+        conn.close()
+    return elapsed, rounds
+
+def bench_connections(db_file, sale_numbers):
+    """
+    CONNECTION_READS short reads, each on its own connection: opened and closed per read (sqlite3 defaults,
+    storage.connect) or borrowed from the pool (storage.pooled_connection). Returns {configuration: seconds}.
+    """
+    def fresh(connect):
+        def read(sale_number):
+            conn = connect(db_file)
+            try:
+                conn.execute(CONNECTION_QUERY, (sale_number,)).fetchall()
+            finally:
+                conn.close()
+        return read
+
+    def pooled(sale_number):
+        with storage.pooled_connection(db_file) as conn:
+            conn.execute(CONNECTION_QUERY, (sale_number,)).fetchall()
+
+    timings = {}
+    for name, read in [('sqlite3 defaults', fresh(default_connect)), ('storage.connect', fresh(storage.connect)),
+                       ('pooled_connection', pooled)]:
+        start = time.perf_counter()
+        for i in range(CONNECTION_READS):
+            read(sale_numbers[i % len(sale_numbers)])
+        timings[name] = time.perf_counter() - start
+    storage.close_pools()
+    return timings
+
+def bench_analysis(connect, db_file):
+    """One analyzer run: a fresh connection, the full-table loads and the weekly aggregates (rows fetched, not framed)."""
+    start = time.perf_counter()
+    conn = connect(db_file)
+    for sql in ANALYSIS_QUERIES:
+        conn.execute(sql).fetchall()
+    conn.close()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark default vs. tuned SQLite connections on market_reports.db.")
+    parser.add_argument('--db', default=DEFAULT_DB, help=f"Source database (default: {DEFAULT_DB}).")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per configuration; the median is reported (default: 5).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"Database not found: {args.db}. Run process_mombasa_data.py first.")
+
+    workdir = tempfile.mkdtemp(prefix="storage_bench_")
+    try:
+        analysis_db = os.path.join(workdir, "analysis.db")
+        shutil.copy(args.db, analysis_db)
+        batches = load_ingest_batches(args.db)
+        row_count = sum(len(rows) for _, _, rows in batches)
+        print(f"Source: {args.db} ({len(batches)} file batches, {row_count} rows); median of {args.repeat} runs")
+
+        # Configurations are interleaved so drift (page cache, CPU frequency) affects both alike.
+        # The analysis copy is converted to WAL by the first tuned connection; default connections read it unchanged.
+        timings = {name: ([], [], [], []) for name, _ in CONNECTORS}
+        for _ in range(args.repeat):
+            for name, connect in CONNECTORS:
+                timings[name][0].append(bench_ingest(connect, args.db, batches, workdir))
+                timings[name][1].append(bench_analysis(connect, analysis_db))
+                ingest, rounds = bench_concurrent(connect, args.db, batches, workdir)
+                timings[name][2].append(ingest)
+                timings[name][3].extend(rounds)
+        results = {name: (statistics.median(ingest), statistics.median(analysis), statistics.median(concurrent))
+                   for name, (ingest, analysis, concurrent, _) in timings.items()}
+
+        print(f"{'configuration':<18} {'ingest (s)':>11} {'analysis (s)':>13} {'ingest+reader (s)':>18} "
+              f"{'reader rounds':>14} {'median round (ms)':>18} {'max round (ms)':>15}")
+        for name, (ingest, analysis, concurrent) in results.items():
+            rounds = timings[name][3]
+            median_round, max_round = (statistics.median(rounds), max(rounds)) if rounds else (float('nan'), float('nan'))
+            print(f"{name:<18} {ingest:>11.3f} {analysis:>13.3f} {concurrent:>18.3f} "
+                  f"{len(rounds) / args.repeat:>14.1f} {median_round * 1000:>18.1f} {max_round * 1000:>15.1f}")
+        base, tuned = results['sqlite3 defaults'], results['storage.connect']
+        print(f"speedup            {base[0] / tuned[0]:>10.2f}x {base[1] / tuned[1]:>12.2f}x {base[2] / tuned[2]:>17.2f}x")
+
+        with sqlite3.connect(args.db) as conn:
+            sale_numbers = [row[0] for row in conn.execute(
+                "SELECT DISTINCT sale_number FROM auction_sales WHERE sale_number IS NOT NULL")]
+        if sale_numbers:
+            connections = {name: [] for name in ['sqlite3 defaults', 'storage.connect', 'pooled_connection']}
+            for _ in range(args.repeat):
+                for name, seconds in bench_connections(analysis_db, sale_numbers).items():
+                    connections[name].append(seconds)
+            print(f"\n{CONNECTION_READS} short reads, one connection each:")
+            for name, runs in connections.items():
+                print(f"{name:<18} {statistics.median(runs):>11.3f} s")
+    finally:
+        storage.close_pools()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
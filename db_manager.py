@@ -2,13 +2,14 @@
 import sqlite3
 import json
 import logging
+import storage
 
 DATABASE_NAME = 'market_data.db'
 JSON_OUTPUT_FILE = 'market-reports-library.json'
 
 def initialize_database():
     logging.info(f"Initializing database: {DATABASE_NAME}")
-    with sqlite3.connect(DATABASE_NAME) as conn:
+    with storage.pooled_connection(DATABASE_NAME) as conn:
         cursor = conn.cursor()
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS reports (
@@ -26,7 +27,7 @@ def initialize_database():
 
 def insert_report_data(report_metadata, granular_data_df):
     report_id = None
-    with sqlite3.connect(DATABASE_NAME) as conn:
+    with storage.pooled_connection(DATABASE_NAME) as conn:
         cursor = conn.cursor()
         try:
             cursor.execute('''
@@ -64,9 +65,9 @@ def build_reports_json():
     logging.info("DB Manager: Building JSON file for the website.")
     reports_list = []
     try:
-        with sqlite3.connect(DATABASE_NAME) as conn:
-            conn.row_factory = sqlite3.Row
+        with storage.pooled_connection(DATABASE_NAME) as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             query = "SELECT title, description, auction_centre, week_number, year, source, report_link FROM reports ORDER BY year DESC, week_number DESC"
             cursor.execute(query)
             rows = cursor.fetchall()
@@ -0,0 +1,192 @@
+# instrumentation.py
+# Lightweight stage timing for the ETL and the analyzer: nested spans with wall time, counters and the
+# tracemalloc peak, one JSON-lines record per span, and a summary table (sorted by total time) at exit.
+#
+# Disabled unless enable() is called (process_mombasa_data.py --trace FILE) or TEATRADE_TRACE is set:
+#   TEATRADE_TRACE=trace.jsonl python analyze_mombasa.py
+# TEATRADE_TRACE=- prints the summary without writing records. Disabled spans cost one function call.
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import multiprocessing
+import tracemalloc
+from contextlib import contextmanager
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+TRACE_ENV_VAR = 'TEATRADE_TRACE'
+# Set to 0 to skip tracemalloc (it slows allocation-heavy pandas code noticeably)
+TRACE_MEMORY_ENV_VAR = 'TEATRADE_TRACE_MEMORY'
+# Frames kept per allocation; 1 is enough for peaks and keeps the overhead down
+TRACEMALLOC_FRAMES = 1
+
+_state = {'enabled': False, 'trace_file': None, 'memory': False, 'summary_registered': False}
+_write_lock = threading.Lock()
+_local = threading.local()
+# name -> {'calls', 'total', 'max', 'peak_mb', 'counters'}
+_totals = {}
+
+# =============================================================================
+# Setup
+# =============================================================================
+
+def enable(trace_file=None, memory=True, print_at_exit=True):
+    """
+    Turns span recording on for this process. Records are appended to trace_file (JSON lines) if given;
+    the summary table is printed at exit. Worker processes inherit the setting through the environment.
+    """
+    _state['enabled'] = True
+    _state['trace_file'] = os.path.abspath(trace_file) if trace_file else None
+    _state['memory'] = memory
+    os.environ[TRACE_ENV_VAR] = _state['trace_file'] or '-'
+    os.environ[TRACE_MEMORY_ENV_VAR] = '1' if memory else '0'
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    if print_at_exit and not _state['summary_registered']:
+        atexit.register(print_summary)
+        _state['summary_registered'] = True
+
+def is_enabled():
+    return _state['enabled']
+
+def _enable_from_environment():
+    value = os.environ.get(TRACE_ENV_VAR)
+    if value:
+        # Worker processes only write records; the summary belongs to the parent
+        enable(None if value == '-' else value, memory=os.environ.get(TRACE_MEMORY_ENV_VAR, '1') != '0',
+               print_at_exit=multiprocessing.parent_process() is None)
+
+# =============================================================================
+# Spans
+# =============================================================================
+
+class _NullSpan:
+    def count(self, name, value=1):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    """An open span; count() adds to its counters (e.g. rows read, rows inserted)."""
+    __slots__ = ('name', 'parent', 'fields', 'counters', 'start', 'mem_start', 'mem_peak')
+
+    def __init__(self, name, parent, fields):
+        self.name = name
+        self.parent = parent
+        self.fields = fields
+        self.counters = {}
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+@contextmanager
+def span(name, **fields):
+    """
+    Times the block as a span named name (dotted, e.g. 'etl.read'); fields are copied into its record.
+    Spans nest: the tracemalloc peak of a span includes its children's.
+    """
+    if not _state['enabled']:
+        yield _NULL_SPAN
+        return
+
+    stack = _stack()
+    current = Span(name, stack[-1] if stack else None, fields)
+    if _state['memory']:
+        traced, peak = tracemalloc.get_traced_memory()
+        if current.parent is not None:
+            # Keep the parent's peak so far before the counter is reset for this span
+            current.parent.mem_peak = max(current.parent.mem_peak, peak)
+        tracemalloc.reset_peak()
+        current.mem_start, current.mem_peak = traced, traced
+    stack.append(current)
+    error = None
+    current.start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - current.start
+        stack.pop()
+        peak_mb = None
+        if _state['memory']:
+            current.mem_peak = max(current.mem_peak, tracemalloc.get_traced_memory()[1])
+            peak_mb = (current.mem_peak - current.mem_start) / (1024 * 1024)
+            if current.parent is not None:
+                # The next sibling resets the counter, so hand this peak up now
+                current.parent.mem_peak = max(current.parent.mem_peak, current.mem_peak)
+        _finish(current, duration, peak_mb, error)
+
+def count(name, value=1):
+    """Adds to a counter of the innermost open span (no-op when disabled or outside a span)."""
+    if _state['enabled']:
+        stack = _stack()
+        if stack:
+            stack[-1].count(name, value)
+
+def _finish(current, duration, peak_mb, error):
+    totals = _totals.setdefault(current.name, {'calls': 0, 'total': 0.0, 'max': 0.0, 'peak_mb': None, 'counters': {}})
+    totals['calls'] += 1
+    totals['total'] += duration
+    totals['max'] = max(totals['max'], duration)
+    if peak_mb is not None:
+        totals['peak_mb'] = max(totals['peak_mb'] or 0.0, peak_mb)
+    for key, value in current.counters.items():
+        totals['counters'][key] = totals['counters'].get(key, 0) + value
+
+    if _state['trace_file'] is None:
+        return
+    record = {
+        'span': current.name,
+        'parent': current.parent.name if current.parent is not None else None,
+        'pid': os.getpid(),
+        'start': time.time() - duration,
+        'seconds': round(duration, 6),
+        'peak_mb': None if peak_mb is None else round(peak_mb, 3),
+        'counters': current.counters,
+    }
+    record.update(current.fields)
+    if error:
+        record['error'] = error
+    line = json.dumps(record, default=str) + '\n'
+    try:
+        # Appends of one short line are atomic, so worker processes can share the file
+        with _write_lock, open(_state['trace_file'], 'a', encoding='utf-8') as f:
+            f.write(line)
+    except OSError as e:
+        logging.warning(f"[INSTRUMENTATION] Could not write trace record to {_state['trace_file']}: {e}")
+
+# =============================================================================
+# Summary
+# =============================================================================
+
+def summary():
+    """Rows (name, calls, total seconds, max seconds, peak MB, counters) sorted by total time, longest first."""
+    rows = [(name, t['calls'], t['total'], t['max'], t['peak_mb'], t['counters']) for name, t in _totals.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+def print_summary(file=None):
+    rows = summary()
+    if not rows:
+        return
+    file = file or sys.stderr
+    width = max(len('span'), max(len(row[0]) for row in rows))
+    print(f"\n{'span':<{width}} {'calls':>6} {'total (s)':>10} {'max (s)':>9} {'peak (MB)':>10}  counters", file=file)
+    for name, calls, total, longest, peak_mb, counters in rows:
+        peak = '-' if peak_mb is None else f"{peak_mb:.1f}"
+        counter_text = ', '.join(f"{key}={value}" for key, value in sorted(counters.items()))
+        print(f"{name:<{width}} {calls:>6} {total:>10.3f} {longest:>9.3f} {peak:>10}  {counter_text}", file=file)
+
+_enable_from_environment()
@@ -0,0 +1,455 @@
+# migrations.py
+# Versioned schema migrations for market_reports.db, applied in order and recorded in schema_version.
+#
+# Usage: python migrations.py [--db market_reports.db] [--check]
+#   Applies pending migrations; --check then verifies (EXPLAIN QUERY PLAN) that the analysis access paths use their indexes.
+import sqlite3
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime
+
+import storage
+import sale_calendar
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+try:
+    REPO_PATH = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    REPO_PATH = os.path.abspath(os.getcwd())
+
+DB_FILE = os.path.abspath(os.path.join(REPO_PATH, "market_reports.db"))
+
+# After migrations, the database is vacuumed if more than this fraction of its pages is free
+VACUUM_FREE_FRACTION = 0.25
+
+# Dimension tables: (text column, table). Each distinct name is stored once with an integer surrogate key;
+# the lot fact tables store <column>_id instead of the text.
+DIMENSION_TABLES = [
+    ('broker', 'dim_broker'),
+    ('mark', 'dim_mark'),
+    ('grade', 'dim_grade'),
+    ('buyer', 'dim_buyer'),
+]
+
+# Lot tables split into a fact table (ids) and a view with the original name and columns (text joined back in) by
+# migration 3; migration 4 merges the two fact tables into LOTS_TABLE
+FACT_TABLES = {
+    'auction_sales': 'auction_sales_facts',
+    'auction_offers': 'auction_offers_facts',
+}
+
+# Column order of the original tables (and so of the views). Dimension columns are resolved through their dim_ table.
+LOT_TABLE_COLUMNS = {
+    'auction_sales': ['id', 'source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade', 'lot_number',
+                      'invoice_number', 'quantity_kgs', 'package_count', 'price', 'buyer', 'source_file_identifier',
+                      'processed_timestamp'],
+    'auction_offers': ['id', 'source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade', 'lot_number',
+                       'invoice_number', 'quantity_kgs', 'package_count', 'valuation_or_rp', 'source_file_identifier',
+                       'processed_timestamp'],
+}
+
+# Analysis indexes of migration 2 (on the text columns of the original tables; see LOTS_INDEXES for the current ones).
+# Trailing columns make the typical weekly queries covering.
+ANALYSIS_INDEXES = [
+    ('idx_sales_sale_grade_price', 'auction_sales', ['sale_number', 'grade', 'price']),
+    ('idx_sales_mark_grade_sale', 'auction_sales', ['mark', 'grade', 'sale_number', 'price']),
+    ('idx_sales_buyer_sale', 'auction_sales', ['buyer', 'sale_number']),
+    ('idx_sales_broker_sale', 'auction_sales', ['broker', 'sale_number']),
+    ('idx_offers_sale_broker_lot', 'auction_offers', ['sale_number', 'broker', 'lot_number']),
+    ('idx_offers_mark_grade_sale', 'auction_offers', ['mark', 'grade', 'sale_number']),
+]
+
+# The analysis indexes recreated on the fact tables by migration 3 (dimension ids instead of text)
+FACT_INDEXES = [
+    ('idx_sales_sale_grade_price', 'auction_sales_facts', ['sale_number', 'grade_id', 'price']),
+    ('idx_sales_mark_grade_sale', 'auction_sales_facts', ['mark_id', 'grade_id', 'sale_number', 'price']),
+    ('idx_sales_buyer_sale', 'auction_sales_facts', ['buyer_id', 'sale_number']),
+    ('idx_sales_broker_sale', 'auction_sales_facts', ['broker_id', 'sale_number']),
+    ('idx_offers_sale_broker_lot', 'auction_offers_facts', ['sale_number', 'broker_id', 'lot_number']),
+    ('idx_offers_mark_grade_sale', 'auction_offers_facts', ['mark_id', 'grade_id', 'sale_number']),
+]
+
+# Migration 4 merges the fact tables into one lots table with one row per lot key; its role flags say which view it
+# belongs to (a sold lot is one row in both: the listing, with the sale's price, buyer and outcome).
+LOTS_TABLE = 'auction_lots'
+LOT_ROLES = {
+    'auction_offers': 'listed',
+    'auction_sales': 'sold',
+}
+LOTS_TABLE_COLUMNS = ['id', 'source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade', 'lot_number',
+                      'invoice_number', 'quantity_kgs', 'package_count', 'valuation_or_rp', 'price', 'buyer', 'outcome',
+                      'listed', 'sold', 'source_file_identifier', 'processed_timestamp']
+# auction_lots.outcome: NULL while the auction result is not known (catalogue listings)
+LOT_OUTCOMES = ['sold', 'unsold', 'withdrawn']
+
+# The unique lot key and the analysis indexes on auction_lots, partial on the role of the view they serve
+LOTS_INDEXES = [
+    ('idx_lots_key', ['source_location', 'sale_number', 'lot_number'], None, True),
+    ('idx_sales_sale_grade_price', ['sale_number', 'grade_id', 'price'], 'sold = 1', False),
+    ('idx_sales_mark_grade_sale', ['mark_id', 'grade_id', 'sale_number', 'price'], 'sold = 1', False),
+    ('idx_sales_buyer_sale', ['buyer_id', 'sale_number'], 'sold = 1', False),
+    ('idx_sales_broker_sale', ['broker_id', 'sale_number'], 'sold = 1', False),
+    ('idx_offers_sale_broker_lot', ['sale_number', 'broker_id', 'lot_number'], 'listed = 1', False),
+    ('idx_offers_mark_grade_sale', ['mark_id', 'grade_id', 'sale_number'], 'listed = 1', False),
+]
+
+# Indexes on the integer sale keys of auction_lots (migration 5), partial on the role like LOTS_INDEXES
+SALE_KEY_INDEXES = [
+    ('idx_lots_listed_sale_key', ['sale_year', 'sale_no'], 'listed = 1'),
+    ('idx_lots_sold_sale_key', ['sale_year', 'sale_no'], 'sold = 1'),
+]
+
+# Access paths checked by --check: (description, query, parameters, index the plan must use)
+ANALYSIS_ACCESS_PATHS = [
+    ("sales of a week by grade",
+     "SELECT grade, COUNT(*), AVG(price) FROM auction_sales WHERE sale_number = ? GROUP BY grade",
+     ('39',), 'idx_sales_sale_grade_price'),
+    ("price history of a mark and grade",
+     "SELECT sale_number, AVG(price) FROM auction_sales WHERE mark = ? AND grade = ? GROUP BY sale_number",
+     ('KAPCHORUA', 'BP1'), 'idx_sales_mark_grade_sale'),
+    ("purchases of a buyer",
+     "SELECT sale_number, COUNT(*) FROM auction_sales WHERE buyer = ? GROUP BY sale_number",
+     ('BUYER',), 'idx_sales_buyer_sale'),
+    ("lots sold by a broker",
+     "SELECT sale_number, COUNT(*) FROM auction_sales WHERE broker = ? GROUP BY sale_number",
+     ('BROKER',), 'idx_sales_broker_sale'),
+    ("lots offered in a week",
+     "SELECT COUNT(*) FROM (SELECT DISTINCT broker, lot_number FROM auction_offers WHERE sale_number = ?)",
+     ('39',), 'idx_offers_sale_broker_lot'),
+    ("offers of a mark and grade",
+     "SELECT sale_number, COUNT(*) FROM auction_offers WHERE mark = ? AND grade = ? GROUP BY sale_number",
+     ('KAPCHORUA', 'BP1'), 'idx_offers_mark_grade_sale'),
+    ("lots sold in a calendar sale",
+     f"SELECT COUNT(*) FROM {LOTS_TABLE} WHERE sold = 1 AND sale_year = ? AND sale_no = ?",
+     (2025, 39), 'idx_lots_sold_sale_key'),
+    ("lots offered in a calendar sale",
+     f"SELECT COUNT(*) FROM {LOTS_TABLE} WHERE listed = 1 AND sale_year = ? AND sale_no = ?",
+     (2025, 39), 'idx_lots_listed_sale_key'),
+]
+
+# =============================================================================
+# Migrations
+# =============================================================================
+
+def table_columns(conn, table_name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+
+def migrate_lot_package_count(conn):
+    """Databases created before package counts were captured lack package_count (see calculate_total_weight)."""
+    for table_name in ['auction_sales', 'auction_offers']:
+        columns = table_columns(conn, table_name)
+        if columns and 'package_count' not in columns:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN package_count INTEGER")
+            logging.info(f"[MIGRATIONS] Added package_count to {table_name}.")
+
+def migrate_analysis_indexes(conn):
+    """Indexes for the analysis access paths (week, mark+grade, buyer, broker)."""
+    for index_name, table_name, columns in ANALYSIS_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})")
+
+def fact_table_sql(table_name):
+    """CREATE TABLE statement of a lot table's fact table: the original columns with dimension text replaced by ids."""
+    dimensions = dict(DIMENSION_TABLES)
+    definitions = []
+    for column in LOT_TABLE_COLUMNS[table_name]:
+        if column == 'id':
+            definitions.append('id INTEGER PRIMARY KEY')
+        elif column in dimensions:
+            definitions.append(f"{column}_id INTEGER REFERENCES {dimensions[column]}(id)")
+        elif column in ('source_location', 'lot_number', 'source_file_identifier', 'processed_timestamp'):
+            definitions.append(f"{column} TEXT NOT NULL")
+        elif column in ('quantity_kgs', 'price', 'valuation_or_rp'):
+            definitions.append(f"{column} REAL")
+        elif column == 'package_count':
+            definitions.append(f"{column} INTEGER")
+        else:
+            definitions.append(f"{column} TEXT")
+    definitions.append('UNIQUE(source_location, sale_number, lot_number)')
+    return f"CREATE TABLE {FACT_TABLES[table_name]} ({', '.join(definitions)})"
+
+def lot_view_sql(table_name):
+    """CREATE VIEW statement presenting a fact table under the original table name and columns."""
+    dimensions = dict(DIMENSION_TABLES)
+    select, joins = [], []
+    for column in LOT_TABLE_COLUMNS[table_name]:
+        if column in dimensions:
+            alias = f"d_{column}"
+            select.append(f"{alias}.name AS {column}")
+            joins.append(f"LEFT JOIN {dimensions[column]} {alias} ON {alias}.id = f.{column}_id")
+        else:
+            select.append(f"f.{column}")
+    return f"CREATE VIEW {table_name} AS SELECT {', '.join(select)} FROM {FACT_TABLES[table_name]} f {' '.join(joins)}"
+
+def migrate_dimension_tables(conn):
+    """
+    Interns broker, mark, grade and buyer names into dim_ tables and moves the lot rows into fact tables that
+    store the integer ids. auction_sales and auction_offers become views with the original columns, so
+    existing queries keep working; writers use the fact tables (process_mombasa_data.upsert_data).
+    """
+    dimensions = dict(DIMENSION_TABLES)
+    for column, dim_table in DIMENSION_TABLES:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {dim_table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+
+    for table_name, fact_table in FACT_TABLES.items():
+        columns = table_columns(conn, table_name)
+        for column in columns:
+            if column in dimensions:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO {dimensions[column]} (name)
+                    SELECT DISTINCT {column} FROM {table_name} WHERE {column} IS NOT NULL ORDER BY {column}
+                """)
+
+        conn.execute(fact_table_sql(table_name))
+        target, source, joins = [], [], []
+        for column in LOT_TABLE_COLUMNS[table_name]:
+            if column not in columns:
+                continue
+            if column in dimensions:
+                alias = f"d_{column}"
+                target.append(f"{column}_id")
+                source.append(f"{alias}.id")
+                joins.append(f"LEFT JOIN {dimensions[column]} {alias} ON {alias}.name = t.{column}")
+            else:
+                target.append(column)
+                source.append(f"t.{column}")
+        conn.execute(f"INSERT INTO {fact_table} ({', '.join(target)}) SELECT {', '.join(source)} FROM {table_name} t {' '.join(joins)}")
+        moved = conn.execute(f"SELECT COUNT(*) FROM {fact_table}").fetchone()[0]
+
+        # Dropping the table also drops its migration 2 indexes; they are recreated on the fact table below
+        conn.execute(f"DROP TABLE {table_name}")
+        conn.execute(lot_view_sql(table_name))
+        logging.info(f"[MIGRATIONS] Moved {moved} rows of {table_name} to {fact_table} (dimension ids); {table_name} is now a view.")
+
+    for index_name, table_name, columns in FACT_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})")
+
+def lots_table_sql():
+    """CREATE TABLE statement of auction_lots (dimension text stored as ids, like the fact tables)."""
+    dimensions = dict(DIMENSION_TABLES)
+    definitions = []
+    for column in LOTS_TABLE_COLUMNS:
+        if column == 'id':
+            definitions.append('id INTEGER PRIMARY KEY')
+        elif column in dimensions:
+            definitions.append(f"{column}_id INTEGER REFERENCES {dimensions[column]}(id)")
+        elif column in ('source_location', 'lot_number', 'source_file_identifier', 'processed_timestamp'):
+            definitions.append(f"{column} TEXT NOT NULL")
+        elif column in ('quantity_kgs', 'price', 'valuation_or_rp'):
+            definitions.append(f"{column} REAL")
+        elif column == 'package_count':
+            definitions.append(f"{column} INTEGER")
+        elif column in LOT_ROLES.values():
+            definitions.append(f"{column} INTEGER NOT NULL DEFAULT 0")
+        elif column == 'outcome':
+            outcomes = ', '.join(f"'{outcome}'" for outcome in LOT_OUTCOMES)
+            definitions.append(f"{column} TEXT CHECK ({column} IN ({outcomes}))")
+        else:
+            definitions.append(f"{column} TEXT")
+    return f"CREATE TABLE {LOTS_TABLE} ({', '.join(definitions)})"
+
+def lots_view_sql(table_name):
+    """CREATE VIEW statement presenting the rows of one role of auction_lots under the original table name and columns."""
+    dimensions = dict(DIMENSION_TABLES)
+    select, joins = [], []
+    for column in LOT_TABLE_COLUMNS[table_name]:
+        if column in dimensions:
+            alias = f"d_{column}"
+            select.append(f"{alias}.name AS {column}")
+            joins.append(f"LEFT JOIN {dimensions[column]} {alias} ON {alias}.id = l.{column}_id")
+        else:
+            select.append(f"l.{column}")
+    return (f"CREATE VIEW {table_name} AS SELECT {', '.join(select)} FROM {LOTS_TABLE} l {' '.join(joins)} "
+            f"WHERE l.{LOT_ROLES[table_name]} = 1")
+
+def migrate_lots_table(conn):
+    """
+    Merges auction_offers_facts and auction_sales_facts into auction_lots, one row per lot key as the processor
+    writes them (build_lot_upsert_sql): a sale whose lot is listed (same key) is stored on the listing's row, which
+    gains its price, buyer and outcome 'sold'; only sales without a listing (e.g. a NULL sale number) stay sold-only
+    rows. An undated listing takes its sale's date. Ids are assigned so that each view keeps its old row order.
+    Listings of a results file without a sale get outcome 'unsold'; other listings keep a NULL outcome.
+    """
+    offers_fact, sales_fact = FACT_TABLES['auction_offers'], FACT_TABLES['auction_sales']
+    dimensions = dict(DIMENSION_TABLES)
+    offer_columns = [f"{c}_id" if c in dimensions else c for c in LOT_TABLE_COLUMNS['auction_offers'] if c != 'id']
+    conn.execute(lots_table_sql())
+
+    # NULL sale numbers never match (as in the unique key), so those sales stay rows of their own
+    matches = ' AND '.join(f"o.{c} = s.{c}" for c in ('source_location', 'sale_number', 'lot_number'))
+    conn.execute(f"CREATE TEMP TABLE lot_merge AS SELECT o.id AS offer_id, s.id AS sale_id FROM {offers_fact} o JOIN {sales_fact} s ON {matches}")
+    conn.execute("CREATE UNIQUE INDEX temp.idx_lot_merge_sale ON lot_merge (sale_id)")
+    merged = conn.execute("SELECT COUNT(*) FROM lot_merge").fetchone()[0]
+
+    # Listings in id order, each carrying its matched sale; a separate sale goes just before the listing of the next
+    # matched sale (rows of a file are written in file order, so this is where it was in the file)
+    columns = offer_columns + ['price', 'buyer_id', 'outcome', 'listed', 'sold']
+    listings = (', '.join('COALESCE(o.sale_date, s.sale_date) AS sale_date' if c == 'sale_date' else f"o.{c}" for c in offer_columns) +
+                ", s.price, s.buyer_id, CASE WHEN s.id IS NULL THEN NULL ELSE 'sold' END AS outcome, 1 AS listed, s.id IS NOT NULL AS sold, "
+                "o.id AS position, 1 AS part, 0 AS sequence")
+    sales = (', '.join('NULL' if c == 'valuation_or_rp' else f"s.{c}" for c in offer_columns) +
+             ", s.price, s.buyer_id, 'sold', 0, 1, COALESCE((SELECT m.offer_id FROM lot_merge m WHERE m.sale_id > s.id ORDER BY m.sale_id LIMIT 1), "
+             f"(SELECT MAX(id) + 1 FROM {offers_fact})), 0, s.id")
+    conn.execute(f"""
+        INSERT INTO {LOTS_TABLE} ({', '.join(columns)})
+        SELECT {', '.join(columns)} FROM (
+            SELECT {listings} FROM {offers_fact} o
+            LEFT JOIN lot_merge m ON m.offer_id = o.id LEFT JOIN {sales_fact} s ON s.id = m.sale_id
+            UNION ALL
+            SELECT {sales} FROM {sales_fact} s WHERE s.id NOT IN (SELECT sale_id FROM lot_merge)
+        ) ORDER BY position, part, sequence
+    """)
+    conn.execute("DROP TABLE lot_merge")
+    separate = conn.execute(f"SELECT COUNT(*) FROM {LOTS_TABLE} WHERE listed = 0").fetchone()[0]
+    conn.execute(f"""
+        UPDATE {LOTS_TABLE} SET outcome = 'unsold'
+        WHERE sold = 0 AND source_file_identifier IN (SELECT source_file_identifier FROM {sales_fact})
+    """)
+
+    for table_name in LOT_ROLES:
+        conn.execute(f"DROP VIEW {table_name}")
+        conn.execute(lots_view_sql(table_name))
+    # Dropping the fact tables also drops their migration 3 indexes
+    conn.execute(f"DROP TABLE {offers_fact}")
+    conn.execute(f"DROP TABLE {sales_fact}")
+    for index_name, columns, where, unique in LOTS_INDEXES:
+        conn.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} ON {LOTS_TABLE} ({', '.join(columns)})"
+                     + (f" WHERE {where}" if where else ''))
+    total = conn.execute(f"SELECT COUNT(*) FROM {LOTS_TABLE}").fetchone()[0]
+    logging.info(f"[MIGRATIONS] Merged the lot fact tables into {LOTS_TABLE}: {total} rows ({merged} sales stored with their listing, {separate} separately).")
+
+def migrate_sale_calendar(conn):
+    """
+    Creates sale_calendar and the integer sale keys (sale_year, sale_no) of auction_lots, filled from the stored
+    sale_number and sale_date (sale_calendar.parse_sale_key; each distinct pair is parsed once). Lots whose sale
+    cannot be placed (a bare number without a date) keep NULL keys. The processor fills both for new lots.
+    """
+    sale_calendar.create_calendar_table(conn)
+    columns = table_columns(conn, LOTS_TABLE)
+    for column in sale_calendar.SALE_KEY_COLUMNS:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {LOTS_TABLE} ADD COLUMN {column} INTEGER")
+
+    keys = []
+    for sale_number, sale_date in conn.execute(f"SELECT DISTINCT sale_number, sale_date FROM {LOTS_TABLE}").fetchall():
+        key = sale_calendar.parse_sale_key(sale_number, sale_date)
+        if key is not None:
+            keys.append((sale_number, sale_date, *key))
+    conn.execute("CREATE TEMP TABLE sale_keys (sale_number TEXT, sale_date TEXT, year INTEGER, sale_no INTEGER)")
+    conn.executemany("INSERT INTO sale_keys VALUES (?, ?, ?, ?)", keys)
+    conn.execute("CREATE INDEX temp.idx_sale_keys ON sale_keys (sale_number, sale_date)")
+    conn.execute(f"""
+        UPDATE {LOTS_TABLE} SET (sale_year, sale_no) = (
+            SELECT k.year, k.sale_no FROM sale_keys k WHERE k.sale_number = {LOTS_TABLE}.sale_number AND k.sale_date IS {LOTS_TABLE}.sale_date
+        )
+    """)
+    conn.execute("DROP TABLE sale_keys")
+
+    sales = conn.execute(f"""
+        SELECT sale_year, sale_no, MIN(sale_date) FROM {LOTS_TABLE} WHERE sale_year IS NOT NULL GROUP BY sale_year, sale_no
+    """).fetchall()
+    sale_calendar.register_sales(conn, sales)
+    for index_name, columns, where in SALE_KEY_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {LOTS_TABLE} ({', '.join(columns)}) WHERE {where}")
+    unplaced = conn.execute(f"SELECT COUNT(*) FROM {LOTS_TABLE} WHERE sale_year IS NULL").fetchone()[0]
+    logging.info(f"[MIGRATIONS] Sale calendar: {len(sales)} sales; {unplaced} lots without a calendar sale (no year).")
+
+# Ordered (version, name, function). Append only: never renumber or edit a migration that has shipped.
+MIGRATIONS = [
+    (1, 'lot_package_count', migrate_lot_package_count),
+    (2, 'analysis_indexes', migrate_analysis_indexes),
+    (3, 'dimension_tables', migrate_dimension_tables),
+    (4, 'lots_table', migrate_lots_table),
+    (5, 'sale_calendar', migrate_sale_calendar),
+]
+
+# =============================================================================
+# Runner
+# =============================================================================
+
+def get_schema_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def run_migrations(conn, migrations=MIGRATIONS):
+    """
+    Applies every migration newer than the recorded schema version, each in its own transaction,
+    then refreshes the planner statistics (ANALYZE). Returns the versions applied.
+    """
+    current = get_schema_version(conn)
+    conn.commit()
+    applied = []
+    for version, name, migrate in migrations:
+        if version <= current:
+            continue
+        logging.info(f"[MIGRATIONS] Applying {version:03d}_{name}...")
+        with storage.write_transaction(conn):
+            migrate(conn)
+            conn.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                         (version, name, datetime.now().isoformat()))
+        applied.append(version)
+
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+        logging.info(f"[MIGRATIONS] Schema at version {applied[-1]}; statistics refreshed.")
+        free_pages, total_pages = [conn.execute(f"PRAGMA {name}").fetchone()[0] for name in ('freelist_count', 'page_count')]
+        if total_pages and free_pages / total_pages > VACUUM_FREE_FRACTION:
+            # Rebuilt tables leave their old pages free; VACUUM returns them to the file system
+            conn.execute("VACUUM")
+            logging.info(f"[MIGRATIONS] Vacuumed {free_pages} free pages of {total_pages}.")
+    return applied
+
+def explain_query_plan(conn, sql, params=()):
+    """Returns the detail strings of EXPLAIN QUERY PLAN for a query."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def check_query_plans(conn, access_paths=ANALYSIS_ACCESS_PATHS):
+    """
+    Verifies each analysis access path uses its index. Returns a list of (description, plan) for the
+    paths that regressed (full table scan or a different index).
+    """
+    failures = []
+    for description, sql, params, index_name in access_paths:
+        plan = explain_query_plan(conn, sql, params)
+        if not any(index_name in detail for detail in plan):
+            failures.append((description, plan))
+    return failures
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='MIGRATIONS: %(levelname)s: %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+    parser = argparse.ArgumentParser(description="Apply schema migrations to market_reports.db.")
+    parser.add_argument('--db', default=DB_FILE, help=f"Database file (default: {DB_FILE}).")
+    parser.add_argument('--check', action='store_true',
+                        help="After migrating, verify the analysis queries use their indexes (exit code 1 on a full scan).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"Database not found: {args.db}. Run process_mombasa_data.py first.")
+
+    conn = storage.connect(args.db)
+    try:
+        applied = run_migrations(conn)
+        if not applied:
+            logging.info(f"[MIGRATIONS] Schema is up to date (version {get_schema_version(conn)}).")
+        if args.check:
+            failures = check_query_plans(conn)
+            for description, plan in failures:
+                logging.error(f"[MIGRATIONS] Query plan regression for {description}: {' | '.join(plan)}")
+            if failures:
+                sys.exit(1)
+            logging.info(f"[MIGRATIONS] All {len(ANALYSIS_ACCESS_PATHS)} analysis access paths use their indexes.")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,32 @@ import time
 import logging
 import warnings
 import sys
+import argparse
+import hashlib
+import json
+import zipfile
+import operator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain as iter_chain
+from collections import Counter
+from contextlib import nullcontext
 import numpy as np # Import numpy for explicit NaN handling
+import storage # Shared SQLite connections (WAL, tuned pragmas)
+import migrations # Versioned schema changes (schema_version) applied after the base tables
+import sale_calendar # Integer (year, sale_no) keys of the lots and the sale_calendar table
+import instrumentation # Stage spans (--trace)
+
+# Streaming (read_only) Excel access
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Parquet parse cache (optional)
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 # Imports for unstructured data processing
 try:
@@ -20,6 +45,12 @@ try:
 except ImportError:
     docx = None
 
+# Watch mode: inotify on Linux (optional); otherwise the directory is polled
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
 # =============================================================================
 # Configuration (V23 - Synchronized with V15 Pipeline)
 # =============================================================================
@@ -45,6 +76,19 @@ MOMBASA_DIR = os.path.abspath(os.path.join(REPO_PATH, "Mombasa"))
 
 SOURCE_LOCATION = "Mombasa"
 
+# Recorded in the ingestion manifest. Bump when parsing changes so files that previously FAILED are retried.
+PROCESSOR_VERSION = "V23"
+
+# Block size for streaming content hashes (1 MiB)
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Parse cache: raw DataFrames as read from each source workbook, stored as Parquet keyed by content hash.
+# Bump PARSE_CACHE_VERSION when read_file() changes in a way that alters the raw frame.
+PARSE_CACHE_DIR = os.path.abspath(os.path.join(REPO_PATH, "parse_cache"))
+PARSE_CACHE_VERSION = 1
+# Tables cleared and repopulated by --rebuild-from-cache
+REBUILD_TABLES = ['auction_lots', 'grade_summary']
+
 warnings.filterwarnings("ignore", message="Cannot parse header or footer so it will be ignored")
 
 
@@ -72,17 +116,70 @@ COLUMN_MAP_LOT_DETAILS = {
     'buyer': ['Buyer', 'Buyer Name', 'Final Buyer'],
     'sale_date_internal': ['Selling End Time', 'Sale Date'],
     'sale_number_internal': ['Sale Code', 'Auction'],
+    'status': ['Status', 'Lot Status'],
 }
 
 COLUMN_MAP_GRADE_SUMMARY = {
     'grade': ['Region/Grade'],
     'lots': ['Lots'],
-    'quantity_kgs': ['Kilos', 'Pkgs', 'Kgs'],
+    'quantity_kgs': ['Kilos', 'Kgs'],
+}
+# Summary sheets: header row is 'Region/Grade | Lots | Pkgs | Kilos'; the block ends with this label
+SUMMARY_HEADER_KEYWORDS = ['Region/Grade', 'Lots', 'Pkgs', 'Kilos']
+SUMMARY_TOTAL_LABEL = 'GRAND TOTAL'
+
+# Upserts: unique key of each table and how rows that conflict on it are handled.
+# auction_sales/auction_offers are views; their rows are written to auction_lots with the view's role flag set
+# (migrations.LOT_ROLES). A lot key has one auction_lots row: a sale is stored on its lot's listing.
+UNIQUE_KEY_COLUMNS = ['source_location', 'sale_number', 'lot_number']
+TABLE_UNIQUE_KEYS = {
+    'auction_lots': UNIQUE_KEY_COLUMNS,
+    'grade_summary': ['source_location', 'sale_number', 'auction_type', 'grade'],
 }
+CONFLICT_POLICIES = ['ignore', 'replace', 'update']
+DEFAULT_CONFLICT_POLICY = 'ignore'
+# Bookkeeping columns: rewritten on update but never treated as a data change
+PROVENANCE_COLUMNS = ['source_file_identifier', 'processed_timestamp']
+# auction_lots columns a sale adds to its lot's listing (every other column of a sold lot's row is the listing's)
+SALE_RESULT_COLUMNS = ['price', 'buyer_id', 'outcome']
+# A lot stored without a sale date takes these from any dated row of the same lot, whatever the policy, so an undated
+# listing (an AuctionSummary) never hides the dated one of a results file
+SALE_DATE_COLUMNS = ['sale_date'] + sale_calendar.SALE_KEY_COLUMNS
+
+# Streaming mode: rows per chunk handed to process_lot_details/insert_data
+STREAM_CHUNK_SIZE = 5000
+# Rows buffered at the start of each sheet for header detection (matches the nrows=20 probe of read_excel_file)
+HEADER_PROBE_ROWS = 20
+
+# Watch mode (--watch): a file is ingested once its size and mtime have been stable for the debounce period
+WATCH_DEBOUNCE_SECONDS = 5.0
+WATCH_POLL_INTERVAL = 2.0
+# One JSON line per ingested batch: files and affected sale numbers (for scoped downstream regeneration)
+AFFECTED_SALES_LOG = os.path.abspath(os.path.join(REPO_PATH, "affected_sales.jsonl"))
+# Tables whose rows carry processed_timestamp (rows written or changed by a batch identify its sales)
+AFFECTED_SALE_TABLES = ['auction_lots', 'grade_summary', 'market_commentary']
+
+# Unstructured documents (market reports, circulars, weather) -> market_commentary
+UNSTRUCTURED_EXTENSIONS = ['.pdf', '.docx']
+# Pages extracted per worker task (large manuals are split across workers)
+DOCUMENT_PAGE_BATCH = 16
+# content_type is the first match on the filename; anything else is stored as DOCUMENT
+COMMENTARY_CONTENT_TYPES = [
+    ('MARKET_REPORT', r'market\s+report'),
+    ('AVERAGE_PRICES', r'average\s+prices|comparative'),
+    ('AUCTION_QUANTITIES', r'auction\s+quantit'),
+    ('WEATHER', r'weather'),
+    ('CIRCULAR', r'circular|amendment'),
+]
 
 # Keywords used for dynamic header detection
 HEADER_KEYWORDS = ['LotNo', 'Garden', 'Grade', 'Invoice', 'Pkgs', 'Kilos', 'RP', 'Valuation', 'Price', 'Buyer', 'Mark', 'Lot', 'Broker', 'Weight', 'Bags']
 
+# Layout registry: rows searched for a known header fingerprint (same window as find_header_row)
+HEADER_SEARCH_ROWS = 15
+# Minimum mapped columns (including lot_number) before a detected header is registered
+LAYOUT_MIN_MAPPED_COLUMNS = 4
+
 # =============================================================================
 # Database Initialization (V18 Schema)
 # =============================================================================
@@ -98,7 +195,7 @@ def initialize_database():
             return False
 
     try:
-        with sqlite3.connect(DB_FILE) as conn:
+        with storage.pooled_connection(DB_FILE) as conn:
             # Create tables using the latest V18 schema
             # (Table creation logic remains the same as previous stable versions)
             conn.execute("""
@@ -108,6 +205,32 @@ def initialize_database():
                     UNIQUE(file_identifier, data_type)
                 )
             """)
+            # Content-hash manifest: one row per distinct file content (renamed copies share a row).
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_manifest (
+                    content_hash TEXT NOT NULL, data_type TEXT NOT NULL, file_size INTEGER NOT NULL,
+                    sheet_count INTEGER, filename TEXT NOT NULL, status TEXT NOT NULL, records_inserted INTEGER,
+                    processor_version TEXT NOT NULL, first_seen TEXT NOT NULL, last_seen TEXT NOT NULL,
+                    PRIMARY KEY(content_hash, data_type)
+                )
+            """)
+            # Stat cache: lets unchanged files (same name, size and mtime) skip hashing entirely.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_manifest_files (
+                    filename TEXT PRIMARY KEY, file_size INTEGER NOT NULL, file_mtime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL
+                )
+            """)
+            # Layout registry: known header layouts (fingerprint of the header-row cells) and their column mapping.
+            # column_map_signature ties an entry to the alias map/keywords it was resolved with.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS layout_registry (
+                    fingerprint TEXT NOT NULL, column_map_signature TEXT NOT NULL, header_row_index INTEGER NOT NULL,
+                    header_cells TEXT NOT NULL, column_mapping TEXT NOT NULL, status TEXT NOT NULL,
+                    first_seen_file TEXT NOT NULL, first_seen TEXT NOT NULL, last_seen TEXT NOT NULL, seen_count INTEGER NOT NULL,
+                    PRIMARY KEY(fingerprint, column_map_signature)
+                )
+            """)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS auction_sales (
                     id INTEGER PRIMARY KEY, source_location TEXT NOT NULL, sale_date TEXT, sale_number TEXT,
@@ -134,6 +257,12 @@ def initialize_database():
                     UNIQUE(source_location, sale_number, auction_type, grade)
                 )
             """)
+            # Extracted text per document page, keyed by a hash of the page content (unchanged pages are not re-extracted)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_text_cache (
+                    page_hash TEXT PRIMARY KEY, text TEXT NOT NULL, first_seen_file TEXT NOT NULL, extracted_at TEXT NOT NULL
+                )
+            """)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS market_commentary (
                     id INTEGER PRIMARY KEY,
@@ -148,6 +277,8 @@ def initialize_database():
                 )
             """)
             conn.commit()
+            # Columns and analysis indexes added since the base schema
+            migrations.run_migrations(conn)
             logging.info("[DB_DIAGNOSTIC] Database schema initialized/verified successfully.")
 
         # DIAGNOSTIC: Verify file existence
@@ -185,8 +316,9 @@ def clean_and_cast_numeric_columns(df):
         series = series.str.replace(r'[$,]', '', regex=True)
 
         # If decimals are not allowed, remove everything after the decimal point
+        # (Regex form keeps the string dtype even when every value is missing, e.g. an all-empty streamed chunk)
         if not allow_decimal:
-            series = series.str.split('.').str[0]
+            series = series.str.replace(r'\..*', '', regex=True)
 
         # Replace empty strings or strings that became empty after cleaning with NaN
         series = series.replace(r'^\s*$', np.nan, regex=True)
@@ -211,7 +343,8 @@ def clean_and_cast_numeric_columns(df):
     logging.info("  [CLEANING] Rigorous cleaning and casting complete.")
     return df
 
-def log_processing_status(conn, file_identifier, data_type, records_inserted, status):
+def log_processing_status(conn, file_identifier, data_type, records_inserted, status, commit=True):
+    """Records a file's outcome in processing_log. commit=False leaves it to the enclosing (batch) transaction."""
     try:
         timestamp = datetime.now().isoformat()
         # Use INSERT OR REPLACE to handle updates if rerunning the same file/type combo
@@ -220,38 +353,149 @@ def log_processing_status(conn, file_identifier, data_type, records_inserted, st
             (file_identifier, processed_timestamp, records_inserted, data_type, status)
             VALUES (?, ?, ?, ?, ?)
         """, (file_identifier, timestamp, records_inserted, data_type, status))
-        conn.commit()
+        if commit:
+            conn.commit()
     except sqlite3.Error as e:
         logging.error(f"Failed to log processing status for {file_identifier}: {e}")
 
-def check_already_processed(conn, file_identifier, data_type):
+def hash_file_contents(filepath):
+    """Computes a SHA-256 digest of the file by streaming fixed-size blocks (constant memory)."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def count_workbook_sheets(filepath):
+    """
+    Counts worksheets in an .xlsx/.xlsm workbook by reading xl/workbook.xml from the zip container.
+    No Excel parsing is performed. Returns None for formats where this is not applicable.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == '.csv':
+        return 1
+    if ext not in ['.xlsx', '.xlsm']:
+        return None
+    try:
+        with zipfile.ZipFile(filepath) as zf:
+            workbook_xml = zf.read('xl/workbook.xml')
+        return len(re.findall(rb'<(?:\w+:)?sheet\b', workbook_xml))
+    except (zipfile.BadZipFile, KeyError, OSError) as e:
+        logging.warning(f"  [MANIFEST] Could not count sheets in {os.path.basename(filepath)}: {e}")
+        return None
+
+def fingerprint_file(conn, filepath):
+    """
+    Returns the manifest fingerprint for a file: content hash, size and sheet count.
+    If the name, size and mtime match the stat cache, the stored hash is reused without reading the file.
+    """
+    filename = os.path.basename(filepath)
+    stat = os.stat(filepath)
+
+    content_hash = None
     try:
         cursor = conn.execute("""
-            SELECT status FROM processing_log WHERE file_identifier = ? AND data_type = ?
-        """, (file_identifier, data_type))
-        result = cursor.fetchone()
-        return result is not None and result[0] == 'SUCCESS'
+            SELECT content_hash FROM ingestion_manifest_files WHERE filename = ? AND file_size = ? AND file_mtime_ns = ?
+        """, (filename, stat.st_size, stat.st_mtime_ns))
+        row = cursor.fetchone()
+        if row:
+            content_hash = row[0]
     except sqlite3.Error as e:
-        logging.error(f"Database error checking processing status: {e}")
+        logging.error(f"Database error reading the manifest stat cache: {e}")
+
+    if content_hash is None:
+        content_hash = hash_file_contents(filepath)
+        try:
+            conn.execute("""
+                INSERT OR REPLACE INTO ingestion_manifest_files (filename, file_size, file_mtime_ns, content_hash)
+                VALUES (?, ?, ?, ?)
+            """, (filename, stat.st_size, stat.st_mtime_ns, content_hash))
+        except sqlite3.Error as e:
+            logging.error(f"Failed to update the manifest stat cache for {filename}: {e}")
+
+    return {
+        'filename': filename,
+        'content_hash': content_hash,
+        'file_size': stat.st_size,
+        'sheet_count': None, # Filled lazily (only needed when the file is actually ingested)
+    }
+
+def build_file_identifier(fingerprint):
+    """Identifier stored in processing_log and source_file_identifier (name + content hash prefix)."""
+    return f"{fingerprint['filename']}|sha256:{fingerprint['content_hash'][:16]}"
+
+def check_manifest(conn, fingerprint, data_type, retry_failed=False):
+    """
+    Returns True if this exact content has already been ingested for the data type and can be skipped.
+    Renamed copies are recognised because the manifest is keyed by content hash, not by name.
+    """
+    try:
+        cursor = conn.execute("""
+            SELECT status, filename, processor_version FROM ingestion_manifest WHERE content_hash = ? AND data_type = ?
+        """, (fingerprint['content_hash'], data_type))
+        row = cursor.fetchone()
+    except sqlite3.Error as e:
+        logging.error(f"Database error checking the ingestion manifest: {e}")
+        return False
+
+    if row is None:
         return False
 
+    status, known_filename, processor_version = row
+    if status == 'FAILURE' and (retry_failed or processor_version != PROCESSOR_VERSION):
+        return False
+
+    if known_filename != fingerprint['filename']:
+        logging.info(f"  [MANIFEST] {fingerprint['filename']} has the same content as previously ingested {known_filename}.")
+    try:
+        conn.execute("""
+            UPDATE ingestion_manifest SET last_seen = ? WHERE content_hash = ? AND data_type = ?
+        """, (datetime.now().isoformat(), fingerprint['content_hash'], data_type))
+    except sqlite3.Error as e:
+        logging.error(f"Failed to update the ingestion manifest: {e}")
+    return True
+
+def update_ingestion_manifest(conn, fingerprint, filepath, data_type, status, records_inserted, commit=True):
+    """Records the outcome of ingesting a file's content. commit=False leaves it to the enclosing (batch) transaction."""
+    timestamp = datetime.now().isoformat()
+    sheet_count = fingerprint.get('sheet_count')
+    if sheet_count is None:
+        sheet_count = count_workbook_sheets(filepath)
+    try:
+        conn.execute("""
+            INSERT INTO ingestion_manifest
+            (content_hash, data_type, file_size, sheet_count, filename, status, records_inserted, processor_version, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(content_hash, data_type) DO UPDATE SET
+                file_size = excluded.file_size, sheet_count = excluded.sheet_count, filename = excluded.filename,
+                status = excluded.status, records_inserted = excluded.records_inserted,
+                processor_version = excluded.processor_version, last_seen = excluded.last_seen
+        """, (fingerprint['content_hash'], data_type, fingerprint['file_size'], sheet_count, fingerprint['filename'],
+              status, records_inserted, PROCESSOR_VERSION, timestamp, timestamp))
+        if commit:
+            conn.commit()
+    except sqlite3.Error as e:
+        logging.error(f"Failed to update the ingestion manifest for {fingerprint['filename']}: {e}")
+
+def build_alias_lookup(column_map):
+    """Flattens a column map into {normalized alias: standardized name}. The first standardized name listing an alias wins."""
+    lookup = {}
+    for standardized_name, aliases in column_map.items():
+        for alias in aliases:
+            lookup.setdefault(str(alias).strip().upper(), standardized_name)
+    return lookup
+
 def map_columns(df, column_map):
     """Maps detected column names to standardized internal names."""
     rename_dict = {}
+    alias_lookup = build_alias_lookup(column_map)
 
     for col in df.columns:
-        # Normalize the column name from the dataframe
-        normalized_col = str(col).strip().upper()
-
-        # Iterate through the standardized names and their aliases
-        for standardized_name, aliases in column_map.items():
-            # Normalize the aliases for comparison
-            normalized_aliases = [str(alias).strip().upper() for alias in aliases]
-            if normalized_col in normalized_aliases:
-                # If a match is found, add it to the rename dictionary
-                if standardized_name not in rename_dict.values():
-                     rename_dict[col] = standardized_name
-                break
+        # Normalize the column name from the dataframe and look up its standardized name
+        standardized_name = alias_lookup.get(str(col).strip().upper())
+        # The first matching column wins
+        if standardized_name and standardized_name not in rename_dict.values():
+            rename_dict[col] = standardized_name
 
     # Apply the renaming
     df_mapped = df.rename(columns=rename_dict)
@@ -308,7 +552,7 @@ def parse_date(date_str):
 
 def clean_text_columns(df):
     """Strips whitespace and converts text columns to uppercase."""
-    text_cols = ['broker', 'mark', 'grade', 'lot_number', 'invoice_number', 'buyer', 'sale_number', 'sale_date']
+    text_cols = ['broker', 'mark', 'grade', 'lot_number', 'invoice_number', 'buyer', 'sale_number', 'sale_date', 'status']
     for col in text_cols:
         if col in df.columns:
             df[col] = df[col].astype(str).str.strip().str.upper()
@@ -321,7 +565,7 @@ def clean_text_columns(df):
 # =============================================================================
 
 # (File reading functions remain the same as previous stable version V22)
-def find_header_row(df, keywords, max_rows=15):
+def find_header_row(df, keywords, max_rows=HEADER_SEARCH_ROWS):
     """
     Dynamically finds the header row by looking for the row with the maximum keyword matches.
     (Used for non-GeneralReport files).
@@ -354,42 +598,263 @@ def find_header_row(df, keywords, max_rows=15):
     logging.info(f"  [HEADER_DETECTION] Header row detected at index {header_row_index} (Matches: {best_match_count}).")
     return header_row_index
 
+# --- Layout registry -----------------------------------------------------------
+# Weekly reports reuse a handful of layouts. The header-row cells of each sheet are fingerprinted;
+# a known fingerprint gives the header row and column mapping directly (no find_header_row scan,
+# no alias matching) and lets the reader load only the mapped columns (usecols).
 
-def read_csv_file(filepath, keywords):
+def compute_column_map_signature(column_map, keywords):
+    """Short hash of the alias map and keywords. Registry entries resolved under other rules are ignored."""
+    payload = json.dumps([column_map, keywords], sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+def normalize_header_cells(row):
+    """
+    Normalized header-row cells (trailing blanks trimmed) so pandas and openpyxl reads fingerprint alike.
+    Digit runs are masked: period columns such as '2025/39 HIGH' change every week without changing the layout.
+    """
+    cells = ['' if v is None or (not isinstance(v, str) and pd.isna(v)) else re.sub(r'\d+', '#', str(v).strip().upper()) for v in row]
+    while cells and cells[-1] == '':
+        cells.pop()
+    return cells
+
+def fingerprint_header_cells(row):
+    return hashlib.sha1(json.dumps(normalize_header_cells(row)).encode('utf-8')).hexdigest()
+
+def resolve_column_mapping(header_cells, column_map):
+    """
+    Resolves {column position: standardized name} for a header row, with the same
+    first-match-wins rule as map_columns().
+    """
+    alias_lookup = build_alias_lookup(column_map)
+    column_mapping = {}
+    for position, name in enumerate(_build_streamed_columns(header_cells)):
+        standardized_name = alias_lookup.get(str(name).strip().upper())
+        if standardized_name and standardized_name not in column_mapping.values():
+            column_mapping[position] = standardized_name
+    return column_mapping
+
+def load_layout_registry(conn, column_map=COLUMN_MAP_LOT_DETAILS, keywords=HEADER_KEYWORDS):
+    """
+    Loads the known layouts for a column map into an in-memory snapshot.
+    The snapshot is passed to the readers (and to worker processes); new layouts and hits are
+    recorded in it and persisted by save_layout_registry() from the writer process.
+    """
+    signature = compute_column_map_signature(column_map, keywords)
+    layout_registry = {
+        'column_map': column_map,
+        'keywords': keywords,
+        'signature': signature,
+        'layouts': {},
+        'new': set(),
+        'seen': Counter(),
+    }
+    try:
+        cursor = conn.execute("""
+            SELECT fingerprint, header_row_index, header_cells, column_mapping, status, first_seen_file
+            FROM layout_registry WHERE column_map_signature = ?
+        """, (signature,))
+        for fingerprint, header_row_index, header_cells, column_mapping, status, first_seen_file in cursor.fetchall():
+            column_mapping = {int(position): name for position, name in json.loads(column_mapping).items()}
+            layout_registry['layouts'][fingerprint] = {
+                'header_row_index': header_row_index,
+                'header_cells': json.loads(header_cells),
+                'column_mapping': column_mapping,
+                'usecols': sorted(column_mapping),
+                'status': status,
+                'first_seen_file': first_seen_file,
+            }
+    except sqlite3.Error as e:
+        logging.error(f"Database error loading the layout registry: {e}")
+
+    logging.info(f"  [LAYOUT_REGISTRY] Loaded {len(layout_registry['layouts'])} known layout(s) (column map {signature}).")
+    return layout_registry
+
+def save_layout_registry(conn, layout_registry, commit=True):
+    """Persists layouts registered since the last save and the usage counts of known ones."""
+    if not layout_registry['new'] and not layout_registry['seen']:
+        return
+
+    timestamp = datetime.now().isoformat()
+    try:
+        for fingerprint in layout_registry['new']:
+            layout = layout_registry['layouts'][fingerprint]
+            column_mapping = {str(position): name for position, name in layout['column_mapping'].items()}
+            conn.execute("""
+                INSERT INTO layout_registry
+                (fingerprint, column_map_signature, header_row_index, header_cells, column_mapping, status,
+                 first_seen_file, first_seen, last_seen, seen_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT(fingerprint, column_map_signature) DO UPDATE SET
+                    last_seen = excluded.last_seen, seen_count = seen_count + 1
+            """, (fingerprint, layout_registry['signature'], layout['header_row_index'], json.dumps(layout['header_cells']),
+                  json.dumps(column_mapping), layout['status'], layout['first_seen_file'], timestamp, timestamp))
+
+        for fingerprint, count in layout_registry['seen'].items():
+            conn.execute("""
+                UPDATE layout_registry SET last_seen = ?, seen_count = seen_count + ?
+                WHERE fingerprint = ? AND column_map_signature = ?
+            """, (timestamp, count, fingerprint, layout_registry['signature']))
+        if commit:
+            conn.commit()
+    except sqlite3.Error as e:
+        logging.error(f"Failed to update the layout registry: {e}")
+
+    layout_registry['new'] = set()
+    layout_registry['seen'] = Counter()
+
+def merge_layout_registry(layout_registry, worker_registry):
+    """Folds a worker's copy of the registry (new layouts, hits) back into the writer's snapshot."""
+    for fingerprint in worker_registry['new']:
+        if fingerprint in layout_registry['layouts'] and fingerprint not in layout_registry['new']:
+            # Registered by an earlier result in this run: count it as a hit instead.
+            layout_registry['seen'][fingerprint] += 1
+            continue
+        layout_registry['layouts'][fingerprint] = worker_registry['layouts'][fingerprint]
+        layout_registry['new'].add(fingerprint)
+    layout_registry['seen'].update(worker_registry['seen'])
+
+def resolve_sheet_layout(probe_rows, layout_registry, source_name, fixed_header_row=None):
+    """
+    Resolves the header row and the columns to read for one sheet from its first rows.
+    A fingerprint hit skips detection entirely. Otherwise the header is detected with find_header_row()
+    (unless fixed, as for GeneralReport), mapped, registered as PENDING_REVIEW and flagged in the log.
+    Returns (header_row, usecols); usecols is None when no column could be mapped (read the whole sheet).
+    """
+    layouts = layout_registry['layouts']
+
+    if fixed_header_row is not None:
+        candidate_rows = [fixed_header_row] if fixed_header_row < len(probe_rows) else []
+    else:
+        candidate_rows = range(min(len(probe_rows), HEADER_SEARCH_ROWS))
+
+    for index in candidate_rows:
+        fingerprint = fingerprint_header_cells(probe_rows[index])
+        layout = layouts.get(fingerprint)
+        if layout is not None:
+            layout_registry['seen'][fingerprint] += 1
+            logging.info(f"  [LAYOUT_REGISTRY] Known layout {fingerprint[:12]} at row {index} ({layout['status']}). Header detection skipped.")
+            return index, layout['usecols']
+
+    # Unseen layout: detect and map as before
+    if fixed_header_row is not None:
+        header_row = fixed_header_row
+    else:
+        header_row = find_header_row(pd.DataFrame(probe_rows), layout_registry['keywords'])
+
+    if header_row >= len(probe_rows):
+        return header_row, None
+
+    column_mapping = resolve_column_mapping(probe_rows[header_row], layout_registry['column_map'])
+    usecols = sorted(column_mapping) or None
+
+    if 'lot_number' not in column_mapping.values() or len(column_mapping) < LAYOUT_MIN_MAPPED_COLUMNS:
+        # Rows that do not look like a lot-details header are not cached; they would mask the real
+        # header of sheets sharing the same title rows.
+        logging.warning(f"  [LAYOUT_REGISTRY] Unrecognised layout in {source_name} (row {header_row}) was not registered. Review this sheet.")
+        return header_row, usecols
+
+    fingerprint = fingerprint_header_cells(probe_rows[header_row])
+    layouts[fingerprint] = {
+        'header_row_index': header_row,
+        'header_cells': normalize_header_cells(probe_rows[header_row]),
+        'column_mapping': column_mapping,
+        'usecols': usecols,
+        'status': 'PENDING_REVIEW',
+        'first_seen_file': source_name,
+    }
+    layout_registry['new'].add(fingerprint)
+    logging.warning(f"  [LAYOUT_REGISTRY] New layout {fingerprint[:12]} in {source_name} (row {header_row}, "
+                    f"{len(column_mapping)} mapped columns). Flagged for review.")
+    return header_row, usecols
+
+def list_layouts(conn, status=None):
+    """Logs registered layouts (optionally only those with the given status) for review."""
+    query = "SELECT fingerprint, status, header_row_index, column_mapping, first_seen_file, seen_count, last_seen FROM layout_registry"
+    params = ()
+    if status:
+        query += " WHERE status = ?"
+        params = (status,)
+    rows = conn.execute(query + " ORDER BY first_seen", params).fetchall()
+    if not rows:
+        logging.info("[LAYOUT_REGISTRY] No layouts to review.")
+    for fingerprint, layout_status, header_row_index, column_mapping, first_seen_file, seen_count, last_seen in rows:
+        logging.info(f"[LAYOUT_REGISTRY] {fingerprint} {layout_status} header_row={header_row_index} seen={seen_count} "
+                     f"first_file={first_seen_file} last_seen={last_seen}")
+        logging.info(f"[LAYOUT_REGISTRY]   mapping: {column_mapping}")
+    return rows
+
+def approve_layouts(conn, fingerprints):
+    """Marks layouts as REVIEWED. Accepts full fingerprints or prefixes."""
+    approved = 0
+    for fingerprint in fingerprints:
+        cursor = conn.execute("UPDATE layout_registry SET status = 'REVIEWED' WHERE fingerprint LIKE ?", (f"{fingerprint}%",))
+        if cursor.rowcount == 0:
+            logging.warning(f"[LAYOUT_REGISTRY] No layout matches {fingerprint}.")
+        approved += cursor.rowcount
+    conn.commit()
+    logging.info(f"[LAYOUT_REGISTRY] Marked {approved} layout(s) as REVIEWED.")
+    return approved
+
+
+def read_csv_file(filepath, keywords, layout_registry=None, project_columns=True):
     """Reads a CSV file, applying specific logic for GeneralReport or dynamic detection for others."""
+    source_name = os.path.basename(filepath)
     try:
         # Check if it's a GeneralReport file (case-insensitive check)
-        if "GENERALREPORT" in os.path.basename(filepath).upper():
+        if "GENERALREPORT" in source_name.upper():
             logging.info("  [FILE_READ] Detected 'GeneralReport' (CSV). Applying specific parsing logic (Header=0, Skiprows=[1]).")
+            usecols = None
+            if layout_registry is not None:
+                temp_df = pd.read_csv(filepath, header=None, nrows=1, low_memory=False)
+                if temp_df.empty: return pd.DataFrame()
+                _, usecols = resolve_sheet_layout(temp_df.values.tolist(), layout_registry, source_name, fixed_header_row=0)
             # Use the first row (index 0) as the header AND skip the second row (index 1).
-            df = pd.read_csv(filepath, header=0, skiprows=[1], low_memory=False)
+            df = pd.read_csv(filepath, header=0, skiprows=[1], usecols=usecols if project_columns else None, low_memory=False)
             return df
 
         # Standard logic for other files
         # Step 1: Read the first few rows to detect the header
-        temp_df = pd.read_csv(filepath, header=None, nrows=20, low_memory=False)
+        temp_df = pd.read_csv(filepath, header=None, nrows=HEADER_PROBE_ROWS, low_memory=False)
         if temp_df.empty: return pd.DataFrame()
 
-        header_row = find_header_row(temp_df, keywords)
+        usecols = None
+        if layout_registry is not None:
+            header_row, usecols = resolve_sheet_layout(temp_df.values.tolist(), layout_registry, source_name)
+        else:
+            header_row = find_header_row(temp_df, keywords)
 
         # Step 2: Read the full file using the detected header row
-        df = pd.read_csv(filepath, header=header_row, low_memory=False)
+        df = pd.read_csv(filepath, header=header_row, usecols=usecols if project_columns else None, low_memory=False)
         return df
 
     except Exception as e:
         logging.error(f"Error reading CSV file {filepath}: {e}")
         return pd.DataFrame()
 
-def read_excel_file(filepath, keywords):
-    """Reads an Excel file, applying specific logic for GeneralReport or dynamic detection for others."""
+def read_excel_file(filepath, keywords, layout_registry=None, project_columns=True):
+    """
+    Reads an Excel file, applying specific logic for GeneralReport or dynamic detection for others.
+    project_columns=False keeps every column even when the layout registry knows which ones are mapped.
+    """
+    source_name = os.path.basename(filepath)
     try:
         # Check if it's a GeneralReport file (case-insensitive check)
-        if "GENERALREPORT" in os.path.basename(filepath).upper():
+        if "GENERALREPORT" in source_name.upper():
             logging.info("  [FILE_READ] Detected 'GeneralReport' (Excel). Applying specific parsing logic (Header=0, Skiprows=[1]).")
             # Use the first row (index 0) as the header AND skip the second row (index 1).
             # Assuming data is on the first sheet for GeneralReport Excel files.
             # Using openpyxl for better compatibility with modern Excel formats.
-            df = pd.read_excel(filepath, header=0, skiprows=[1], engine='openpyxl')
+            if layout_registry is None:
+                df = pd.read_excel(filepath, header=0, skiprows=[1], engine='openpyxl')
+                return df
+
+            # The workbook is loaded once; the header probe only converts the first row.
+            xls = pd.ExcelFile(filepath, engine='openpyxl')
+            temp_df = pd.read_excel(xls, sheet_name=0, header=None, nrows=1)
+            if temp_df.empty: return pd.DataFrame()
+            _, usecols = resolve_sheet_layout(temp_df.values.tolist(), layout_registry, f"{source_name}:{xls.sheet_names[0]}", fixed_header_row=0)
+            df = pd.read_excel(xls, sheet_name=0, header=0, skiprows=[1], usecols=usecols if project_columns else None)
             return df
 
         # Standard logic for other Excel files (handling multiple sheets)
@@ -406,13 +871,17 @@ def read_excel_file(filepath, keywords):
 
         for sheet_name in xls.sheet_names:
             # Step 1: Read the first few rows of the sheet to detect the header
-            temp_df = pd.read_excel(xls, sheet_name=sheet_name, header=None, nrows=20)
+            temp_df = pd.read_excel(xls, sheet_name=sheet_name, header=None, nrows=HEADER_PROBE_ROWS)
             if temp_df.empty: continue
 
-            header_row = find_header_row(temp_df, keywords)
+            usecols = None
+            if layout_registry is not None:
+                header_row, usecols = resolve_sheet_layout(temp_df.values.tolist(), layout_registry, f"{source_name}:{sheet_name}")
+            else:
+                header_row = find_header_row(temp_df, keywords)
 
-            # Step 2: Read the sheet using the detected header row
-            df = pd.read_excel(xls, sheet_name=sheet_name, header=header_row)
+            # Step 2: Read the sheet using the detected header row (only the mapped columns for known layouts)
+            df = pd.read_excel(xls, sheet_name=sheet_name, header=header_row, usecols=usecols if project_columns else None)
             all_sheets_df.append(df)
 
         if not all_sheets_df: return pd.DataFrame()
@@ -424,17 +893,20 @@ def read_excel_file(filepath, keywords):
         logging.error(f"Error reading Excel file {filepath}: {e}")
         return pd.DataFrame()
 
-def read_file(filepath, keywords):
-    """General function to read data based on file extension."""
+def read_file(filepath, keywords, layout_registry=None, project_columns=True):
+    """
+    General function to read data based on file extension.
+    With a layout registry, headers are resolved from known layouts and only mapped columns are read.
+    """
     logging.info(f"  [FILE_READ] Attempting to read file: {os.path.basename(filepath)}")
     start_time = time.time()
 
     ext = os.path.splitext(filepath)[1].lower()
 
     if ext == '.csv':
-        df = read_csv_file(filepath, keywords)
+        df = read_csv_file(filepath, keywords, layout_registry, project_columns)
     elif ext in ['.xls', '.xlsx', '.xlsm']:
-        df = read_excel_file(filepath, keywords)
+        df = read_excel_file(filepath, keywords, layout_registry, project_columns)
     else:
         logging.warning(f"Unsupported file format: {ext}")
         return pd.DataFrame()
@@ -448,6 +920,237 @@ def read_file(filepath, keywords):
     logging.info(f"  [FILE_READ] Finished reading file in {end_time - start_time:.2f} seconds. Initial rows: {len(df)}")
     return df
 
+def read_summary_sheets(filepath):
+    """
+    Reads the grade summary sheets ('Main Summary', 'Secondary Summary') of an AuctionSummary workbook.
+    Returns one raw frame with an auction_type column (MAIN/SECONDARY, from the sheet name).
+    """
+    logging.info(f"  [FILE_READ] Reading summary sheets: {os.path.basename(filepath)}")
+    try:
+        xls = pd.ExcelFile(filepath, engine='openpyxl')
+        all_sheets_df = []
+        for sheet_name in xls.sheet_names:
+            if 'SUMMARY' not in sheet_name.upper():
+                continue
+            temp_df = pd.read_excel(xls, sheet_name=sheet_name, header=None, nrows=HEADER_PROBE_ROWS)
+            if temp_df.empty: continue
+
+            header_row = find_header_row(temp_df, SUMMARY_HEADER_KEYWORDS)
+            df = pd.read_excel(xls, sheet_name=sheet_name, header=header_row)
+            df.dropna(how='all', inplace=True)
+            df['auction_type'] = sheet_name.upper().replace('SUMMARY', '').strip() or 'MAIN'
+            all_sheets_df.append(df)
+
+        if not all_sheets_df: return pd.DataFrame()
+        return pd.concat(all_sheets_df, ignore_index=True)
+
+    except Exception as e:
+        logging.error(f"Error reading summary sheets from {filepath}: {e}")
+        return pd.DataFrame()
+
+def compute_parse_cache_signature(keywords):
+    """Header detection depends on the keywords, so they are part of the cache key (the column map is not)."""
+    payload = json.dumps([PARSE_CACHE_VERSION, keywords])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+def parse_cache_path(content_hash, keywords):
+    return os.path.join(PARSE_CACHE_DIR, f"{content_hash}.{compute_parse_cache_signature(keywords)}.parquet")
+
+def _to_parquet_frame(df):
+    """
+    Parquet needs string column names and one type per column. Mixed object columns (e.g. lot numbers
+    read as ints alongside text) are stored as strings; downstream cleaning casts them exactly as before.
+    """
+    frame = df.reset_index(drop=True)
+    frame.columns = [str(col) for col in frame.columns]
+    for col in frame.columns:
+        if frame[col].dtype == object:
+            frame[col] = [None if v is None or (not isinstance(v, str) and pd.isna(v)) else str(v) for v in frame[col]]
+    return frame
+
+def load_parse_cache(cache_path):
+    """Returns the cached raw DataFrame, or None if there is no (readable) cache entry."""
+    if pyarrow is None or not cache_path or not os.path.exists(cache_path):
+        return None
+    try:
+        df = pd.read_parquet(cache_path)
+    except Exception as e:
+        logging.warning(f"  [PARSE_CACHE] Ignoring unreadable cache entry {os.path.basename(cache_path)}: {e}")
+        return None
+    return df
+
+def save_parse_cache(df, cache_path):
+    """Writes a cache entry atomically (temporary file + rename), so concurrent workers never see partial files."""
+    if pyarrow is None or not cache_path:
+        return
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        _to_parquet_frame(df).to_parquet(temp_path, index=False)
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        logging.warning(f"  [PARSE_CACHE] Could not cache {os.path.basename(cache_path)}: {e}")
+
+def read_file_cached(filepath, keywords, layout_registry=None, cache_path=None, reader=None):
+    """
+    read_file() (or another reader(filepath)) backed by the Parquet parse cache. On a hit the workbook is
+    not opened at all. On a miss every column is read (no usecols projection) so later column-map changes
+    can still use the cache.
+    """
+    if reader is None:
+        reader = lambda path: read_file(path, keywords, layout_registry, project_columns=cache_path is None)
+    if cache_path is None:
+        return reader(filepath)
+
+    start_time = time.time()
+    df = load_parse_cache(cache_path)
+    if df is not None:
+        instrumentation.count('parse_cache_hits')
+        logging.info(f"  [PARSE_CACHE] Loaded {os.path.basename(filepath)} from cache in {time.time() - start_time:.2f} seconds. Initial rows: {len(df)}")
+        return df
+
+    df = reader(filepath)
+    if not df.empty:
+        save_parse_cache(df, cache_path)
+    return df
+
+def _convert_streamed_cell(value):
+    """Mirrors pandas' openpyxl cell conversion (integral floats become ints) so streamed and bulk reads agree."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value == '':
+        return None
+    return value
+
+def _build_streamed_columns(header_values):
+    """Names columns the way pandas does for a header row (blank -> 'Unnamed: N', duplicates -> 'name.K')."""
+    columns = []
+    seen = {}
+    for i, value in enumerate(header_values):
+        name = f"Unnamed: {i}" if value is None or (isinstance(value, str) and not value.strip()) else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+def _chunk_rows(rows, columns, chunk_size, usecols=None):
+    """Groups an iterator of row tuples into DataFrames of at most chunk_size rows (only usecols, if given)."""
+    if usecols is not None:
+        columns = [columns[p] for p in usecols if p < len(columns)]
+        positions = usecols[:len(columns)]
+    else:
+        positions = range(len(columns))
+    buffer = []
+    for row in rows:
+        row_width = len(row)
+        values = [_convert_streamed_cell(row[p]) if p < row_width else None for p in positions]
+        buffer.append(values)
+        if len(buffer) >= chunk_size:
+            yield pd.DataFrame(buffer, columns=columns, dtype=object)
+            buffer = []
+    if buffer:
+        yield pd.DataFrame(buffer, columns=columns, dtype=object)
+
+def iter_excel_chunks(filepath, keywords, chunk_size=STREAM_CHUNK_SIZE, layout_registry=None):
+    """
+    Streams an Excel workbook as DataFrame chunks using openpyxl read_only row iteration.
+    The header is detected from the first HEADER_PROBE_ROWS rows of the same pass (find_header_row logic,
+    or the layout registry), so each sheet is parsed once and peak memory is bounded by chunk_size
+    regardless of file size. Chunks never span sheets.
+    """
+    source_name = os.path.basename(filepath)
+    workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        is_general_report = "GENERALREPORT" in source_name.upper()
+        # GeneralReport: data is on the first sheet only (same assumption as read_excel_file)
+        worksheets = workbook.worksheets[:1] if is_general_report else workbook.worksheets
+
+        for worksheet in worksheets:
+            rows = worksheet.iter_rows(values_only=True)
+
+            if is_general_report:
+                # Header=0, Skiprows=[1]
+                header_values = next(rows, None)
+                if header_values is None: continue
+                next(rows, None)
+                usecols = None
+                if layout_registry is not None:
+                    header_values = tuple(_convert_streamed_cell(v) for v in header_values)
+                    _, usecols = resolve_sheet_layout([header_values], layout_registry, f"{source_name}:{worksheet.title}", fixed_header_row=0)
+                columns = _build_streamed_columns(header_values)
+                yield from _chunk_rows(rows, columns, chunk_size, usecols)
+                continue
+
+            # Buffer the probe rows, detect the header, then continue the same iterator
+            probe_rows = []
+            for row in rows:
+                probe_rows.append(tuple(_convert_streamed_cell(v) for v in row))
+                if len(probe_rows) >= HEADER_PROBE_ROWS: break
+            if not probe_rows: continue
+
+            probe_df = pd.DataFrame(probe_rows)
+            if probe_df.dropna(how='all').empty: continue
+            usecols = None
+            if layout_registry is not None:
+                header_row, usecols = resolve_sheet_layout(probe_rows, layout_registry, f"{source_name}:{worksheet.title}")
+            else:
+                header_row = find_header_row(probe_df, keywords)
+
+            columns = _build_streamed_columns(probe_rows[header_row])
+            remaining_probe = probe_rows[header_row + 1:]
+            yield from _chunk_rows(iter_chain(remaining_probe, rows), columns, chunk_size, usecols)
+    finally:
+        workbook.close()
+
+def iter_csv_chunks(filepath, keywords, chunk_size=STREAM_CHUNK_SIZE, layout_registry=None):
+    """Streams a CSV file as DataFrame chunks, applying the same header rules as read_csv_file."""
+    source_name = os.path.basename(filepath)
+    if "GENERALREPORT" in source_name.upper():
+        usecols = None
+        if layout_registry is not None:
+            temp_df = pd.read_csv(filepath, header=None, nrows=1, low_memory=False)
+            if temp_df.empty: return
+            _, usecols = resolve_sheet_layout(temp_df.values.tolist(), layout_registry, source_name, fixed_header_row=0)
+        yield from pd.read_csv(filepath, header=0, skiprows=[1], usecols=usecols, chunksize=chunk_size, low_memory=False)
+        return
+
+    temp_df = pd.read_csv(filepath, header=None, nrows=HEADER_PROBE_ROWS, low_memory=False)
+    if temp_df.empty: return
+    usecols = None
+    if layout_registry is not None:
+        header_row, usecols = resolve_sheet_layout(temp_df.values.tolist(), layout_registry, source_name)
+    else:
+        header_row = find_header_row(temp_df, keywords)
+    yield from pd.read_csv(filepath, header=header_row, usecols=usecols, chunksize=chunk_size, low_memory=False)
+
+def iter_file_chunks(filepath, keywords, chunk_size=STREAM_CHUNK_SIZE, layout_registry=None):
+    """
+    Streaming counterpart of read_file(): yields cleaned (all-empty rows/columns dropped) chunks.
+    Falls back to a full read for formats openpyxl cannot stream (e.g. legacy .xls).
+    """
+    logging.info(f"  [FILE_STREAM] Streaming file in chunks of {chunk_size} rows: {os.path.basename(filepath)}")
+    ext = os.path.splitext(filepath)[1].lower()
+
+    if ext == '.csv':
+        chunks = iter_csv_chunks(filepath, keywords, chunk_size, layout_registry)
+    elif ext in ['.xlsx', '.xlsm'] and openpyxl is not None:
+        chunks = iter_excel_chunks(filepath, keywords, chunk_size, layout_registry)
+    else:
+        logging.warning(f"  [FILE_STREAM] Streaming is not supported for {ext}. Reading the whole file instead.")
+        df = read_file(filepath, keywords, layout_registry)
+        chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+
+    total_rows = 0
+    for chunk in chunks:
+        chunk = chunk.dropna(how='all').dropna(axis=1, how='all')
+        if chunk.empty: continue
+        total_rows += len(chunk)
+        yield chunk
+    logging.info(f"  [FILE_STREAM] Finished streaming file. Rows read: {total_rows}")
+
 # =============================================================================
 # Metadata Extraction Functions
 # =============================================================================
@@ -488,8 +1191,19 @@ def extract_metadata_from_filename(filename):
          sale_number = pattern3.group(1)
          # Date extraction not possible from this format alone
 
+    # Pattern 4: AuctionSummary_[YYYY-NN]_ddmmyy. The sale is kept with its year ('YYYY-NN'); the trailing date is
+    # the catalogue date, not the sale date, so no sale date can be derived from the name.
+    pattern4 = re.search(r"\[(\d{4})-(\d{1,3})\]", filename)
+    if pattern4 and not sale_number:
+        sale_number = sale_calendar.sale_label(pattern4.group(1), pattern4.group(2))
+
     return sale_number, sale_date
 
+def extract_year_from_filename(filename):
+    """The four-digit year in a file name (e.g. "Sale 35 2025.xlsx" or "AuctionSummary_[2025-39]_150925.xlsx"), or None."""
+    match = re.search(r"(?<!\d)(20\d{2})(?!\d)", filename)
+    return int(match.group(1)) if match else None
+
 def extract_metadata_from_dataframe(df):
     """
     Extracts Sale Number and Date from internal columns if available.
@@ -498,14 +1212,18 @@ def extract_metadata_from_dataframe(df):
     sale_number = None
     sale_date = None
 
-    # Extract Sale Number (e.g., "Sale 35 - M2")
+    # Extract Sale Number (e.g., "Sale 35 - M2" or "2025/39")
     if 'sale_number_internal' in df.columns and df['sale_number_internal'].notna().any():
         try:
             # Use the mode (most frequent value)
             raw_sale_code = df['sale_number_internal'].dropna().mode()[0]
             match = re.search(r"Sale\s*(\d+)", str(raw_sale_code), re.IGNORECASE)
+            year_match = sale_calendar.YEAR_SALE_PATTERN.match(str(raw_sale_code))
             if match:
                 sale_number = match.group(1)
+            elif year_match:
+                # AuctionSummary 'Auction' column: '2025/39'
+                sale_number = sale_calendar.sale_label(year_match.group(1), year_match.group(2))
         except Exception as e:
             logging.warning(f"Could not extract internal sale number: {e}")
 
@@ -530,6 +1248,12 @@ def determine_final_metadata(filename, df):
     final_sale_number = df_sale_number if df_sale_number else fn_sale_number
     final_sale_date = df_sale_date if df_sale_date else fn_sale_date
 
+    # Without a sale date, a bare sale number is kept with the file name's year ('YYYY-NN') so it has a calendar sale
+    if final_sale_number and not final_sale_date:
+        sale_key = sale_calendar.parse_sale_key(final_sale_number, year=extract_year_from_filename(filename))
+        if sale_key:
+            final_sale_number = sale_calendar.sale_label(*sale_key)
+
     if not final_sale_number:
         logging.warning(f"  [METADATA] Sale number could not be determined for {filename}.")
     if not final_sale_date:
@@ -547,124 +1271,829 @@ def process_lot_details(df, metadata):
     logging.info("  [PROCESSING] Starting lot details processing...")
 
     # 1. Mapping
-    df_mapped = map_columns(df, COLUMN_MAP_LOT_DETAILS)
-
-    # 2. Determine Metadata (needs the mapped dataframe for internal columns)
-    sale_number, sale_date = determine_final_metadata(metadata['filename'], df_mapped)
+    with instrumentation.span('etl.map', file=metadata['filename']) as span:
+        df_mapped = map_columns(df, COLUMN_MAP_LOT_DETAILS)
+        span.count('rows', len(df_mapped))
+
+        # 2. Determine Metadata (needs the mapped dataframe for internal columns)
+        # Streaming mode resolves the sale metadata once per file and passes it in with every chunk.
+        if 'sale_number' in metadata:
+            sale_number, sale_date = metadata['sale_number'], metadata['sale_date']
+        else:
+            sale_number, sale_date = determine_final_metadata(metadata['filename'], df_mapped)
 
     # 3. Cleaning and Casting
-    df_cleaned = clean_text_columns(df_mapped)
-    df_final = clean_and_cast_numeric_columns(df_cleaned)
+    with instrumentation.span('etl.clean', file=metadata['filename']):
+        df_cleaned = clean_text_columns(df_mapped)
+        df_final = clean_and_cast_numeric_columns(df_cleaned)
 
-    # 4. Add Metadata Columns
-    df_final['source_location'] = SOURCE_LOCATION
-    df_final['sale_number'] = sale_number
-    df_final['sale_date'] = sale_date
-    df_final['source_file_identifier'] = metadata['file_identifier']
-    df_final['processed_timestamp'] = metadata['timestamp']
+        # 4. Add Metadata Columns
+        df_final['source_location'] = SOURCE_LOCATION
+        df_final['sale_number'] = sale_number
+        df_final['sale_date'] = sale_date
+        df_final['source_file_identifier'] = metadata['file_identifier']
+        df_final['processed_timestamp'] = metadata['timestamp']
 
-    # 5. Validation
-    essential_cols = ['lot_number', 'mark', 'grade', 'quantity_kgs']
-    df_final = df_final.dropna(subset=essential_cols, how='all')
-    # Ensure lot_number is not null specifically, as it's a primary component of the unique key
-    df_final = df_final[df_final['lot_number'].notna()]
+        # 5. Validation
+        essential_cols = ['lot_number', 'mark', 'grade', 'quantity_kgs']
+        df_final = df_final.dropna(subset=essential_cols, how='all')
+        # Ensure lot_number is not null specifically, as it's a primary component of the unique key
+        df_final = df_final[df_final['lot_number'].notna()]
 
 
     if df_final.empty:
         logging.warning("  [PROCESSING] No valid lot details found after cleaning.")
         return pd.DataFrame(), pd.DataFrame()
 
-    # 6. Split into Offers and Sales
-    # Identify Sales: Must have a price. (This correctly handles GeneralReport where unsold lots have no price)
-    sales_df = df_final[df_final['price'].notna()].copy()
-
-    # Identify Offers: Includes everything listed (the catalogue).
-    offers_df = df_final.copy()
-
-    # 7. Final Column Selection
-    sales_cols_to_keep = ['source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade',
-                          'lot_number', 'invoice_number', 'quantity_kgs', 'package_count', 'price', 'buyer',
-                          'source_file_identifier', 'processed_timestamp']
-    offers_cols_to_keep = ['source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade',
-                           'lot_number', 'invoice_number', 'quantity_kgs', 'package_count', 'valuation_or_rp',
-                           'source_file_identifier', 'processed_timestamp']
-
-    sales_df = sales_df[[col for col in sales_cols_to_keep if col in sales_df.columns]]
-    offers_df = offers_df[[col for col in offers_cols_to_keep if col in offers_df.columns]]
+    with instrumentation.span('etl.split', file=metadata['filename']) as span:
+        # 6. Split into Offers and Sales
+        # Identify Sales: Must have a price. (This correctly handles GeneralReport where unsold lots have no price)
+        sales_df = df_final[df_final['price'].notna()].copy()
+
+        # Identify Offers: Includes everything listed (the catalogue).
+        offers_df = df_final.copy()
+
+        # Outcome of each lot: a results file (one with a Status column) reports unsold and withdrawn lots too;
+        # catalogue listings have no outcome yet
+        status = df_final['status']
+        outcome = np.select([df_final['price'].notna(), status.str.contains('WITHDRAWN', na=False), status.notna()],
+                            ['sold', 'withdrawn', 'unsold'], default=None)
+        offers_df['outcome'] = outcome
+        sales_df['outcome'] = 'sold'
+
+        # 7. Final Column Selection
+        sales_cols_to_keep = ['source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade',
+                              'lot_number', 'invoice_number', 'quantity_kgs', 'package_count', 'price', 'buyer', 'outcome',
+                              'source_file_identifier', 'processed_timestamp']
+        offers_cols_to_keep = ['source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade',
+                               'lot_number', 'invoice_number', 'quantity_kgs', 'package_count', 'valuation_or_rp', 'outcome',
+                               'source_file_identifier', 'processed_timestamp']
+
+        sales_df = sales_df[[col for col in sales_cols_to_keep if col in sales_df.columns]]
+        offers_df = offers_df[[col for col in offers_cols_to_keep if col in offers_df.columns]]
+        span.count('offers', len(offers_df))
+        span.count('sales', len(sales_df))
 
     logging.info(f"  [PROCESSING] Lot details finalized. Offers: {len(offers_df)}, Sales: {len(sales_df)}")
     return offers_df, sales_df
 
 def process_grade_summary(df, metadata, auction_type):
-    """Processes grade summary data (Placeholder)."""
-    logging.info(f"  [PROCESSING] Grade summary processing ({auction_type}) - Placeholder.")
-    # Implementation for summary data would go here if needed.
-    return pd.DataFrame()
+    """
+    Processes one grade summary sheet into per-grade rows (vectorized, no row loops).
+    The sheet lists grade rows (upper-case codes such as BP1, PF1, DUST) in blocks, each closed by a
+    region subtotal row (e.g. 'Burundi', 'KTDA-East'), and ends with 'Grand Total'. Grades are summed
+    across regions; the subtotals and grand total are only used to validate the parse.
+    """
+    logging.info(f"  [PROCESSING] Starting grade summary processing ({auction_type})...")
+
+    # 1. Mapping
+    df_mapped = map_columns(df, COLUMN_MAP_GRADE_SUMMARY)
+
+    # 2. Classify rows
+    labels = df_mapped['grade'].astype(str).str.strip()
+    lots = pd.to_numeric(df_mapped['lots'], errors='coerce')
+    kgs = pd.to_numeric(df_mapped['quantity_kgs'], errors='coerce')
+    valid = df_mapped['grade'].notna() & lots.notna()
+    is_total = valid & (labels.str.upper() == SUMMARY_TOTAL_LABEL)
+    is_region = valid & ~is_total & (labels != labels.str.upper())
+    is_grade = valid & ~is_total & ~is_region
+
+    # A grade row belongs to the block closed by the next region row: block = number of region rows above it.
+    block = is_region.cumsum() - is_region
+    grades = pd.DataFrame({'grade': labels[is_grade].str.upper(), 'block': block[is_grade],
+                           'lots': lots[is_grade], 'quantity_kgs': kgs[is_grade]})
+
+    if grades.empty:
+        logging.warning(f"  [PROCESSING] No grade rows found in the {auction_type} summary.")
+        return pd.DataFrame()
+
+    # 3. Validation against the sheet's own subtotals
+    block_sums = grades.groupby('block')[['lots', 'quantity_kgs']].sum()
+    region_rows = pd.DataFrame({'lots': lots[is_region].values, 'quantity_kgs': kgs[is_region].values},
+                               index=block[is_region].values)
+    mismatched = (block_sums.reindex(region_rows.index).fillna(0) != region_rows.fillna(0)).any(axis=1)
+    if mismatched.any():
+        logging.warning(f"  [VALIDATION] {int(mismatched.sum())} of {len(region_rows)} region subtotal(s) do not match their grade rows ({auction_type}).")
+    if is_total.any():
+        expected = (lots[is_total].iloc[0], kgs[is_total].iloc[0])
+        actual = (grades['lots'].sum(), grades['quantity_kgs'].sum())
+        if expected != actual:
+            logging.warning(f"  [VALIDATION] Grade rows sum to {actual[0]:.0f} lots / {actual[1]:.0f} kg but the Grand Total is "
+                            f"{expected[0]:.0f} lots / {expected[1]:.0f} kg ({auction_type}).")
+        else:
+            logging.info(f"  [VALIDATION] {auction_type} summary matches its Grand Total ({actual[0]:.0f} lots, {actual[1]:.0f} kg).")
 
+    # 4. Aggregate per grade across regions
+    summary_df = grades.groupby('grade', sort=False)[['lots', 'quantity_kgs']].sum().reset_index()
+    summary_df['lots'] = summary_df['lots'].astype(int)
 
-def insert_data(conn, df, table_name):
+    # 5. Metadata
+    sale_number, sale_date = determine_final_metadata(metadata['filename'], df_mapped)
+    summary_df['source_location'] = SOURCE_LOCATION
+    summary_df['sale_date'] = sale_date
+    summary_df['sale_number'] = sale_number
+    summary_df['auction_type'] = auction_type
+    summary_df['source_file_identifier'] = metadata['file_identifier']
+    summary_df['processed_timestamp'] = metadata['timestamp']
+
+    summary_cols_to_keep = ['source_location', 'sale_date', 'sale_number', 'auction_type', 'grade', 'lots', 'quantity_kgs',
+                            'source_file_identifier', 'processed_timestamp']
+    logging.info(f"  [PROCESSING] Grade summary finalized ({auction_type}). Grades: {len(summary_df)}")
+    return summary_df[summary_cols_to_keep]
+
+
+# Dimension ids per database file and dim_ table: {(db_file, table): {'names': {name: id}, 'state': (max id, count)}}
+_dimension_cache = {}
+
+def load_dimension_ids(conn, dim_table):
+    """
+    The cached name -> id map of a dimension table. The cache is checked against the table's (max id, row count)
+    on every call, so ids of rolled-back inserts (or rows added by another process) are never used.
+    """
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    state = conn.execute(f"SELECT MAX(id), COUNT(*) FROM {dim_table}").fetchone()
+    cached = _dimension_cache.get((db_file, dim_table))
+    if cached is None or cached['state'] != state:
+        names = {name: dim_id for dim_id, name in conn.execute(f"SELECT id, name FROM {dim_table}")}
+        cached = _dimension_cache[(db_file, dim_table)] = {'names': names, 'state': state}
+    return cached
+
+def encode_dimensions(conn, df):
+    """
+    Replaces the broker/mark/grade/buyer text columns of a lot frame with <column>_id columns.
+    Names not yet in their dimension table are added first (one executemany per dimension).
+    """
+    df = df.copy()
+    for column, dim_table in migrations.DIMENSION_TABLES:
+        if column not in df.columns:
+            continue
+        cached = load_dimension_ids(conn, dim_table)
+        names = cached['names']
+        new_names = [name for name in df[column].dropna().unique() if name not in names]
+        if new_names:
+            last_id = cached['state'][0] or 0
+            conn.executemany(f"INSERT OR IGNORE INTO {dim_table} (name) VALUES (?)", [(name,) for name in new_names])
+            names.update((name, dim_id) for dim_id, name in conn.execute(f"SELECT id, name FROM {dim_table} WHERE id > ?", (last_id,)))
+            cached['state'] = conn.execute(f"SELECT MAX(id), COUNT(*) FROM {dim_table}").fetchone()
+        df[f"{column}_id"] = df[column].map(names).astype('Int64')
+        df = df.drop(columns=column)
+    return df
+
+def _sqlite_column_values(series):
+    """Column as a list of Python scalars with NaN/NaT as None (sqlite3 cannot bind numpy types)."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def fetch_existing_keys(conn, table_name, df, role=None):
     """
-    Inserts dataframe into the specified SQLite table.
-    Includes robust fallback for IntegrityErrors during bulk insert.
+    Returns the unique keys already stored for the sales in df (of auction_lots rows: those with the role flag set).
+    Every key starts with (source_location, sale_number), so the lookup uses the unique index prefix.
     """
+    key_columns = TABLE_UNIQUE_KEYS[table_name]
+    other_columns = ', '.join(key_columns[2:])
+    role_filter = f" AND {role} = 1" if role else ''
+    existing = set()
+    for (source_location, sale_number), _ in df.groupby(['source_location', 'sale_number'], dropna=True):
+        cursor = conn.execute(f"""
+            SELECT {other_columns} FROM {table_name} WHERE source_location = ? AND sale_number = ?{role_filter}
+        """, (source_location, sale_number))
+        existing.update((source_location, sale_number) + row for row in cursor)
+    return existing
+
+def count_new_keys(df, existing_keys, key_columns):
+    """Rows that will be inserted: keys not in the table and not repeated earlier in the batch (NULL keys never conflict)."""
+    seen = set(existing_keys)
+    new_rows = 0
+    for key in zip(*(_sqlite_column_values(df[col]) for col in key_columns)):
+        if any(v is None for v in key):
+            new_rows += 1
+        elif key not in seen:
+            seen.add(key)
+            new_rows += 1
+    return new_rows
+
+def build_upsert_sql(table_name, columns, policy, role=None):
+    """
+    INSERT ... ON CONFLICT statement for a conflict policy (see CONFLICT_POLICIES). Rows of a lot view (role) are
+    written to auction_lots by build_lot_upsert_sql().
+    """
+    if role:
+        return build_lot_upsert_sql(columns, policy, role)
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    key_columns = TABLE_UNIQUE_KEYS[table_name]
+    conflict_target = f"({', '.join(key_columns)})"
+    sql = f'INSERT INTO {table_name} ({column_list}) VALUES ({placeholders}) ON CONFLICT{conflict_target} DO '
+
+    update_cols = [col for col in columns if col not in key_columns]
+    data_cols = [col for col in update_cols if col not in PROVENANCE_COLUMNS]
+    if policy == 'ignore' or not data_cols:
+        return sql + 'NOTHING'
+
+    if policy == 'replace':
+        assignments = [f'"{col}" = excluded."{col}"' for col in update_cols]
+        changed = [f'"{col}" IS NOT excluded."{col}"' for col in data_cols]
+    else: # 'update': only non-null incoming values overwrite stored ones
+        assignments = [f'"{col}" = COALESCE(excluded."{col}", "{col}")' for col in data_cols]
+        assignments += [f'"{col}" = excluded."{col}"' for col in update_cols if col in PROVENANCE_COLUMNS]
+        changed = [f'(excluded."{col}" IS NOT NULL AND "{col}" IS NOT excluded."{col}")' for col in data_cols]
+
+    # Only rows whose data actually changes are rewritten (and counted as updated)
+    return sql + f"UPDATE SET {', '.join(assignments)} WHERE {' OR '.join(changed)}"
+
+def _policy_assignment(stored, incoming, policy):
+    """(new value, change condition) of a stored column under a conflict policy; 'ignore' never changes it (None)."""
+    if policy == 'replace':
+        return incoming, f"{stored} IS NOT {incoming}"
+    if policy == 'update':
+        return f"COALESCE({incoming}, {stored})", f"({incoming} IS NOT NULL AND {stored} IS NOT {incoming})"
+    return stored, None
+
+def build_lot_upsert_sql(columns, policy, role):
+    """
+    INSERT ... ON CONFLICT statement writing rows of one role (migrations.LOT_ROLES) to auction_lots, which holds one
+    row per lot key. A row whose key is stored without the role is merged into the stored row: the role flag is set
+    and the role's columns are filled in (a sale adds price, buyer and outcome to the lot's listing) under every
+    policy. A stored row that has the role is handled by the policy, on the role's columns only. A listing also
+    records the outcome it reports for a lot that is not sold ('unsold'/'withdrawn'; 'sold' comes with the sale),
+    and a row of either role dates a lot stored without a sale date (SALE_DATE_COLUMNS).
+    """
+    table_name = migrations.LOTS_TABLE
+    key_columns = TABLE_UNIQUE_KEYS[table_name]
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    sql = (f'INSERT INTO {table_name} ({column_list}, "{role}") VALUES ({placeholders}, 1) '
+           f'ON CONFLICT({", ".join(key_columns)}) DO UPDATE SET "{role}" = 1')
+
+    if role == 'sold':
+        role_cols = [col for col in columns if col in SALE_RESULT_COLUMNS]
+    else:
+        role_cols = [col for col in columns if col not in key_columns + PROVENANCE_COLUMNS + SALE_RESULT_COLUMNS]
+    merging = f'{table_name}."{role}" = 0'
+    dated = f"({table_name}.sale_date IS NULL AND excluded.sale_date IS NOT NULL)" if 'sale_date' in columns else None
+    assignments, changed = [], []
+    for col in role_cols:
+        stored, incoming = f'{table_name}."{col}"', f'excluded."{col}"'
+        value, change = _policy_assignment(stored, incoming, policy)
+        taken = ' OR '.join([merging] + ([dated] if dated and col in SALE_DATE_COLUMNS else []))
+        assignments.append(f'"{col}" = ' + (incoming if value == incoming else f"CASE WHEN {taken} THEN {incoming} ELSE {value} END"))
+        changed += [change] if change else []
+    if dated:
+        assignments += [f'"{col}" = CASE WHEN {dated} THEN excluded."{col}" ELSE {table_name}."{col}" END'
+                        for col in SALE_DATE_COLUMNS if col in columns and col not in role_cols]
+        changed.append(dated)
+    if role == 'listed' and 'outcome' in columns:
+        stored, incoming = f'{table_name}.outcome', 'excluded.outcome'
+        known = f"{stored} IS NULL AND " if policy == 'ignore' else f"{stored} IS NOT {incoming} AND "
+        reported = f"({table_name}.sold = 0 AND {known}{incoming} IN ('unsold', 'withdrawn'))"
+        assignments.append(f"outcome = CASE WHEN {reported} THEN {incoming} ELSE {stored} END")
+        changed.append(reported)
+
+    # Provenance follows the role's data when the policy rewrites it; a merged row keeps the stored row's provenance
+    if policy != 'ignore' and changed:
+        data_changed = f"NOT {merging} AND ({' OR '.join(changed)})"
+        assignments += [f'"{col}" = CASE WHEN {data_changed} THEN excluded."{col}" ELSE {table_name}."{col}" END'
+                        for col in PROVENANCE_COLUMNS if col in columns]
+
+    # Only rows that gain the role or whose data actually changes are rewritten (and counted)
+    sql += ''.join(f", {assignment}" for assignment in assignments)
+    return sql + f" WHERE {' OR '.join([merging] + changed)}"
+
+def upsert_data(conn, df, table_name, policy=DEFAULT_CONFLICT_POLICY):
+    """
+    Set-based insert of a dataframe using one executemany of INSERT ... ON CONFLICT inside a savepoint.
+    Rows conflicting on the table's unique key (TABLE_UNIQUE_KEYS) are handled by the policy:
+      ignore  - keep the stored row (duplicates within the batch: first row wins)
+      replace - overwrite the stored row's fields with the incoming values
+      update  - overwrite only fields for which the incoming value is not null
+    Returns exact counts {'inserted', 'updated', 'skipped'} without scanning the table.
+    A database error rolls the savepoint back and is re-raised, so the caller's transaction can fail the file.
+    """
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
     if df.empty:
-        return 0
+        return counts
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy: {policy}")
+
+    # The lot views are written to auction_lots as rows of the view's role, with dimension ids in place of the text columns
+    # and the integer sale keys of sale_calendar
+    role = migrations.LOT_ROLES.get(table_name)
+    target_table = migrations.LOTS_TABLE if role else table_name
 
+    conn.execute("SAVEPOINT upsert_data")
     try:
-        # Attempt bulk insert first (faster)
-        # We use a slightly safer way to count records using the cursor
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        records_before = cursor.fetchone()[0]
-        
-        df.to_sql(table_name, conn, if_exists='append', index=False)
-        
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        records_after = cursor.fetchone()[0]
-
-        inserted_count = records_after - records_before
-        return inserted_count
-
-    except sqlite3.IntegrityError:
-        logging.warning(f"  [DB_INSERT] Integrity error during bulk insert into {table_name}. Falling back to row-by-row insertion to skip duplicates.")
-
-        # Fallback to row-by-row insertion (slower but robust against duplicates)
-        inserted_count = 0
-        for index, row in df.iterrows():
-            try:
-                # Convert the row Series to a single-row DataFrame for insertion
-                row.to_frame().T.to_sql(table_name, conn, if_exists='append', index=False)
-                inserted_count += 1
-            except sqlite3.IntegrityError:
-                # Ignore the duplicate row and continue
-                continue
-            except Exception as e_row:
-                logging.error(f"  [DB_INSERT_ERROR] Failed to insert row {index} into {table_name}: {e_row}")
-        return inserted_count
+        if role:
+            df = encode_dimensions(conn, sale_calendar.assign_sale_keys(df))
+            sale_calendar.register_lot_sales(conn, df)
+        columns = list(df.columns)
+        sql = build_upsert_sql(target_table, columns, policy, role)
+        rows = list(zip(*(_sqlite_column_values(df[col]) for col in columns)))
+
+        # SQLite reports DO NOTHING rows as unchanged, so for 'ignore' the change count is the insert count.
+        # Otherwise inserts are told apart from updates by the keys already present.
+        # Lot rows can be merged into stored rows under every policy, so they always need the stored keys.
+        new_rows = None if policy == 'ignore' and not role else count_new_keys(df, fetch_existing_keys(conn, target_table, df, role), TABLE_UNIQUE_KEYS[target_table])
+        changes_before = conn.total_changes
+        conn.executemany(sql, rows)
+        changed_rows = conn.total_changes - changes_before
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO upsert_data")
+        raise
+    finally:
+        conn.execute("RELEASE upsert_data")
+
+    counts['inserted'] = changed_rows if new_rows is None else new_rows
+    counts['updated'] = changed_rows - counts['inserted']
+    counts['skipped'] = len(rows) - changed_rows
+    return counts
 
+def find_combined_lots(offers_df, sales_df, listed_keys, sold_keys):
+    """
+    Index labels of the offers_df rows that can be stored as one auction_lots row in both roles: rows with a sale
+    (sales_df rows are the priced offers_df rows, same labels) whose key is new to both views (listed_keys and
+    sold_keys are the stored keys) and not repeated earlier in the batch.
+    """
+    if offers_df.empty or sales_df.empty or not (offers_df.index.is_unique and sales_df.index.isin(offers_df.index).all()):
+        return offers_df.index[:0]
+    keys = offers_df[UNIQUE_KEY_COLUMNS]
+    first = (~keys.duplicated(keep='first') | keys.isna().any(axis=1)).to_numpy()
+    stored = listed_keys | sold_keys
+    new = np.array([key not in stored for key in zip(*(_sqlite_column_values(keys[col]) for col in UNIQUE_KEY_COLUMNS))], dtype=bool)
+    return offers_df.index[first & new & offers_df.index.isin(sales_df.index)]
+
+def upsert_lots(conn, offers_df, sales_df, policy=DEFAULT_CONFLICT_POLICY):
+    """
+    Writes the offers and sales frames of one file (process_lot_details) to auction_lots. A sold lot new to the
+    table is written once, as a row in both roles; every other row is upserted in its view's role only, with the
+    semantics of upsert_data() for that view (a sale of a lot already listed is merged into the listing's row, see
+    build_lot_upsert_sql). Both views list the rows in file order, as the separate tables did.
+    Returns the counts of the offers and of the sales ({'inserted', 'updated', 'skipped'} each).
+    Database errors are re-raised after the savepoint is rolled back, as in upsert_data().
+    """
+    offer_counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    sale_counts = dict(offer_counts)
+    if offers_df.empty and sales_df.empty:
+        return offer_counts, sale_counts
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy: {policy}")
+
+    table_name = migrations.LOTS_TABLE
+    conn.execute("SAVEPOINT upsert_lots")
+    try:
+        # Stored keys per role: needed to find the combined rows and to tell inserts (and merges) from updates
+        listed_keys, sold_keys = set(), set()
+        if not offers_df.empty:
+            listed_keys = fetch_existing_keys(conn, table_name, offers_df, 'listed')
+        if not sales_df.empty:
+            sold_keys = fetch_existing_keys(conn, table_name, sales_df, 'sold')
+        combined = find_combined_lots(offers_df, sales_df, listed_keys, sold_keys)
+
+        if sales_df.empty:
+            lots_df, kinds = offers_df, np.full(len(offers_df), 'listed')
+        elif offers_df.empty:
+            lots_df, kinds = sales_df, np.full(len(sales_df), 'sold')
+        else:
+            # Each listing (carrying its sale if combined), then any separate sale right after its listing
+            listings = offers_df.assign(kind=np.where(offers_df.index.isin(combined), 'both', 'listed'),
+                                        position=np.arange(len(offers_df)))
+            if len(combined):
+                listings['price'] = sales_df.loc[combined, 'price']
+                listings['buyer'] = sales_df.loc[combined, 'buyer']
+            separate = sales_df.drop(index=combined)
+            position = listings['position'].reindex(separate.index) if offers_df.index.is_unique else np.nan
+            separate = separate.assign(kind='sold', position=pd.Series(position, index=separate.index).fillna(len(listings)))
+            lots_df = pd.concat([listings, separate]).sort_values('position', kind='stable')
+            kinds = lots_df['kind'].to_numpy()
+            lots_df = lots_df.drop(columns=['kind', 'position'])
+
+        lots_df = encode_dimensions(conn, sale_calendar.assign_sale_keys(lots_df))
+        sale_calendar.register_lot_sales(conn, lots_df)
+        columns = list(lots_df.columns)
+        rows = list(zip(*(_sqlite_column_values(lots_df[col]) for col in columns)))
+
+        # Rows new to a view: inserted, or merged into a stored row of the other role
+        new_rows = {}
+        for role, df, stored_keys in [('listed', offers_df, listed_keys), ('sold', sales_df, sold_keys)]:
+            new_rows[role] = count_new_keys(df, stored_keys, UNIQUE_KEY_COLUMNS) if not df.empty else 0
+
+        # Statement and rows per kind; a role-only row leaves the other view's columns alone
+        statements, kind_rows = {}, {}
+        for kind, excluded in [('both', ()), ('listed', ('price', 'buyer_id')), ('sold', ('valuation_or_rp',))]:
+            positions = np.flatnonzero(kinds == kind)
+            kind_columns = [col for col in columns if col not in excluded]
+            kind_rows[kind] = rows if len(positions) == len(rows) else [rows[i] for i in positions]
+            if len(kind_columns) < len(columns):
+                project = operator.itemgetter(*[columns.index(col) for col in kind_columns])
+                kind_rows[kind] = [project(row) for row in kind_rows[kind]]
+            if kind == 'both':
+                column_list = ', '.join(f'"{col}"' for col in kind_columns)
+                placeholders = ', '.join('?' for _ in kind_columns)
+                statements[kind] = f"INSERT INTO {table_name} ({column_list}, listed, sold) VALUES ({placeholders}, 1, 1)"
+            else:
+                statements[kind] = build_upsert_sql(table_name, kind_columns, policy, kind)
+
+        # Rows are written in file order (one executemany per run of rows of the same kind), so ids follow the
+        # file and repeated keys are applied in the same order as when the views were separate tables
+        changes = dict.fromkeys(statements, 0)
+        written = dict.fromkeys(statements, 0)
+        run_starts = np.flatnonzero(np.r_[True, kinds[1:] != kinds[:-1]])
+        for start, end in zip(run_starts, np.r_[run_starts[1:], len(kinds)]):
+            kind = kinds[start]
+            changes_before = conn.total_changes
+            conn.executemany(statements[kind], kind_rows[kind][written[kind]:written[kind] + end - start])
+            changes[kind] += conn.total_changes - changes_before
+            written[kind] += end - start
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO upsert_lots")
+        raise
+    finally:
+        conn.execute("RELEASE upsert_lots")
+
+    for counts, df, role in [(offer_counts, offers_df, 'listed'), (sale_counts, sales_df, 'sold')]:
+        changed_rows = changes['both'] + changes[role]
+        counts['inserted'] = new_rows[role]
+        counts['updated'] = changed_rows - counts['inserted']
+        counts['skipped'] = len(df) - changed_rows
+    return offer_counts, sale_counts
+
+def insert_data(conn, df, table_name, policy=DEFAULT_CONFLICT_POLICY):
+    """Inserts a dataframe into the specified SQLite table. Returns the number of rows inserted or updated."""
+    counts = upsert_data(conn, df, table_name, policy)
+    return counts['inserted'] + counts['updated']
+
+# =============================================================================
+# Unstructured Document Functions (PDF/DOCX -> market_commentary)
+# =============================================================================
+
+def extract_commentary_metadata(filename):
+    """
+    Sale number, report date and content type from a document filename, e.g.
+    'Final Market Report Sale  38  2025.pdf', 'Auction Quantities 39 2025.pdf', 'WEATHER - UPTO 16TH SEPTEMBER 2025.docx'.
+    The sale number is the calendar label ('2025-38') when the report date or the filename gives its year.
+    """
+    name = os.path.splitext(filename)[0]
+    sale_number = None
+    report_date = None
+
+    date_match = re.search(r"(\d{1,2})(?:st|nd|rd|th)?\s+([A-Za-z]+)\s+(\d{4})", name, re.IGNORECASE)
+    if date_match:
+        try:
+            report_date = datetime.strptime(' '.join(date_match.groups()), '%d %B %Y').strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+
+    match = re.search(r"Sale\s*(\d{1,3})\b", name, re.IGNORECASE) or \
+            re.search(r"(?:Report|Quantities)\s+(\d{1,3})\b", name, re.IGNORECASE)
+    if match:
+        year = int(report_date[:4]) if report_date else extract_year_from_filename(name)
+        sale_number = sale_calendar.sale_label(year, match.group(1)) if year else str(int(match.group(1)))
+
+    content_type = 'DOCUMENT'
+    for candidate, pattern in COMMENTARY_CONTENT_TYPES:
+        if re.search(pattern, name, re.IGNORECASE):
+            content_type = candidate
+            break
+
+    return sale_number, report_date, content_type
+
+def hash_document_pages(filepath):
+    """
+    Content hashes of a document's pages, without extracting any text.
+    PDF: each page's content stream plus its form XObjects and fonts. DOCX has no fixed pages and is a single
+    unit hashed from word/document.xml. Returns None if the document cannot be opened.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    try:
+        if ext == '.pdf':
+            if fitz is None:
+                logging.error("PyMuPDF (fitz) is not installed. Cannot read PDF documents.")
+                return None
+            page_hashes = []
+            with fitz.open(filepath) as doc:
+                for page in doc:
+                    digest = hashlib.sha256(page.read_contents())
+                    for xref, *_ in page.get_xobjects():
+                        digest.update(doc.xref_stream(xref) or b'')
+                    for font in page.get_fonts():
+                        digest.update(repr(font[1:]).encode('utf-8'))
+                    page_hashes.append(digest.hexdigest())
+            return page_hashes
+
+        if ext == '.docx':
+            with zipfile.ZipFile(filepath) as zf:
+                return [hashlib.sha256(zf.read('word/document.xml')).hexdigest()]
     except Exception as e:
-        logging.error(f"  [DB_INSERT_ERROR] Failed to insert data into {table_name}: {e}")
-        return 0
+        logging.error(f"Error opening document {filepath}: {e}")
+        return None
+
+    logging.warning(f"Unsupported document format: {ext}")
+    return None
+
+def extract_document_pages(task):
+    """
+    Process-pool entry point: extracts the text of the given pages of one document.
+    Returns (filepath, [(page_index, text), ...]). Must remain a module-level function so it can be pickled.
+    """
+    filepath, page_indices = task
+    ext = os.path.splitext(filepath)[1].lower()
+    pages = []
+    if ext == '.pdf':
+        with fitz.open(filepath) as doc:
+            for page_index in page_indices:
+                pages.append((page_index, doc[page_index].get_text("text").strip()))
+    elif ext == '.docx':
+        if docx is None:
+            raise RuntimeError("python-docx is not installed. Cannot read DOCX documents.")
+        document = docx.Document(filepath)
+        lines = [p.text for p in document.paragraphs if p.text.strip()]
+        for table in document.tables:
+            for row in table.rows:
+                cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+                if cells:
+                    lines.append(' | '.join(cells))
+        pages.append((0, '\n'.join(lines)))
+    return filepath, pages
+
+def load_cached_page_texts(conn, page_hashes):
+    """Returns {page_hash: text} for the hashes already in page_text_cache."""
+    cached = {}
+    unique_hashes = list(set(page_hashes))
+    # Stay below SQLite's bound-parameter limit
+    for start in range(0, len(unique_hashes), 500):
+        batch = unique_hashes[start:start + 500]
+        cursor = conn.execute(f"SELECT page_hash, text FROM page_text_cache WHERE page_hash IN ({', '.join('?' for _ in batch)})", batch)
+        cached.update(cursor.fetchall())
+    return cached
 
 # =============================================================================
 # Main Orchestration Functions
 # =============================================================================
 
-def process_structured_data(filepath, data_type, conn):
-    """Orchestrates the reading, processing, and insertion of structured data."""
-    logging.info(f"[ORCHESTRATOR] Processing structured file: {os.path.basename(filepath)} as Type: {data_type}")
+def parse_structured_file(filepath, data_type, file_identifier, layout_registry=None, content_hash=None):
+    """
+    Reads and cleans a structured file without touching the database.
+    Returns a result dictionary that write_parsed_result() persists. This split allows
+    the CPU-bound parsing to run in worker processes while a single writer owns the connection.
+    Layouts seen while reading are recorded in layout_registry (returned with the result).
+    With a content_hash (and pyarrow installed) the raw read goes through the Parquet parse cache.
+    """
+    result = {
+        'filepath': filepath,
+        'file_identifier': file_identifier,
+        'data_type': data_type,
+        'status': None,
+        'offers_df': pd.DataFrame(),
+        'sales_df': pd.DataFrame(),
+        'summary_df': pd.DataFrame(),
+        'layout_registry': layout_registry,
+    }
+
+    metadata = {
+        'file_identifier': file_identifier,
+        'filename': os.path.basename(filepath),
+        'timestamp': datetime.now().isoformat()
+    }
+
+    if data_type not in [DATA_TYPE_OFFER, DATA_TYPE_SALE, DATA_TYPE_SUMMARY]:
+        result['status'] = 'SKIPPED'
+        return result
+
+    use_parse_cache = content_hash is not None and pyarrow is not None
+
+    # Read the file (V21 Fix applied within this function)
+    # Lot-level sheets; in AuctionSummary workbooks this is the 'Detail' sheet (the summary sheets hold no lots)
+    with instrumentation.span('etl.read', file=metadata['filename']) as span:
+        cache_path = parse_cache_path(content_hash, HEADER_KEYWORDS) if use_parse_cache else None
+        df = read_file_cached(filepath, HEADER_KEYWORDS, layout_registry, cache_path)
+
+        summary_raw_df = pd.DataFrame()
+        if data_type == DATA_TYPE_SUMMARY:
+            cache_path = parse_cache_path(content_hash, SUMMARY_HEADER_KEYWORDS) if use_parse_cache else None
+            summary_raw_df = read_file_cached(filepath, SUMMARY_HEADER_KEYWORDS, cache_path=cache_path, reader=read_summary_sheets)
+        span.count('rows', len(df) + len(summary_raw_df))
+
+    if df.empty and summary_raw_df.empty:
+        result['status'] = 'READ_FAILURE'
+        return result
 
-    # Use file modification time + name as a unique identifier
     try:
-        file_mod_time = os.path.getmtime(filepath)
-        file_identifier = f"{os.path.basename(filepath)}|{file_mod_time}"
+        if not df.empty:
+            result['offers_df'], result['sales_df'] = process_lot_details(df, metadata)
+
+        if not summary_raw_df.empty:
+            summary_frames = [process_grade_summary(sheet_df.drop(columns='auction_type'), metadata, auction_type)
+                              for auction_type, sheet_df in summary_raw_df.groupby('auction_type', sort=False)]
+            result['summary_df'] = pd.concat(summary_frames, ignore_index=True)
+
+        result['status'] = 'PARSED'
+    except Exception as e:
+        logging.error(f"[ORCHESTRATOR] An error occurred during processing of {filepath}: {e}", exc_info=True)
+        result['status'] = 'FAILURE'
+
+    return result
+
+def write_parsed_result(conn, result, conflict_policy=DEFAULT_CONFLICT_POLICY, batch=False):
+    """
+    Inserts the frames produced by parse_structured_file() and logs the processing status.
+    The file's rows are written under a savepoint: if anything fails they are rolled back and the file is
+    logged as FAILURE. With batch=True nothing is committed here (the run's outer transaction commits).
+    Returns (status, records_inserted); records_inserted counts inserted and updated rows.
+    status is None if the file was skipped.
+    """
+    file_identifier = result['file_identifier']
+    data_type = result['data_type']
+    commit = not batch
+
+    if result['status'] == 'SKIPPED':
+        return None, 0
+
+    if result['status'] == 'READ_FAILURE':
+        logging.warning("[ORCHESTRATOR] File is empty or could not be read. Logging as FAILURE.")
+        log_processing_status(conn, file_identifier, data_type, 0, 'FAILURE', commit=commit)
+        return 'FAILURE', 0
+
+    if result['status'] == 'FAILURE':
+        log_processing_status(conn, file_identifier, data_type, 0, 'FAILURE', commit=commit)
+        return 'FAILURE', 0
+
+    # Insert
+    total_inserted = 0
+    try:
+        with instrumentation.span('etl.insert', file=os.path.basename(result['filepath'])) as span, storage.write_transaction(conn):
+            offers_df = result['offers_df']
+            sales_df = result['sales_df']
+
+            # Offers and sales are rows of auction_lots; a lot new to both is written once
+            offer_counts, sale_counts = upsert_lots(conn, offers_df, sales_df, conflict_policy)
+            for label, df, counts in [('Offer', offers_df, offer_counts), ('Sale', sales_df, sale_counts)]:
+                if not df.empty:
+                    logging.info(f"[ORCHESTRATOR] {label} records: {counts['inserted']} inserted, {counts['updated']} updated, {counts['skipped']} skipped.")
+                    total_inserted += counts['inserted'] + counts['updated']
+
+            summary_df = result.get('summary_df', pd.DataFrame())
+            if not summary_df.empty:
+                counts = upsert_data(conn, summary_df, 'grade_summary', conflict_policy)
+                logging.info(f"[ORCHESTRATOR] Grade summary records: {counts['inserted']} inserted, {counts['updated']} updated, {counts['skipped']} skipped.")
+                total_inserted += counts['inserted'] + counts['updated']
+            span.count('rows_written', total_inserted)
+
+    except Exception as e:
+        # The savepoint was rolled back: none of this file's rows remain
+        logging.error(f"[ORCHESTRATOR] An error occurred during processing of {result['filepath']}: {e}", exc_info=True)
+        log_processing_status(conn, file_identifier, data_type, 0, 'FAILURE', commit=commit)
+        return 'FAILURE', 0
+
+    # Log final status
+    status = 'SUCCESS' if total_inserted > 0 else 'NO_NEW_DATA'
+    with instrumentation.span('etl.log', file=os.path.basename(result['filepath'])):
+        log_processing_status(conn, file_identifier, data_type, total_inserted, status, commit=commit)
+    logging.info(f"[ORCHESTRATOR] Finished processing. Status: {status}")
+    return status, total_inserted
+
+def prepare_structured_file(filepath, data_type, conn, retry_failed=False):
+    """
+    Fingerprints a file and consults the ingestion manifest before any Excel parsing.
+    Returns the fingerprint if the file needs ingesting, or None if it can be skipped.
+    """
+    try:
+        fingerprint = fingerprint_file(conn, filepath)
     except OSError as e:
-        logging.error(f"Could not access file stats for {filepath}: {e}")
+        logging.error(f"Could not access file {filepath}: {e}")
+        return None
+
+    if check_manifest(conn, fingerprint, data_type, retry_failed=retry_failed):
+        logging.info(f"[ORCHESTRATOR] {fingerprint['filename']} unchanged since last ingestion (sha256 {fingerprint['content_hash'][:16]}). Skipping.")
+        return None
+
+    return fingerprint
+
+def process_structured_data(filepath, data_type, conn, retry_failed=False, layout_registry=None, conflict_policy=DEFAULT_CONFLICT_POLICY,
+                            parse_cache=True, batch=False):
+    """Orchestrates the reading, processing, and insertion of structured data."""
+    logging.info(f"[ORCHESTRATOR] Processing structured file: {os.path.basename(filepath)} as Type: {data_type}")
+
+    with instrumentation.span('etl.file', file=os.path.basename(filepath), data_type=data_type):
+        # Use the content hash (not the modification time) to decide whether the file changed
+        fingerprint = prepare_structured_file(filepath, data_type, conn, retry_failed=retry_failed)
+        if fingerprint is None:
+            return
+
+        file_identifier = build_file_identifier(fingerprint)
+        content_hash = fingerprint['content_hash'] if parse_cache else None
+        result = parse_structured_file(filepath, data_type, file_identifier, layout_registry, content_hash)
+        status, records_inserted = write_parsed_result(conn, result, conflict_policy, batch=batch)
+        with instrumentation.span('etl.log', file=os.path.basename(filepath)):
+            if status:
+                update_ingestion_manifest(conn, fingerprint, filepath, data_type, status, records_inserted, commit=not batch)
+            if layout_registry is not None:
+                save_layout_registry(conn, layout_registry, commit=not batch)
+
+
+def _counter_mode(counter):
+    """Most frequent value of a Counter, breaking ties like pandas Series.mode() (smallest value first)."""
+    if not counter:
+        return np.nan
+    top_count = max(counter.values())
+    return sorted((v for v, c in counter.items() if c == top_count), key=str)[0]
+
+def read_run_lots(conn, ids):
+    """
+    The auction_lots rows with the given ids as the offers and sales frames of process_lot_details() (dimension
+    names instead of ids, indexed by row id), so they can be written again with upsert_lots().
+    """
+    frames = []
+    for table_name in ['auction_offers', 'auction_sales']:
+        placeholders = ', '.join('?' for _ in ids)
+        df = pd.read_sql_query(f"""
+            SELECT v.*, l.outcome FROM {table_name} v JOIN {migrations.LOTS_TABLE} l ON l.id = v.id
+            WHERE v.id IN ({placeholders}) ORDER BY v.id
+        """, conn, params=list(ids))
+        frames.append(df.set_index('id'))
+    return frames
+
+def reconcile_streamed_metadata(conn, metadata, metadata_counts, conflict_policy=DEFAULT_CONFLICT_POLICY):
+    """
+    Streaming mode tags rows with the sale number/date seen in the first chunk. Once the whole file has
+    been read, the whole-file modes are known; if they differ, this run's rows are corrected in place so
+    the result matches a non-streaming read. Rows whose corrected key is already stored (by another file)
+    are removed and written again under the corrected key with upsert_lots(), so the conflict policy decides
+    between them as it would have at insert time. The sale calendar takes the whole-file date, and loses the
+    first chunk's sale if no lot is left in it.
+    Returns the change to the run's count of written rows (rows merged into stored ones or skipped).
+    """
+    summary_df = pd.DataFrame({col: [_counter_mode(counter)] for col, counter in metadata_counts.items()})
+    sale_number, sale_date = determine_final_metadata(metadata['filename'], summary_df)
+    if (sale_number, sale_date) == (metadata['sale_number'], metadata['sale_date']):
+        return 0
+
+    logging.info(f"  [METADATA] Whole-file metadata differs from the first chunk. Updating rows to Sale: {sale_number}, Date: {sale_date}.")
+    table_name = migrations.LOTS_TABLE
+    run = (metadata['file_identifier'], metadata['timestamp'])
+    colliding = [row[0] for row in conn.execute(f"""
+        SELECT l.id FROM {table_name} l
+        WHERE l.source_file_identifier = ? AND l.processed_timestamp = ? AND EXISTS (
+            SELECT 1 FROM {table_name} e WHERE e.source_location = l.source_location AND e.sale_number = ?
+              AND e.lot_number = l.lot_number AND NOT (e.source_file_identifier = ? AND e.processed_timestamp = ?)
+        ) ORDER BY l.id
+    """, (*run, sale_number, *run))] if sale_number not in (None, metadata['sale_number']) else []
+
+    first_chunk_key = sale_calendar.parse_sale_key(metadata['sale_number'], metadata['sale_date'])
+    sale_year, sale_no = sale_calendar.parse_sale_key(sale_number, sale_date) or (None, None)
+    placeholders = ', '.join('?' for _ in colliding)
+    conn.execute(f"""
+        UPDATE {table_name} SET sale_number = ?, sale_date = ?, sale_year = ?, sale_no = ?
+        WHERE source_file_identifier = ? AND processed_timestamp = ? AND id NOT IN ({placeholders})
+    """, (sale_number, sale_date, sale_year, sale_no, *run, *colliding))
+    if sale_year is not None:
+        # The whole-file date replaces the first chunk's in the calendar
+        sale_calendar.register_sales(conn, [(sale_year, sale_no, sale_date)], replace_dates=True)
+    metadata['sale_number'] = sale_number
+    metadata['sale_date'] = sale_date
+    delta = rewrite_colliding_lots(conn, colliding, sale_number, sale_date, conflict_policy) if colliding else 0
+    # The first chunk's sale stays in the calendar only if other files' lots belong to it
+    if first_chunk_key and first_chunk_key != (sale_year, sale_no):
+        sale_calendar.remove_unused_sales(conn, table_name, [first_chunk_key])
+    return delta
+
+def rewrite_colliding_lots(conn, ids, sale_number, sale_date, conflict_policy):
+    """
+    Writes the stored lots ids again under sale_number/sale_date with upsert_lots(), in place of the rows themselves
+    (reconcile_streamed_metadata). Returns the change to the run's count of written rows.
+    """
+    # Each of these rows was counted once per role when it was inserted
+    offers_df, sales_df = read_run_lots(conn, ids)
+    placeholders = ', '.join('?' for _ in ids)
+    conn.execute(f"DELETE FROM {migrations.LOTS_TABLE} WHERE id IN ({placeholders})", ids)
+    for df in (offers_df, sales_df):
+        df['sale_number'] = sale_number
+        df['sale_date'] = sale_date
+    offer_counts, sale_counts = upsert_lots(conn, offers_df, sales_df, conflict_policy)
+    rewritten = sum(counts['inserted'] + counts['updated'] for counts in (offer_counts, sale_counts))
+    logging.warning(f"  [METADATA] {len(ids)} row(s) collided with rows already stored under Sale {sale_number} and were "
+                    f"merged into them (policy '{conflict_policy}'): {offer_counts['skipped'] + sale_counts['skipped']} row role(s) skipped.")
+    return rewritten - len(offers_df) - len(sales_df)
+
+def process_structured_data_streaming(filepath, data_type, conn, chunk_size=STREAM_CHUNK_SIZE, retry_failed=False, layout_registry=None,
+                                      conflict_policy=DEFAULT_CONFLICT_POLICY, batch=False):
+    """
+    Bounded-memory variant of process_structured_data(): each chunk from iter_file_chunks() is
+    cleaned by process_lot_details() and inserted before the next chunk is read.
+    Sale number/date are resolved from the first chunk and applied to the whole file.
+    All chunks of a file are written under one savepoint, so a failure part-way leaves none of its rows.
+    """
+    logging.info(f"[ORCHESTRATOR] Streaming structured file: {os.path.basename(filepath)} as Type: {data_type}")
+
+    fingerprint = prepare_structured_file(filepath, data_type, conn, retry_failed=retry_failed)
+    if fingerprint is None:
         return
 
-    # Check if already processed successfully
-    if check_already_processed(conn, file_identifier, data_type):
-        logging.info(f"[ORCHESTRATOR] File already processed successfully. Skipping.")
+    file_identifier = build_file_identifier(fingerprint)
+
+    if data_type not in [DATA_TYPE_OFFER, DATA_TYPE_SALE]:
+        # Summary files are small; use the standard path.
+        result = parse_structured_file(filepath, data_type, file_identifier, layout_registry)
+        status, records_inserted = write_parsed_result(conn, result, conflict_policy, batch=batch)
+        if status:
+            update_ingestion_manifest(conn, fingerprint, filepath, data_type, status, records_inserted, commit=not batch)
         return
 
     metadata = {
@@ -673,60 +2102,257 @@ def process_structured_data(filepath, data_type, conn):
         'timestamp': datetime.now().isoformat()
     }
 
-    # Determine keywords (used only if dynamic detection is needed for non-GeneralReport files)
-    if data_type in [DATA_TYPE_OFFER, DATA_TYPE_SALE]:
-        keywords = HEADER_KEYWORDS
-    elif data_type == DATA_TYPE_SUMMARY:
-        keywords = list(COLUMN_MAP_GRADE_SUMMARY.keys())
-    else:
+    total_inserted = 0
+    chunks_read = 0
+    metadata_counts = {'sale_number_internal': Counter(), 'sale_date_internal': Counter()}
+    try:
+        with storage.write_transaction(conn):
+            for chunk in iter_file_chunks(filepath, HEADER_KEYWORDS, chunk_size, layout_registry):
+                mapped_chunk = map_columns(chunk, COLUMN_MAP_LOT_DETAILS)
+                for col, counter in metadata_counts.items():
+                    counter.update(mapped_chunk[col].dropna().value_counts().to_dict())
+                if chunks_read == 0:
+                    sale_number, sale_date = determine_final_metadata(metadata['filename'], mapped_chunk)
+                    metadata['sale_number'] = sale_number
+                    metadata['sale_date'] = sale_date
+                chunks_read += 1
+
+                offers_df, sales_df = process_lot_details(chunk, metadata)
+                for counts in upsert_lots(conn, offers_df, sales_df, conflict_policy):
+                    total_inserted += counts['inserted'] + counts['updated']
+
+            if chunks_read == 0:
+                logging.warning("[ORCHESTRATOR] File is empty or could not be read. Logging as FAILURE.")
+                status = 'FAILURE'
+            else:
+                total_inserted += reconcile_streamed_metadata(conn, metadata, metadata_counts, conflict_policy)
+                status = 'SUCCESS' if total_inserted > 0 else 'NO_NEW_DATA'
+                logging.info(f"[ORCHESTRATOR] Inserted {total_inserted} new records from {chunks_read} chunk(s).")
+
+    except Exception as e:
+        # The savepoint was rolled back: none of this file's chunks remain
+        logging.error(f"[ORCHESTRATOR] An error occurred during streaming of {filepath}: {e}", exc_info=True)
+        status = 'FAILURE'
+        total_inserted = 0
+
+    log_processing_status(conn, file_identifier, data_type, total_inserted, status, commit=not batch)
+    update_ingestion_manifest(conn, fingerprint, filepath, data_type, status, total_inserted, commit=not batch)
+    if layout_registry is not None:
+        save_layout_registry(conn, layout_registry, commit=not batch)
+    logging.info(f"[ORCHESTRATOR] Finished processing. Status: {status}")
+
+
+def _parse_structured_file_worker(task):
+    """Process-pool entry point. Must remain a module-level function so it can be pickled."""
+    filepath, data_type, file_identifier, layout_registry, content_hash = task
+    logging.info(f"[WORKER {os.getpid()}] Parsing structured file: {os.path.basename(filepath)} as Type: {data_type}")
+    return parse_structured_file(filepath, data_type, file_identifier, layout_registry, content_hash)
+
+def process_structured_files_parallel(tasks, conn, workers, retry_failed=False, layout_registry=None, conflict_policy=DEFAULT_CONFLICT_POLICY,
+                                      parse_cache=True, batch=False):
+    """
+    Parses structured files in a process pool and writes the results from this (single writer) process.
+    Results are consumed in submission order so the database ends up identical to a sequential run.
+    Each worker gets a snapshot of the layout registry; layouts it registers are merged and saved here.
+    """
+    pending = []
+    fingerprints = []
+    for filepath, data_type in tasks:
+        fingerprint = prepare_structured_file(filepath, data_type, conn, retry_failed=retry_failed)
+        if fingerprint is None:
+            continue
+        content_hash = fingerprint['content_hash'] if parse_cache else None
+        pending.append((filepath, data_type, build_file_identifier(fingerprint), layout_registry, content_hash))
+        fingerprints.append(fingerprint)
+
+    if not pending:
         return
 
-    # Read the file (V21 Fix applied within this function)
-    df = read_file(filepath, keywords)
+    logging.info(f"[PARALLEL] Parsing {len(pending)} file(s) with {workers} worker process(es).")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # executor.map yields results in submission order, regardless of completion order.
+        for result, fingerprint in zip(executor.map(_parse_structured_file_worker, pending), fingerprints):
+            logging.info(f"[ORCHESTRATOR] Writing results for: {os.path.basename(result['filepath'])} (Type: {result['data_type']})")
+            status, records_inserted = write_parsed_result(conn, result, conflict_policy, batch=batch)
+            if status:
+                update_ingestion_manifest(conn, fingerprint, result['filepath'], result['data_type'], status, records_inserted,
+                                          commit=not batch)
+            if layout_registry is not None and result['layout_registry'] is not None:
+                merge_layout_registry(layout_registry, result['layout_registry'])
+                save_layout_registry(conn, layout_registry, commit=not batch)
+
+
+def process_unstructured_files(tasks, conn, workers=1, retry_failed=False, batch=False):
+    """
+    Ingests PDF/DOCX documents into market_commentary (one row per document, keyed by sale number).
+    Pages are hashed in this process; only pages missing from page_text_cache are extracted, in a process
+    pool when workers > 1. All documents are then written with one bulk insert.
+    """
+    documents = []
+    extraction_tasks = []
+    for filepath, data_type in tasks:
+        logging.info(f"[ORCHESTRATOR] Processing unstructured file: {os.path.basename(filepath)} as Type: {data_type}")
+        fingerprint = prepare_structured_file(filepath, data_type, conn, retry_failed=retry_failed)
+        if fingerprint is None:
+            continue
 
-    if df.empty:
-        logging.warning("[ORCHESTRATOR] File is empty or could not be read. Logging as FAILURE.")
-        log_processing_status(conn, file_identifier, data_type, 0, 'FAILURE')
+        page_hashes = hash_document_pages(filepath)
+        documents.append({'filepath': filepath, 'data_type': data_type, 'fingerprint': fingerprint, 'page_hashes': page_hashes})
+
+    if not documents:
         return
 
-    # Process and Insert
-    total_inserted = 0
+    # Page-level cache lookup
+    page_texts = load_cached_page_texts(conn, [h for doc in documents for h in (doc['page_hashes'] or [])])
+    pending_hashes = set()
+    for doc in documents:
+        missing = []
+        for page_index, page_hash in enumerate(doc['page_hashes'] or []):
+            if page_hash not in page_texts and page_hash not in pending_hashes:
+                pending_hashes.add(page_hash)
+                missing.append(page_index)
+        for start in range(0, len(missing), DOCUMENT_PAGE_BATCH):
+            extraction_tasks.append((doc['filepath'], missing[start:start + DOCUMENT_PAGE_BATCH]))
+
+    total_pages = sum(len(doc['page_hashes'] or []) for doc in documents)
+    extracted_pages = sum(len(pages) for _, pages in extraction_tasks)
+    logging.info(f"[DOCUMENTS] {len(documents)} document(s), {total_pages} page(s): {total_pages - extracted_pages} cached or repeated, {extracted_pages} to extract.")
+
+    # Extraction (CPU-bound) in worker processes; results are written from this process only
+    failed_files = set()
+    new_cache_rows = []
+    if extraction_tasks:
+        hashes_by_file = {doc['filepath']: doc['page_hashes'] for doc in documents}
+        timestamp = datetime.now().isoformat()
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            futures = [(task, executor.submit(extract_document_pages, task) if executor else None) for task in extraction_tasks]
+            for task, future in futures:
+                try:
+                    filepath, pages = future.result() if future else extract_document_pages(task)
+                except Exception as e:
+                    logging.error(f"[DOCUMENTS] Text extraction failed for {os.path.basename(task[0])}: {e}")
+                    failed_files.add(task[0])
+                    continue
+                for page_index, text in pages:
+                    page_hash = hashes_by_file[filepath][page_index]
+                    page_texts[page_hash] = text
+                    new_cache_rows.append((page_hash, text, os.path.basename(filepath), timestamp))
+        finally:
+            if executor:
+                executor.shutdown()
+
+        conn.executemany("INSERT OR IGNORE INTO page_text_cache (page_hash, text, first_seen_file, extracted_at) VALUES (?, ?, ?, ?)", new_cache_rows)
+
+    # Bulk insert: one market_commentary row per document (a changed document replaces its previous row)
+    timestamp = datetime.now().isoformat()
+    commentary_rows = []
+    outcomes = []
+    for doc in documents:
+        filename = doc['fingerprint']['filename']
+        if doc['page_hashes'] is None or doc['filepath'] in failed_files:
+            outcomes.append((doc, 'FAILURE', 0))
+            continue
+
+        content = '\n\n'.join(page_texts[h] for h in doc['page_hashes'] if page_texts.get(h)).strip()
+        if not content:
+            logging.warning(f"[DOCUMENTS] No extractable text in {filename} (scanned or empty document).")
+            outcomes.append((doc, 'NO_NEW_DATA', 0))
+            continue
+
+        sale_number, report_date, content_type = extract_commentary_metadata(filename)
+        commentary_rows.append((SOURCE_LOCATION, report_date, sale_number, content_type, content, filename, timestamp))
+        outcomes.append((doc, 'SUCCESS', 1))
+
     try:
-        if data_type in [DATA_TYPE_OFFER, DATA_TYPE_SALE]:
-            offers_df, sales_df = process_lot_details(df, metadata)
+        with storage.write_transaction(conn):
+            conn.executemany("DELETE FROM market_commentary WHERE source_location = ? AND source_file = ?",
+                             [(row[0], row[5]) for row in commentary_rows])
+            conn.executemany("""
+                INSERT INTO market_commentary
+                (source_location, report_date, sale_number, content_type, content, source_file, processed_timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, commentary_rows)
+        logging.info(f"[DOCUMENTS] Inserted {len(commentary_rows)} market commentary record(s).")
+    except sqlite3.Error as e:
+        logging.error(f"  [DB_INSERT_ERROR] Failed to insert data into market_commentary: {e}")
+        outcomes = [(doc, 'FAILURE', 0) for doc, _, _ in outcomes]
 
-            if not offers_df.empty:
-                 inserted = insert_data(conn, offers_df, 'auction_offers')
-                 logging.info(f"[ORCHESTRATOR] Inserted {inserted} new offer records.")
-                 total_inserted += inserted
+    for doc, status, records_inserted in outcomes:
+        file_identifier = build_file_identifier(doc['fingerprint'])
+        log_processing_status(conn, file_identifier, doc['data_type'], records_inserted, status, commit=not batch)
+        update_ingestion_manifest(conn, doc['fingerprint'], doc['filepath'], doc['data_type'], status, records_inserted,
+                                  commit=not batch)
 
-            if not sales_df.empty:
-                inserted = insert_data(conn, sales_df, 'auction_sales')
-                logging.info(f"[ORCHESTRATOR] Inserted {inserted} new sale records.")
-                total_inserted += inserted
 
-        elif data_type == DATA_TYPE_SUMMARY:
-             # ... Summary logic ...
-             pass
+def rebuild_from_parse_cache(conn, layout_registry=None, conflict_policy=DEFAULT_CONFLICT_POLICY):
+    """
+    Rebuilds the lot tables from the parse cache: every manifest entry is re-processed with the current
+    column map and cleaning rules, in original ingestion order, without opening the workbooks.
+    Entries missing from the cache are re-read from MOMBASA_DIR (and cached) if the file is still there; if any
+    entry is neither cached nor in MOMBASA_DIR the rebuild is aborted before the tables are cleared.
+    """
+    if pyarrow is None:
+        logging.error("[PARSE_CACHE] pyarrow is not installed; the parse cache is unavailable. Nothing rebuilt.")
+        return
 
-        # Log final status
-        status = 'SUCCESS' if total_inserted > 0 else 'NO_NEW_DATA'
-        log_processing_status(conn, file_identifier, data_type, total_inserted, status)
-        logging.info(f"[ORCHESTRATOR] Finished processing. Status: {status}")
+    manifest_rows = conn.execute("""
+        SELECT content_hash, data_type, filename, file_size, sheet_count FROM ingestion_manifest
+        WHERE data_type IN (?, ?, ?) ORDER BY first_seen
+    """, (DATA_TYPE_OFFER, DATA_TYPE_SALE, DATA_TYPE_SUMMARY)).fetchall()
+    if not manifest_rows:
+        logging.info("[PARSE_CACHE] The ingestion manifest is empty. Nothing to rebuild.")
+        return
 
-    except Exception as e:
-        logging.error(f"[ORCHESTRATOR] An error occurred during processing of {filepath}: {e}", exc_info=True)
-        log_processing_status(conn, file_identifier, data_type, total_inserted, 'FAILURE')
+    # Clearing the tables would lose the rows of an entry that cannot be rebuilt, while the manifest still skips its file
+    missing = [(filename, content_hash) for content_hash, _, filename, _, _ in manifest_rows
+               if not os.path.exists(parse_cache_path(content_hash, HEADER_KEYWORDS))
+               and not os.path.exists(os.path.join(MOMBASA_DIR, filename))]
+    if missing:
+        for filename, content_hash in missing:
+            logging.error(f"[PARSE_CACHE] {filename} (sha256 {content_hash[:16]}) is neither cached nor in {MOMBASA_DIR}.")
+        logging.error(f"[PARSE_CACHE] {len(missing)} manifest entries cannot be rebuilt. Nothing rebuilt.")
+        return
+
+    logging.info(f"[PARSE_CACHE] Rebuilding {', '.join(REBUILD_TABLES)} from {len(manifest_rows)} manifest entries.")
+    rebuilt = 0
+    # One transaction: the cleared tables and their rebuilt contents become visible together, and a failure
+    # part-way leaves the tables as they were
+    with storage.write_transaction(conn):
+        for table_name in REBUILD_TABLES:
+            conn.execute(f"DELETE FROM {table_name}")
+
+        for content_hash, data_type, filename, file_size, sheet_count in manifest_rows:
+            fingerprint = {'filename': filename, 'content_hash': content_hash, 'file_size': file_size, 'sheet_count': sheet_count}
+            filepath = os.path.join(MOMBASA_DIR, filename)
+            logging.info(f"[ORCHESTRATOR] Rebuilding: {filename} (Type: {data_type})")
+            result = parse_structured_file(filepath, data_type, build_file_identifier(fingerprint), layout_registry, content_hash)
+            status, records_inserted = write_parsed_result(conn, result, conflict_policy, batch=True)
+            if status:
+                update_ingestion_manifest(conn, fingerprint, filepath, data_type, status, records_inserted, commit=False)
+                rebuilt += 1
+            if layout_registry is not None:
+                save_layout_registry(conn, layout_registry, commit=False)
+
+    logging.info(f"[PARSE_CACHE] Rebuild finished. Files rebuilt: {rebuilt}.")
 
 
 def identify_file_type(filename):
     """Identifies the data type based on filename patterns."""
     name = filename.lower()
 
+    # Documents are always unstructured, even when the name mentions a sale ("Final Market Report Sale 38.pdf")
+    if os.path.splitext(name)[1] in UNSTRUCTURED_EXTENSIONS:
+        return DATA_TYPE_COMMENTARY, 'unstructured'
+
     # GeneralReport contains both offers and sales data (treated as SALE type for unified processing)
     if "generalreport" in name:
         return DATA_TYPE_SALE, 'structured'
 
+    # AuctionSummary_[YYYY-NN]: grade summary sheets plus a lot-level 'Detail' sheet
+    if "auctionsummary" in name or "auction summary" in name:
+        return DATA_TYPE_SUMMARY, 'structured'
+
     if "offer" in name or "catalogue" in name:
         return DATA_TYPE_OFFER, 'structured'
 
@@ -747,9 +2373,238 @@ def identify_file_type(filename):
 
     return None, None
 
-def main():
+def ingest_files(conn, filenames, args, layout_registry=None, parse_cache=True):
+    """
+    Identifies and ingests the given files from MOMBASA_DIR (unchanged content is skipped via the manifest).
+    With args.batch the whole call is one transaction (each file a savepoint inside it), so the batch
+    becomes visible to readers at once; otherwise every file is committed as it completes.
+    Returns the number of recognised files.
+    """
+    processed_files = 0
+    structured_tasks = []
+    unstructured_tasks = []
+    batch = args.batch
+    with instrumentation.span('etl.ingest', files=len(filenames)), storage.write_transaction(conn) if batch else nullcontext():
+        for filename in filenames:
+            filepath = os.path.join(MOMBASA_DIR, filename)
+
+            if os.path.isdir(filepath):
+                continue
+
+            # Skip temporary/hidden files
+            if filename.startswith('~') or filename.startswith('.'):
+                continue
+
+            data_type, structure_type = identify_file_type(filename)
+
+            if data_type:
+                logging.info(f"\n--- Processing File: {filename} (Type: {data_type}, Structure: {structure_type}) ---")
+                if structure_type == 'structured':
+                    if args.workers > 1:
+                        # Deferred: parsed in the process pool below, written in listing order.
+                        structured_tasks.append((filepath, data_type))
+                    elif args.stream:
+                        process_structured_data_streaming(filepath, data_type, conn, chunk_size=args.chunk_size,
+                                                          retry_failed=args.retry_failed, layout_registry=layout_registry,
+                                                          conflict_policy=args.on_conflict, batch=batch)
+                    else:
+                        process_structured_data(filepath, data_type, conn, retry_failed=args.retry_failed, layout_registry=layout_registry,
+                                                conflict_policy=args.on_conflict, parse_cache=parse_cache, batch=batch)
+                elif structure_type == 'unstructured':
+                    # Deferred: documents are extracted together (page cache, process pool) and bulk inserted below.
+                    unstructured_tasks.append((filepath, data_type))
+                processed_files += 1
+            else:
+                logging.info(f"Skipping unrecognized file: {filename}")
+
+        if structured_tasks:
+            process_structured_files_parallel(structured_tasks, conn, args.workers, retry_failed=args.retry_failed,
+                                              layout_registry=layout_registry, conflict_policy=args.on_conflict,
+                                              parse_cache=parse_cache, batch=batch)
+
+        if unstructured_tasks:
+            process_unstructured_files(unstructured_tasks, conn, args.workers, retry_failed=args.retry_failed, batch=batch)
+
+    if batch:
+        logging.info(f"[ORCHESTRATOR] Batch committed ({processed_files} file(s) in one transaction).")
+    return processed_files
+
+# =============================================================================
+# Watch Mode Functions (continuous ingestion of MOMBASA_DIR)
+# =============================================================================
+
+def snapshot_directory(directory):
+    """Returns {filename: (size, mtime_ns)} for the regular, non-temporary files in a directory."""
+    snapshot = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith('~') or entry.name.startswith('.'):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                # Removed or replaced between listing and stat
+                continue
+            snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+def open_directory_notifier(directory):
+    """Returns an inotify instance watching the directory, or None if inotify is unavailable (polling is used)."""
+    if INotify is None:
+        return None
+    try:
+        notifier = INotify()
+        notifier.add_watch(directory, inotify_flags.CREATE | inotify_flags.MODIFY | inotify_flags.CLOSE_WRITE |
+                           inotify_flags.MOVED_TO | inotify_flags.MOVED_FROM | inotify_flags.DELETE)
+        return notifier
+    except OSError as e:
+        logging.warning(f"[WATCH] inotify unavailable ({e}); falling back to polling.")
+        return None
+
+def wait_for_directory_change(notifier, timeout):
+    """Blocks until the directory may have changed: inotify events (or timeout), otherwise a poll interval."""
+    if notifier is None:
+        time.sleep(timeout)
+        return
+    # Event details are not needed: the directory is re-listed and compared with the previous snapshot
+    notifier.read(timeout=None if timeout is None else int(timeout * 1000))
+
+def update_pending_files(pending, snapshot, known, now):
+    """
+    Tracks files whose (size, mtime) differs from the last ingested state. A file whose signature moves
+    (still being copied) restarts its debounce period.
+    """
+    for filename in list(pending):
+        if filename not in snapshot:
+            del pending[filename]
+    for filename, signature in snapshot.items():
+        if known.get(filename) == signature:
+            pending.pop(filename, None)
+        elif filename not in pending or pending[filename][0] != signature:
+            pending[filename] = (signature, now)
+
+def collect_affected_sales(conn, since):
+    """Sale numbers with rows inserted or changed at or after the given timestamp (ISO format)."""
+    sale_numbers = set()
+    for table_name in AFFECTED_SALE_TABLES:
+        try:
+            cursor = conn.execute(f"""
+                SELECT DISTINCT sale_number FROM {table_name} WHERE processed_timestamp >= ? AND sale_number IS NOT NULL
+            """, (since,))
+            sale_numbers.update(str(row[0]) for row in cursor)
+        except sqlite3.Error as e:
+            logging.error(f"[WATCH] Could not read affected sales from {table_name}: {e}")
+    return sorted(sale_numbers)
+
+def record_affected_sales(filenames, sale_numbers, log_path=AFFECTED_SALES_LOG):
+    """Appends one JSON line per ingested batch so downstream regeneration can be scoped to these sales."""
+    entry = {
+        'timestamp': datetime.now().isoformat(),
+        'source_location': SOURCE_LOCATION,
+        'files': sorted(filenames),
+        'sale_numbers': sale_numbers,
+    }
+    try:
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+    except OSError as e:
+        logging.error(f"[WATCH] Could not append to {log_path}: {e}")
+
+def watch_directory(conn, args, layout_registry=None, parse_cache=True):
+    """
+    Watches MOMBASA_DIR and ingests new or changed files as they arrive, until interrupted.
+    Files are debounced (stable size and mtime for args.watch_debounce seconds) so partially copied
+    workbooks are not read. Each batch logs and records the sale numbers it affected.
+    """
+    notifier = open_directory_notifier(MOMBASA_DIR)
+    mode = 'inotify' if notifier is not None else f"polling every {args.watch_interval}s"
+    logging.info(f"[WATCH] Watching {MOMBASA_DIR} ({mode}, debounce {args.watch_debounce}s). Press Ctrl+C to stop.")
+
+    # Everything present now was handled by the initial scan
+    known = snapshot_directory(MOMBASA_DIR)
+    pending = {}
+    try:
+        while True:
+            # With inotify, block until something happens unless a debounce is in progress
+            timeout = args.watch_interval if (pending or notifier is None) else None
+            wait_for_directory_change(notifier, timeout)
+
+            now = time.monotonic()
+            snapshot = snapshot_directory(MOMBASA_DIR)
+            for filename in set(known) - set(snapshot):
+                del known[filename]
+            update_pending_files(pending, snapshot, known, now)
+
+            ready = sorted(name for name, (_, since) in pending.items() if now - since >= args.watch_debounce)
+            if not ready:
+                continue
+
+            logging.info(f"[WATCH] {len(ready)} new or changed file(s): {', '.join(ready)}")
+            batch_start = datetime.now().isoformat()
+            ingest_files(conn, ready, args, layout_registry=layout_registry, parse_cache=parse_cache)
+            conn.commit()
+            for filename in ready:
+                known[filename] = pending.pop(filename)[0]
+
+            sale_numbers = collect_affected_sales(conn, batch_start)
+            record_affected_sales(ready, sale_numbers)
+            if sale_numbers:
+                logging.info(f"[WATCH] Affected sales: {', '.join(sale_numbers)}")
+            else:
+                logging.info("[WATCH] No new or changed rows.")
+    except KeyboardInterrupt:
+        logging.info("[WATCH] Stopped.")
+    finally:
+        if notifier is not None:
+            notifier.close()
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Mombasa auction data processor (ETL).")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes used to parse structured files (default: 1, sequential).")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Re-ingest files whose unchanged content previously FAILED with the current processor version.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Read workbooks in bounded-memory chunks (sequential; ignores --workers and the parse cache).")
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE,
+                        help=f"Rows per chunk in --stream mode (default: {STREAM_CHUNK_SIZE}).")
+    parser.add_argument('--on-conflict', choices=CONFLICT_POLICIES, default=DEFAULT_CONFLICT_POLICY,
+                        help="How rows already in the database (same sale and lot) are handled: keep them (ignore), "
+                             "overwrite them (replace) or fill in non-null fields (update). Default: ignore.")
+    parser.add_argument('--batch', action='store_true',
+                        help="Ingest the run as one transaction (a savepoint per file): readers see all of it or none of it, "
+                             "and a failed file rolls back only its own rows.")
+    parser.add_argument('--no-parse-cache', action='store_true',
+                        help="Do not read or write the Parquet parse cache (parse_cache/).")
+    parser.add_argument('--rebuild-from-cache', action='store_true',
+                        help="Clear the lot tables and rebuild them from the parse cache with the current rules, then exit.")
+    parser.add_argument('--watch', action='store_true',
+                        help="After the initial scan, keep running and ingest new or changed files as they arrive in Mombasa/.")
+    parser.add_argument('--watch-debounce', type=float, default=WATCH_DEBOUNCE_SECONDS,
+                        help=f"Seconds a file's size and mtime must be stable before it is ingested (default: {WATCH_DEBOUNCE_SECONDS}).")
+    parser.add_argument('--watch-interval', type=float, default=WATCH_POLL_INTERVAL,
+                        help=f"Polling interval in seconds when inotify is unavailable (default: {WATCH_POLL_INTERVAL}).")
+    parser.add_argument('--review-layouts', action='store_true',
+                        help="List header layouts flagged for review (PENDING_REVIEW) and exit.")
+    parser.add_argument('--approve-layout', action='append', default=[], metavar='FINGERPRINT',
+                        help="Mark a registered header layout as REVIEWED (fingerprint or prefix; repeatable) and exit.")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="Record stage timings and memory peaks: one JSON line per span in FILE ('-' for none), "
+                             "and a summary table at exit (see instrumentation.py).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main execution loop."""
+    args = parse_arguments(argv)
     logging.info("--- Starting Mombasa Data Processor V23 ---")
+    if args.trace:
+        instrumentation.enable(None if args.trace == '-' else args.trace)
+
+    if args.stream and args.workers > 1:
+        logging.warning("--stream processes files sequentially in bounded memory. Ignoring --workers.")
+        args.workers = 1
     
     # Log the detected path
     logging.info(f"[PATH_DIAGNOSTIC] Target MOMBASA_DIR: {MOMBASA_DIR}")
@@ -759,11 +2614,18 @@ def main():
         sys.exit(1)
 
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = storage.connect(DB_FILE)
     except sqlite3.Error as e:
         logging.error(f"Failed to connect to the database: {e}. Exiting.")
         sys.exit(1)
 
+    if args.review_layouts or args.approve_layout:
+        if args.approve_layout:
+            approve_layouts(conn, args.approve_layout)
+        if args.review_layouts:
+            list_layouts(conn, status='PENDING_REVIEW')
+        conn.close()
+        return
 
     try:
         if not os.path.exists(MOMBASA_DIR):
@@ -772,41 +2634,39 @@ def main():
             logging.error("Ensure the repository is checked out correctly and the directory structure is intact. Exiting.")
             sys.exit(1)
 
-        logging.info(f"Scanning directory: {MOMBASA_DIR}")
-        processed_files = 0
-        # Iterating through all files in the directory
-        for filename in os.listdir(MOMBASA_DIR):
-            filepath = os.path.join(MOMBASA_DIR, filename)
-
-            if os.path.isdir(filepath):
-                continue
+        # Known header layouts (lot details); new ones are registered as files are read
+        layout_registry = load_layout_registry(conn)
 
-            # Skip temporary/hidden files
-            if filename.startswith('~') or filename.startswith('.'):
-                continue
+        if args.rebuild_from_cache:
+            rebuild_from_parse_cache(conn, layout_registry, conflict_policy=args.on_conflict)
+            return
 
-            data_type, structure_type = identify_file_type(filename)
+        parse_cache = not args.no_parse_cache
+        if parse_cache and pyarrow is None:
+            logging.info("[PARSE_CACHE] pyarrow is not installed; workbooks will not be cached.")
 
-            if data_type:
-                logging.info(f"\n--- Processing File: {filename} (Type: {data_type}, Structure: {structure_type}) ---")
-                if structure_type == 'structured':
-                    process_structured_data(filepath, data_type, conn)
-                elif structure_type == 'unstructured':
-                    # process_unstructured_data(filepath, data_type, conn)
-                    pass # Placeholder
-                processed_files += 1
-            else:
-                logging.info(f"Skipping unrecognized file: {filename}")
+        logging.info(f"Scanning directory: {MOMBASA_DIR}")
+        processed_files = ingest_files(conn, os.listdir(MOMBASA_DIR), args, layout_registry=layout_registry, parse_cache=parse_cache)
 
         if processed_files == 0:
             logging.info("No processable files found in the directory.")
 
+        if args.watch:
+            conn.commit()
+            watch_directory(conn, args, layout_registry=layout_registry, parse_cache=parse_cache)
+
+        # Persist manifest bookkeeping (stat cache, last_seen) recorded for skipped files.
+        conn.commit()
     except Exception as e:
         logging.error(f"An unexpected error occurred during the main loop: {e}", exc_info=True)
+        # Nothing of a failed run is committed here; files already committed by their own transactions remain
+        conn.rollback()
     finally:
         if conn:
+            # Refresh planner statistics for the analysis indexes if this run changed them significantly
+            conn.execute("PRAGMA optimize")
             conn.close()
         logging.info("--- Mombasa Data Processor Finished ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
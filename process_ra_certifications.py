@@ -5,6 +5,7 @@ import sqlite3
 from datetime import datetime
 import logging
 import uuid
+import storage # Shared SQLite connections (WAL, tuned pragmas)
 
 # =============================================================================
 # Configuration (Aligned with TeaTrade Project Structure)
@@ -37,7 +38,7 @@ def connect_db():
     logging.info(f"Attempting to connect to database at: {DB_FILE}")
         
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = storage.connect(DB_FILE)
         return conn
     except sqlite3.Error as e:
         logging.error(f"Database connection error: {e}")
@@ -0,0 +1,68 @@
+# report_json.py
+# JSON output of the analyzer (reports, chart specs, the index). With orjson installed, numeric columns are
+# written straight from their NumPy buffers (NaN as null, no per-value Python objects); without it the standard
+# json module is used and columns are converted to lists, with NaN/NA as None.
+#
+# Data source columns go through column_values() / code_values(), which return whatever the active encoder
+# writes fastest; dumps() then writes the report as bytes, minified or indented (pretty).
+import json
+
+import numpy as np
+import pandas as pd
+
+# Fast JSON encoder with NumPy support (optional)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# =============================================================================
+# Columns
+# =============================================================================
+
+def column_values(series):
+    """
+    A column for dumps(): numeric and boolean NumPy columns as a contiguous array (orjson writes NaN as null),
+    anything else - and every column without orjson - as a list with missing values as None.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+        values = series.to_numpy()
+        if orjson is not None:
+            return np.ascontiguousarray(values)
+        if dtype.kind == 'f' and np.isnan(values).any():
+            return series.astype(object).where(series.notna(), None).tolist()
+        return values.tolist()
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def code_values(codes):
+    """Dictionary codes (an integer array, -1 for missing) for dumps(), with missing codes as None."""
+    missing = codes < 0
+    if missing.any():
+        return [None if code < 0 else code for code in codes.tolist()]
+    return np.ascontiguousarray(codes) if orjson is not None else codes.tolist()
+
+# =============================================================================
+# Encoding
+# =============================================================================
+
+def _default(value):
+    """Values the encoders do not handle natively: NumPy arrays and scalars, then anything else as text."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is pd.NA:
+        return None
+    return str(value)
+
+def dumps(obj, pretty=False):
+    """obj as UTF-8 JSON bytes: minified, or indented by two spaces when pretty."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    if pretty:
+        return json.dumps(obj, indent=2, default=_default).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), default=_default).encode('utf-8')
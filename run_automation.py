@@ -4,6 +4,9 @@ import logging
 import datetime
 import os
 import sys
+import sqlite3
+
+import storage # checkpoint_to_rollback_journal() before the databases are staged
 
 # Configuration
 # IMPORTANT: Ensure this path is correct for your local setup.
@@ -21,11 +24,15 @@ JOBS_TO_RUN = [
 ]
 
 # Files/Directories to commit automatically
+# The jobs write market_reports.db in WAL mode (storage.SQLITE_PRAGMAS), which leaves recent commits in its -wal file
+# and WAL mode in its header. The databases listed in DATABASES_TO_COMMIT are checkpointed and switched back to
+# rollback-journal mode before they are staged, so the committed file is complete on its own.
 FILES_TO_COMMIT = [
     "market_reports.db",
     "market-reports-library.json", # The consolidated library file
     "report_data/" # Commit the entire data directory
 ]
+DATABASES_TO_COMMIT = [path for path in FILES_TO_COMMIT if path.endswith(".db")]
 
 # Set up logging to stdout
 logging.basicConfig(level=logging.INFO, format='AUTOMATION: %(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
@@ -101,8 +108,19 @@ def git_sync_repository():
         
         # 1. Add files/directories
         logging.info("Staging changes...")
+        files_to_commit = list(FILES_TO_COMMIT)
+        for db_file in DATABASES_TO_COMMIT:
+            db_path = os.path.join(REPO_PATH, db_file)
+            if not os.path.exists(db_path):
+                continue
+            try:
+                storage.checkpoint_to_rollback_journal(db_path)
+            except sqlite3.Error as e:
+                # An incomplete database must not be committed; the other files still are
+                logging.error(f"Could not checkpoint {db_file} ({e}). It will not be committed.")
+                files_to_commit.remove(db_file)
         # Use repo.git.add() for robust handling of directories/new files
-        repo.git.add(FILES_TO_COMMIT)
+        repo.git.add(files_to_commit)
         
         # 2. Check if there are changes staged (comparing index to HEAD)
         if repo.index.diff('HEAD'):
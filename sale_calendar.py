@@ -0,0 +1,135 @@
+# sale_calendar.py
+# The auction's sale calendar: every sale as integers (year, sale_no) with its chronological ordinal and sale date.
+# sale_number is stored as text that mixes bare numbers ('35', from the sale code or file name) with 'YYYY-NN';
+# the year of a bare number comes from the sale date (or, lacking one, the file name). auction_lots carries the same (sale_year, sale_no), so
+# previous/next-sale lookups and ranges are integer comparisons instead of string ones ('35' > '2025-41').
+import re
+
+import pandas as pd
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+CALENDAR_TABLE = 'sale_calendar'
+# Integer sale key columns on auction_lots (migration 5)
+SALE_KEY_COLUMNS = ['sale_year', 'sale_no']
+
+# 'YYYY-NN' (also 'YYYY/NN', 'YYYY_NN', 'YYYY NN') and bare 'NN' sale numbers
+YEAR_SALE_PATTERN = re.compile(r"^\s*(\d{4})\s*[-/_ ]\s*(\d{1,3})\s*$")
+SALE_PATTERN = re.compile(r"^\s*(\d{1,3})\s*$")
+# Sale dates are stored as ISO 8601 (process_mombasa_data.parse_date)
+DATE_YEAR_PATTERN = re.compile(r"^\s*(\d{4})-\d{2}-\d{2}")
+
+# =============================================================================
+# Sale Keys
+# =============================================================================
+
+def parse_sale_key(sale_number, sale_date=None, year=None):
+    """
+    (year, sale_no) of a stored sale_number and sale_date, or None when the sale cannot be placed in the calendar.
+    A bare sale number without a sale date takes year (e.g. the file name's) when given.
+    """
+    if sale_number is None or pd.isna(sale_number):
+        return None
+    text = str(sale_number)
+    match = YEAR_SALE_PATTERN.match(text)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    match = SALE_PATTERN.match(text)
+    if not match:
+        return None
+    date_match = None if sale_date is None or pd.isna(sale_date) else DATE_YEAR_PATTERN.match(str(sale_date))
+    if date_match:
+        return int(date_match.group(1)), int(match.group(1))
+    return (int(year), int(match.group(1))) if year is not None else None
+
+def sale_label(year, sale_no):
+    """The canonical sale number of a calendar sale ('2025-07'); zero-padded so labels of a year sort as text too."""
+    return f"{int(year)}-{int(sale_no):02d}"
+
+def assign_sale_keys(df):
+    """
+    Returns df with sale_year/sale_no (nullable integers) from its sale_number and sale_date columns. Each distinct
+    (sale_number, sale_date) pair is parsed once.
+    """
+    dates = df['sale_date'] if 'sale_date' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    pairs = list(zip(df['sale_number'], dates))
+    keys = {pair: parse_sale_key(*pair) for pair in set(pairs)}
+    row_keys = [keys[pair] for pair in pairs]
+    return df.assign(
+        sale_year=pd.array([key[0] if key else None for key in row_keys], dtype='Int64'),
+        sale_no=pd.array([key[1] if key else None for key in row_keys], dtype='Int64'),
+    )
+
+# =============================================================================
+# Calendar Table
+# =============================================================================
+
+def create_calendar_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CALENDAR_TABLE} (
+            year INTEGER NOT NULL, sale_no INTEGER NOT NULL, ordinal INTEGER NOT NULL, sale_date TEXT,
+            PRIMARY KEY (year, sale_no)
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_sale_calendar_ordinal ON {CALENDAR_TABLE} (ordinal)")
+
+def refresh_ordinals(conn):
+    """Numbers the calendar 1..n in (year, sale_no) order."""
+    conn.execute(f"""
+        UPDATE {CALENDAR_TABLE} SET ordinal = (
+            SELECT COUNT(*) FROM {CALENDAR_TABLE} c
+            WHERE c.year < {CALENDAR_TABLE}.year OR (c.year = {CALENDAR_TABLE}.year AND c.sale_no <= {CALENDAR_TABLE}.sale_no)
+        )
+    """)
+
+def register_sales(conn, rows, replace_dates=False):
+    """
+    Adds (year, sale_no, sale_date) rows missing from the calendar (a known sale gains a date it lacked, or with
+    replace_dates any other date given) and renumbers the ordinals when sales were added. Returns the number of
+    sales added.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    count_before = conn.execute(f"SELECT COUNT(*) FROM {CALENDAR_TABLE}").fetchone()[0]
+    stored_date = f"{CALENDAR_TABLE}.sale_date IS NOT excluded.sale_date" if replace_dates else f"{CALENDAR_TABLE}.sale_date IS NULL"
+    conn.executemany(f"""
+        INSERT INTO {CALENDAR_TABLE} (year, sale_no, ordinal, sale_date) VALUES (?, ?, 0, ?)
+        ON CONFLICT (year, sale_no) DO UPDATE SET sale_date = excluded.sale_date
+        WHERE {stored_date} AND excluded.sale_date IS NOT NULL
+    """, rows)
+    added = conn.execute(f"SELECT COUNT(*) FROM {CALENDAR_TABLE}").fetchone()[0] - count_before
+    if added:
+        refresh_ordinals(conn)
+    return added
+
+def register_lot_sales(conn, df):
+    """register_sales() for the sales of a lot frame with sale keys (assign_sale_keys); the earliest date of each."""
+    keyed = df.dropna(subset=SALE_KEY_COLUMNS)
+    if keyed.empty:
+        return 0
+    dates = keyed['sale_date'] if 'sale_date' in keyed.columns else pd.Series(None, index=keyed.index, dtype=object)
+    sale_dates = dates.groupby([keyed['sale_year'], keyed['sale_no']]).min()
+    return register_sales(conn, [(int(year), int(sale_no), None if pd.isna(date) else str(date))
+                                 for (year, sale_no), date in sale_dates.items()])
+
+def remove_unused_sales(conn, lots_table, keys):
+    """
+    Deletes the calendar sales among keys ((year, sale_no) pairs) that no lot of lots_table belongs to any more (each
+    role is checked on its own sale key index) and renumbers the ordinals when any were. Returns the number deleted.
+    """
+    unused = ' AND '.join(f"NOT EXISTS (SELECT 1 FROM {lots_table} WHERE {role} = 1 AND sale_year = ? AND sale_no = ?)"
+                          for role in ('listed', 'sold'))
+    deleted = 0
+    for year, sale_no in set(keys):
+        deleted += conn.execute(f"DELETE FROM {CALENDAR_TABLE} WHERE year = ? AND sale_no = ? AND {unused}",
+                                (year, sale_no) * 3).rowcount
+    if deleted:
+        refresh_ordinals(conn)
+    return deleted
+
+def load_ordinals(conn):
+    """(year, sale_no) -> ordinal of every calendar sale."""
+    return {(year, sale_no): ordinal for year, sale_no, ordinal in conn.execute(f"SELECT year, sale_no, ordinal FROM {CALENDAR_TABLE}")}
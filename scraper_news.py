@@ -8,6 +8,7 @@ import random
 import os
 from bs4 import BeautifulSoup, Comment
 import re
+import storage # Shared SQLite connections (tuned pragmas, pooled across phases)
 
 # Import for anti-bot detection evasion
 try:
@@ -33,6 +34,8 @@ except ImportError:
             return 100 if s1 == s2 else 0
 
 DB_FILE = "news.db"
+# news.db is committed by scrape_news.yml, so it stays in rollback-journal mode (no -wal file to leave behind)
+DB_PRAGMAS = storage.ROLLBACK_JOURNAL_PRAGMAS
 HTML_FILE = "news.html"
 MAX_PAGES_PER_SOURCE = 5 
 BING_TARGET_ARTICLES = 200 # Target count for Bing News
@@ -49,7 +52,7 @@ NAVIGATION_WAIT_STRATEGY = "domcontentloaded"
 def initialize_database():
     """Creates the news table in the database if it doesn't exist."""
     try:
-        with sqlite3.connect(DB_FILE) as conn:
+        with storage.pooled_connection(DB_FILE, DB_PRAGMAS) as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS articles (
                     id INTEGER PRIMARY KEY, headline TEXT NOT NULL, snippet TEXT,
@@ -724,7 +727,8 @@ def main():
     print("-" * 40)
     print("Updating database...")
     try:
-        with sqlite3.connect(DB_FILE) as conn:
+        # One write transaction for the whole batch (the connection is reused from the pool)
+        with storage.pooled_connection(DB_FILE, DB_PRAGMAS) as conn, storage.write_transaction(conn):
             for article in all_scraped_articles:
                 # Check for existence before insertion
                 if not article_exists(article.get('headline'), article.get('link'), conn):
@@ -740,7 +744,6 @@ def main():
                     except sqlite3.IntegrityError:
                         # Handle potential duplicates missed by article_exists
                         pass
-            conn.commit()
     except sqlite3.Error as e:
         print(f"Database insertion error: {e}")
 
@@ -749,9 +752,9 @@ def main():
     # HTML Generation Phase
     print("-" * 40)
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            conn.row_factory = sqlite3.Row 
+        with storage.pooled_connection(DB_FILE, DB_PRAGMAS) as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             # Sorting by scraped_date DESC ensures the newest finds are prioritized.
             cursor.execute("""
                 SELECT headline, snippet, source, link, article_date, scraped_date
@@ -0,0 +1,138 @@
+# shared_frames.py
+# DataFrames handed to worker processes through shared memory instead of pickled copies. Each column is one
+# multiprocessing.shared_memory block holding a NumPy buffer, which workers map rather than copy:
+#   numpy       - numeric, boolean and datetime columns as they are
+#   category    - the integer codes; the categories travel with the handle
+#   dictionary  - any other column (text, extension dtypes): integer codes, with the distinct values in the handle
+# A frame shared with share_partitions() holds the partitions of a keyed dict back to back, so a worker builds one
+# partition as a row slice (see AttachedPartitions.get).
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# Parent Side
+# =============================================================================
+
+class SharedFrame:
+    """A frame copied into shared memory. handle is picklable (names and small metadata only); close() frees the blocks."""
+
+    def __init__(self, handle, blocks):
+        self.handle = handle
+        self._blocks = blocks
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def share_frame(df):
+    """Copies df into shared memory blocks (one per column, plus the index). Returns a SharedFrame."""
+    blocks = []
+
+    def put(values):
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        blocks.append(block)
+        np.ndarray(values.shape, values.dtype, buffer=block.buf)[:] = values
+        return block.name, values.dtype.str
+
+    try:
+        columns = []
+        for name in df.columns:
+            series = df[name]
+            dtype = series.dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                columns.append((name, 'category', put(series.cat.codes.to_numpy()), (dtype.categories, dtype.ordered)))
+            elif isinstance(dtype, np.dtype) and dtype.kind in 'biufmM':
+                columns.append((name, 'numpy', put(series.to_numpy()), None))
+            else:
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+                # Missing values are restored as the first one seen (None, NaN or pd.NA), as the column had them
+                missing = series[codes < 0]
+                na_value = missing.iloc[0] if len(missing) else None
+                columns.append((name, 'dictionary', put(codes.astype(np.int32)), (np.asarray(uniques, dtype=object), na_value, dtype)))
+        index = put(df.index.to_numpy()) if df.index.dtype.kind in 'iu' else None
+    except BaseException:
+        SharedFrame({}, blocks).close()
+        raise
+    return SharedFrame({'length': len(df), 'index': index, 'columns': columns}, blocks)
+
+def share_partitions(partitions, empty):
+    """
+    Shares a dict of frames with the same columns (e.g. the per-sale partitions of a groupby) as one frame.
+    Returns (SharedFrame, key -> (start, stop) row range, empty frame); AttachedPartitions takes the
+    same tuple with the SharedFrame's handle in its place.
+    """
+    ranges, start = {}, 0
+    for key, frame in partitions.items():
+        ranges[key] = (start, start + len(frame))
+        start += len(frame)
+    frame = pd.concat(list(partitions.values())) if partitions else empty
+    return share_frame(frame), ranges, empty
+
+# =============================================================================
+# Worker Side
+# =============================================================================
+
+class AttachedFrame:
+    """A SharedFrame mapped into this process; slice() builds the rows of a range."""
+
+    def __init__(self, handle):
+        self._blocks = []
+        self.length = handle['length']
+        self.index = self._map(handle['index']) if handle['index'] is not None else None
+        self.columns = [(name, kind, self._map(buffer), spec) for name, kind, buffer, spec in handle['columns']]
+
+    def _map(self, buffer):
+        name, dtype = buffer
+        block = shared_memory.SharedMemory(name=name)
+        self._blocks.append(block)
+        return np.ndarray((self.length,), np.dtype(dtype), buffer=block.buf)
+
+    def slice(self, start, stop):
+        index = pd.Index(self.index[start:stop]) if self.index is not None else None
+        data = {}
+        for name, kind, values, spec in self.columns:
+            values = values[start:stop]
+            if kind == 'numpy':
+                data[name] = values.copy()
+            elif kind == 'category':
+                categories, ordered = spec
+                data[name] = pd.Categorical.from_codes(values, categories=categories, ordered=ordered)
+            else:
+                uniques, na_value, dtype = spec
+                decoded = uniques.take(values, mode='clip') if len(uniques) else np.empty(len(values), dtype=object)
+                decoded[values < 0] = na_value
+                data[name] = pd.array(decoded, dtype=dtype) if dtype != object else decoded
+        return pd.DataFrame(data, index=index)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+        self._blocks = []
+
+class AttachedPartitions:
+    """The partitions of share_partitions() in a worker: get(key) slices that key's rows out of the shared frame."""
+
+    def __init__(self, shared):
+        handle, self.ranges, self.empty = shared
+        self.frame = AttachedFrame(handle)
+
+    def get(self, key, default=None):
+        bounds = self.ranges.get(key)
+        return default if bounds is None else self.frame.slice(*bounds)
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+    def __len__(self):
+        return len(self.ranges)
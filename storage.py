@@ -0,0 +1,159 @@
+# storage.py
+# Shared SQLite access for the TeaTrade scripts: configured connections, a connection pool and write transactions.
+import sqlite3
+import os
+import logging
+import threading
+import atexit
+from contextlib import contextmanager
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+# Seconds a connection waits for a lock held by another process (e.g. --watch ingestion vs. the analyzer)
+BUSY_TIMEOUT_SECONDS = 30
+
+# Applied to every connection handed out by connect(), in this order.
+# WAL lets readers run alongside a writer; with WAL, synchronous=NORMAL is durable against application crashes
+# (only a power loss can drop the last commits). cache_size is negative KiB (64 MiB); mmap_size is bytes (256 MiB).
+SQLITE_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -64000),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+]
+# For a database committed to git (news.db): a WAL database keeps recent commits in its -wal file and records WAL
+# mode in the file header, so the file alone is complete only in rollback-journal mode (synchronous=FULL, its default).
+# Databases written in WAL mode are switched with checkpoint_to_rollback_journal() before they are committed.
+ROLLBACK_JOURNAL_PRAGMAS = [('journal_mode', 'DELETE'), ('synchronous', 'FULL')] + SQLITE_PRAGMAS[2:]
+
+# Idle connections kept per database file by pooled_connection()
+POOL_SIZE = 4
+
+# =============================================================================
+# Connections
+# =============================================================================
+
+def apply_pragmas(conn, pragmas=None):
+    """Applies the storage pragmas (default SQLITE_PRAGMAS) to an open connection. Returns the effective journal mode."""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    for name, value in pragmas:
+        conn.execute(f"PRAGMA {name} = {value}")
+    requested = dict(pragmas).get('journal_mode', 'WAL')
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    if journal_mode.upper() != requested.upper():
+        # e.g. in-memory databases or file systems without shared memory support
+        logging.warning(f"[STORAGE] {requested} is unavailable for this database; journal mode is {journal_mode}.")
+    return journal_mode
+
+def connect(db_file, check_same_thread=True, pragmas=None):
+    """Opens a connection to db_file with the busy timeout and storage pragmas (default SQLITE_PRAGMAS) applied."""
+    conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=check_same_thread)
+    try:
+        apply_pragmas(conn, pragmas)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+def checkpoint_to_rollback_journal(db_file):
+    """
+    Copies the WAL of db_file into the database file and switches it to rollback-journal mode, so the file alone is
+    complete (before it is committed to git). Fails if another connection has the database open.
+    """
+    conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_SECONDS)
+    try:
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        journal_mode = conn.execute("PRAGMA journal_mode = DELETE").fetchone()[0]
+        if busy or journal_mode.upper() != 'DELETE':
+            raise sqlite3.OperationalError(f"{db_file} is in use; journal mode is {journal_mode}")
+    finally:
+        conn.close()
+
+# =============================================================================
+# Connection Pool
+# =============================================================================
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool_key(db_file, pragmas):
+    path = db_file if db_file == ':memory:' else os.path.abspath(db_file)
+    return path, None if pragmas is None else tuple(map(tuple, pragmas))
+
+@contextmanager
+def pooled_connection(db_file, pragmas=None):
+    """
+    Borrows a configured connection for db_file (storage pragmas as in connect()), reusing an idle one when available.
+    Uncommitted work is rolled back when the connection is returned; up to POOL_SIZE idle connections are kept.
+    """
+    key = _pool_key(db_file, pragmas)
+    with _pools_lock:
+        idle = _pools.setdefault(key, [])
+        conn = idle.pop() if idle else None
+    if conn is None:
+        # Pooled connections may be returned and reused by another thread
+        conn = connect(db_file, check_same_thread=False, pragmas=pragmas)
+
+    try:
+        yield conn
+    finally:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            conn = None
+        if conn is not None:
+            with _pools_lock:
+                idle = _pools.setdefault(key, [])
+                if len(idle) < POOL_SIZE:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+def close_pools():
+    """Closes every idle pooled connection (the last close checkpoints and removes the WAL file)."""
+    with _pools_lock:
+        connections = [conn for idle in _pools.values() for conn in idle]
+        _pools.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"[STORAGE] Could not close pooled connection: {e}")
+
+atexit.register(close_pools)
+
+# =============================================================================
+# Transactions
+# =============================================================================
+
+@contextmanager
+def write_transaction(conn):
+    """
+    Runs the block as one write transaction: committed on success, rolled back on any exception.
+    BEGIN IMMEDIATE takes the write lock up front, so a busy database is waited on (busy timeout)
+    instead of failing mid-block. Inside an open transaction the block becomes a savepoint.
+    """
+    if conn.in_transaction:
+        conn.execute("SAVEPOINT write_transaction")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK TO write_transaction")
+            conn.execute("RELEASE write_transaction")
+            raise
+        conn.execute("RELEASE write_transaction")
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
@@ -0,0 +1,103 @@
+# conftest.py
+# Shared fixtures: the scripts are imported from the repository root and pointed at a temporary database, so no
+# test touches market_reports.db, report_data/ or parse_cache/.
+import os
+import sys
+import glob
+import shutil
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+import storage
+import process_mombasa_data as processor
+import analyze_mombasa as analyzer
+
+MOMBASA_DIR = os.path.join(REPO_PATH, 'Mombasa')
+
+@pytest.fixture(autouse=True)
+def quiet_logging():
+    logging.getLogger().setLevel(logging.WARNING)
+
+@pytest.fixture
+def processor_paths(tmp_path, monkeypatch):
+    """The processor's database, input directory and parse cache moved into tmp_path (inputs in tmp_path/Mombasa)."""
+    input_dir = tmp_path / 'Mombasa'
+    input_dir.mkdir()
+    monkeypatch.setattr(processor, 'DB_FILE', str(tmp_path / 'market_reports.db'))
+    monkeypatch.setattr(processor, 'MOMBASA_DIR', str(input_dir))
+    monkeypatch.setattr(processor, 'PARSE_CACHE_DIR', str(tmp_path / 'parse_cache'))
+    return tmp_path
+
+@pytest.fixture(scope='session')
+def sample_db(tmp_path_factory):
+    """A database the processor built from every sample workbook in Mombasa/ (built once per session; copy it to modify it)."""
+    workdir = tmp_path_factory.mktemp('sample')
+    input_dir = workdir / 'Mombasa'
+    input_dir.mkdir()
+    for path in glob.glob(os.path.join(MOMBASA_DIR, '*.xlsx')):
+        shutil.copy(path, input_dir)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(processor, 'DB_FILE', str(workdir / 'market_reports.db'))
+        patch.setattr(processor, 'MOMBASA_DIR', str(input_dir))
+        patch.setattr(processor, 'PARSE_CACHE_DIR', str(workdir / 'parse_cache'))
+        processor.main([])
+    storage.close_pools()
+    return str(workdir / 'market_reports.db')
+
+@pytest.fixture
+def analyzer_paths(tmp_path, monkeypatch, sample_db):
+    """The analyzer pointed at a copy of sample_db (tmp_path/market_reports.db), writing to tmp_path/report_data."""
+    db_file = str(tmp_path / 'market_reports.db')
+    shutil.copy(sample_db, db_file)
+    output_dir = tmp_path / 'report_data'
+    monkeypatch.setattr(analyzer, 'DB_FILE', db_file)
+    monkeypatch.setattr(analyzer, 'DATA_OUTPUT_DIR', str(output_dir))
+    monkeypatch.setattr(analyzer, 'INDEX_FILE', str(output_dir / 'mombasa_index.json'))
+    yield output_dir
+    storage.close_pools()
+
+@pytest.fixture
+def lots_db(processor_paths):
+    """A connection to a freshly initialised (fully migrated) processor database."""
+    assert processor.initialize_database()
+    conn = storage.connect(processor.DB_FILE)
+    yield conn
+    conn.close()
+    storage.close_pools()
+
+OFFER_COLUMNS = ['source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade', 'lot_number', 'invoice_number',
+                 'quantity_kgs', 'package_count', 'valuation_or_rp', 'outcome', 'source_file_identifier', 'processed_timestamp']
+SALE_COLUMNS = ['source_location', 'sale_date', 'sale_number', 'broker', 'mark', 'grade', 'lot_number', 'invoice_number',
+                'quantity_kgs', 'package_count', 'price', 'buyer', 'outcome', 'source_file_identifier', 'processed_timestamp']
+
+def make_lots(lot_numbers, sale_number='39', sale_date='2025-09-29', prices=None, source='file-a', timestamp='2025-10-01T00:00:00',
+              results=False):
+    """
+    The (offers_df, sales_df) of process_lot_details() for a file listing lot_numbers; lots with a price are sold.
+    A results file (results=True, one with a Status column) marks its unpriced lots 'unsold'.
+    """
+    count = len(lot_numbers)
+    df = pd.DataFrame({
+        'source_location': processor.SOURCE_LOCATION, 'sale_date': sale_date, 'sale_number': sale_number,
+        'broker': 'ABBL', 'mark': [f"MARK{i % 3}" for i in range(count)], 'grade': 'BP1',
+        'lot_number': [str(lot) for lot in lot_numbers], 'invoice_number': None,
+        'quantity_kgs': 60.0, 'package_count': 40.0, 'valuation_or_rp': 2.0,
+        'price': pd.Series([np.nan] * count if prices is None else prices, dtype='float64'), 'buyer': 'BUYER',
+        'source_file_identifier': source, 'processed_timestamp': timestamp,
+    })
+    sold = df['price'].notna()
+    df['buyer'] = df['buyer'].where(sold, None)
+    df['outcome'] = np.select([sold, np.full(count, results)], ['sold', 'unsold'], default=None)
+    return df[OFFER_COLUMNS].copy(), df.loc[sold, SALE_COLUMNS].copy()
+
+def write_legacy_lots(conn, table_name, df):
+    """Rows of the lot tables as stored before migration 3 (text dimension columns)."""
+    df = df.drop(columns='outcome')
+    columns = ', '.join(df.columns)
+    conn.executemany(f"INSERT OR IGNORE INTO {table_name} ({columns}) VALUES ({', '.join('?' for _ in df.columns)})",
+                     df.astype(object).where(df.notna(), None).itertuples(index=False))
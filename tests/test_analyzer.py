@@ -0,0 +1,163 @@
+# Analyzer (user-018): reports of the sample workbooks built through the SQL query layer, compared with the figures
+# of the analyzer before it and with the in-memory analysis (--in-memory) it replaced; incremental builds (user-017)
+# and sharded reports (user-025).
+import json
+import math
+import shutil
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import analyze_mombasa as analyzer
+import report_json
+
+# Figures of the reports of the original analyzer (in-memory, string sale numbers) for the same workbooks
+BASELINE_REPORTS = {
+    '2025-35': {'TOTAL_VOLUME': '6,529,992', 'AVG_PRICE': '$1.95', 'SELL_THROUGH_RATE': '79.37%',
+                'outlook': ('2025-37', '7,861,033')},
+    '2025-37': {'TOTAL_VOLUME': '6,300,793', 'AVG_PRICE': '$2.03', 'PRICE_CHANGE': '+4.15%', 'SELL_THROUGH_RATE': '81.97%',
+                'outlook': ('2025-39', '7,163,193')},
+    '2025-39': {'TOTAL_VOLUME': '5,984,958', 'AVG_PRICE': '$2.07', 'PRICE_CHANGE': '+1.96%', 'SELL_THROUGH_RATE': '84.78%'},
+}
+# Values that differ between two builds of the same report: the build time, and shard sizes (float text lengths)
+VOLATILE_KEYS = {'generated_at', 'bytes'}
+
+def read_report(output_dir, sale_number):
+    return json.loads((output_dir / f"mombasa_{sale_number.replace('-', '_')}.json").read_text())
+
+def report_files(output_dir):
+    return sorted(path.relative_to(output_dir) for path in output_dir.rglob('*.json'))
+
+def assert_same_report(built, expected, path=''):
+    """built == expected apart from VOLATILE_KEYS, floats compared to 1e-9 (SQL and pandas sum in another order)."""
+    if isinstance(expected, dict):
+        assert isinstance(built, dict) and built.keys() == expected.keys(), path
+        for key in expected.keys() - VOLATILE_KEYS:
+            assert_same_report(built[key], expected[key], f"{path}/{key}")
+    elif isinstance(expected, list):
+        assert isinstance(built, list) and len(built) == len(expected), path
+        for i, (built_item, expected_item) in enumerate(zip(built, expected)):
+            assert_same_report(built_item, expected_item, f"{path}[{i}]")
+    elif isinstance(expected, float) and isinstance(built, float):
+        assert math.isclose(built, expected, rel_tol=1e-9, abs_tol=1e-12), path
+    else:
+        assert built == expected, path
+
+def test_sample_reports_match_the_baseline_analyzer(analyzer_paths):
+    analyzer.main([])
+
+    index = json.loads((analyzer_paths / 'mombasa_index.json').read_text())
+    assert [entry['sale_number'] for entry in index] == ['2025-39', '2025-37', '2025-35', '2024-38']
+    for sale_number, expected in BASELINE_REPORTS.items():
+        report = read_report(analyzer_paths, sale_number)
+        outlook = expected.get('outlook')
+        kpis = {name: value for name, value in expected.items() if name != 'outlook'}
+        assert {name: report['kpis'][name] for name in kpis} == kpis, sale_number
+        if outlook:
+            assert (report['outlook']['next_sale'], report['outlook']['forthcoming_offerings_kgs']) == outlook
+
+def test_query_layer_matches_the_in_memory_analysis(analyzer_paths, monkeypatch):
+    analyzer.main([])
+    query_dir = analyzer_paths.with_name('query_reports')
+    shutil.move(analyzer_paths, query_dir)
+
+    analyzer.main(['--in-memory', '--full'])
+
+    assert report_files(query_dir) == report_files(analyzer_paths)
+    for path in report_files(query_dir):
+        assert_same_report(json.loads((query_dir / path).read_text()), json.loads((analyzer_paths / path).read_text()), str(path))
+
+# Incremental builds (user-017)
+
+def build_times(output_dir):
+    return {path.name: path.stat().st_mtime_ns for path in output_dir.glob('mombasa_*.json') if path.name != 'mombasa_index.json'}
+
+def test_unchanged_inputs_rebuild_nothing(analyzer_paths):
+    analyzer.main([])
+    index = (analyzer_paths / 'mombasa_index.json').read_bytes()
+    built = build_times(analyzer_paths)
+
+    analyzer.main([])
+
+    assert build_times(analyzer_paths) == built
+    assert (analyzer_paths / 'mombasa_index.json').read_bytes() == index
+
+def test_changed_sale_rebuilds_its_report_and_its_neighbours(analyzer_paths):
+    analyzer.main([])
+    conn = sqlite3.connect(analyzer.DB_FILE)
+    conn.execute(f"UPDATE {analyzer.REPORT_BUILD_LOG_TABLE} SET built_at = 'previous run'")
+    # The processor rewrites a listed and sold lot of sale 2025-37 (new price, new processed_timestamp)
+    conn.execute("""
+        UPDATE auction_lots SET price = price + 0.5, processed_timestamp = '2099-01-01T00:00:00'
+        WHERE id = (SELECT MIN(id) FROM auction_lots WHERE listed = 1 AND sold = 1 AND sale_year = 2025 AND sale_no = 37)
+    """)
+    conn.commit()
+
+    analyzer.main([])
+
+    rebuilt = conn.execute(f"SELECT sale_number FROM {analyzer.REPORT_BUILD_LOG_TABLE} WHERE built_at != 'previous run' ORDER BY 1")
+    # 2025-35 for its outlook (sale 37's offers), 2025-39 for its comparison with the previous sale
+    assert [row[0] for row in rebuilt] == ['2025-35', '2025-37', '2025-39']
+    conn.close()
+    # The incremental run's reports are those of a full rebuild
+    incremental_dir = analyzer_paths.with_name('incremental_reports')
+    shutil.copytree(analyzer_paths, incremental_dir)
+    analyzer.main(['--full'])
+    for path in report_files(incremental_dir):
+        assert_same_report(json.loads((incremental_dir / path).read_text()), json.loads((analyzer_paths / path).read_text()), str(path))
+
+# Sharded reports (user-025)
+
+def read_shard(output_dir, entry):
+    path = output_dir / entry['url']
+    shard = json.loads(path.read_text())
+    assert path.stat().st_size == entry['bytes']
+    assert shard['length'] == entry['rows'] == len(next(iter(shard['columns'].values())))
+    return shard
+
+def test_shards_reassemble_the_report_data(analyzer_paths):
+    analyzer.main([])
+    report = read_report(analyzer_paths, '2025-39')
+    manifest = report['manifest']
+
+    assert set(manifest['data_sources']) == set(analyzer.SHARDED_DATA_SOURCES)
+    shards = {name: read_shard(analyzer_paths, entry) for name, entry in manifest['data_sources'].items()}
+    pages = [read_shard(analyzer_paths, entry) for entry in manifest['table_pages']]
+    lots = shards[analyzer.DATA_SOURCE_WEEK]
+    assert lots['length'] == 2473
+    assert [page['length'] for page in pages] == [1000, 1000, 473]
+    # The lot table pages hold the sale's lots in order
+    table = {col: [value for page in pages for value in page['columns'][col]] for col in pages[0]['columns']}
+    for col in set(table) & set(lots['columns']):
+        assert table[col] == lots['columns'][col], col
+    for col in analyzer.DICTIONARY_COLUMNS:
+        codes = [code for code in table[col] if code is not None]
+        assert 0 <= min(codes) and max(codes) < len(report['dictionaries'][col]), col
+    # Only this build's shards are in the report's directory
+    assert sorted(path.name for path in (analyzer_paths / 'mombasa_2025_39').iterdir()) == sorted(
+        entry['url'].split('/')[1] for entry in [*manifest['data_sources'].values(), *manifest['table_pages']])
+
+def test_rebuild_removes_stale_shards(analyzer_paths, monkeypatch):
+    monkeypatch.setattr(analyzer, 'DATA_OUTPUT_DIR', str(analyzer_paths))
+    source = {'length': 5, 'columns': {'price': [1, 2, 3, 4, 5]}}
+    shards = {f"table_{page:03d}": part for page, part in enumerate(analyzer.page_data_source(source, 2))}
+    analyzer.write_report_shards('mombasa_2025_39', shards)
+
+    written = analyzer.write_report_shards('mombasa_2025_39', {'table_000': source})
+
+    assert [part['columns']['price'] for part in shards.values()] == [[1, 2], [3, 4], [5]]
+    assert written == {'table_000': {'url': 'mombasa_2025_39/table_000.json', 'bytes': len(report_json.dumps(source))}}
+    assert [path.name for path in (analyzer_paths / 'mombasa_2025_39').iterdir()] == ['table_000.json']
+
+def test_encode_data_sources_codes_categorical_columns_by_value():
+    # The column's own categories (with an unused 'PD') and order differ from the shared dictionary
+    grades = pd.Categorical(['BP1', None, 'PF1', 'BP1'], categories=['PF1', 'PD', 'BP1'])
+    frames = {analyzer.DATA_SOURCE_WEEK: pd.DataFrame({'grade': grades, 'price': [2.5, 3.0, 2.0, 2.75]}),
+              analyzer.DATA_SOURCE_PREV_GRADE: pd.DataFrame({'grade': ['FNGS', 'PF1'], 'prev_avg_price': [1.5, 2.5]})}
+
+    data_sources, dictionaries = analyzer.encode_data_sources(frames)
+
+    assert dictionaries['grade'] == ['BP1', 'FNGS', 'PF1']
+    assert data_sources[analyzer.DATA_SOURCE_WEEK]['columns']['grade'] == [0, None, 2, 0]
+    assert list(data_sources[analyzer.DATA_SOURCE_PREV_GRADE]['columns']['grade']) == [1, 2]
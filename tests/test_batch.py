@@ -0,0 +1,55 @@
+# Batch ingestion (user-012): one transaction per run, a savepoint per file.
+import shutil
+
+import pytest
+
+import storage
+import process_mombasa_data as processor
+from conftest import MOMBASA_DIR
+
+def test_failed_file_leaves_no_rows_and_the_batch_commits(lots_db, processor_paths, monkeypatch):
+    for filename in ['GeneralReport (87).xlsx', 'GeneralReport (90).xlsx']:
+        shutil.copy(f"{MOMBASA_DIR}/{filename}", processor_paths / 'Mombasa')
+    upsert_lots = processor.upsert_lots
+
+    def fail_sale_37(conn, offers_df, sales_df, *args, **kwargs):
+        # GeneralReport (87)'s rows are written before it fails
+        counts = upsert_lots(conn, offers_df, sales_df, *args, **kwargs)
+        if (offers_df['sale_number'] == '37').any():
+            raise RuntimeError("write failed")
+        return counts
+
+    monkeypatch.setattr(processor, 'upsert_lots', fail_sale_37)
+
+    processor.main(['--batch'])
+
+    reader = storage.connect(processor.DB_FILE)
+    assert reader.execute("SELECT DISTINCT sale_number FROM auction_lots").fetchall() == [('39',)]
+    log = reader.execute("SELECT file_identifier, records_inserted, status FROM processing_log ORDER BY file_identifier").fetchall()
+    assert [(name.split('|')[0], records > 0, status) for name, records, status in log] == [
+        ('GeneralReport (87).xlsx', False, 'FAILURE'), ('GeneralReport (90).xlsx', True, 'SUCCESS')]
+    reader.close()
+
+@pytest.mark.parametrize('args', [['--batch'], ['--batch', '--stream']])
+def test_database_error_fails_the_file_and_it_is_retried(lots_db, processor_paths, args):
+    for filename in ['GeneralReport (87).xlsx', 'GeneralReport (90).xlsx']:
+        shutil.copy(f"{MOMBASA_DIR}/{filename}", processor_paths / 'Mombasa')
+    lots_db.execute("""
+        CREATE TRIGGER block_sale_37 BEFORE INSERT ON auction_lots WHEN NEW.sale_number = '37'
+        BEGIN SELECT RAISE(ABORT, 'sale 37 blocked'); END
+    """)
+    lots_db.commit()
+
+    processor.main(args)
+
+    statuses = dict(lots_db.execute("SELECT filename, status FROM ingestion_manifest").fetchall())
+    assert statuses == {'GeneralReport (87).xlsx': 'FAILURE', 'GeneralReport (90).xlsx': 'SUCCESS'}
+    assert lots_db.execute("SELECT DISTINCT sale_number FROM auction_lots").fetchall() == [('39',)]
+
+    lots_db.execute("DROP TRIGGER block_sale_37")
+    lots_db.commit()
+    processor.main(args + ['--retry-failed'])
+
+    statuses = dict(lots_db.execute("SELECT filename, status FROM ingestion_manifest").fetchall())
+    assert statuses == {'GeneralReport (87).xlsx': 'SUCCESS', 'GeneralReport (90).xlsx': 'SUCCESS'}
+    assert lots_db.execute("SELECT DISTINCT sale_number FROM auction_lots ORDER BY sale_number").fetchall() == [('37',), ('39',)]
@@ -0,0 +1,96 @@
+# auction_lots (user-016): one row per lot key; a sale is stored on its lot's listing, by the processor and by
+# migration 4 alike.
+import pandas as pd
+import pytest
+
+import migrations
+import process_mombasa_data as processor
+from conftest import make_lots, write_legacy_lots
+
+LOT_QUERY = "SELECT lot_number, listed, sold, price, outcome, quantity_kgs, source_file_identifier FROM auction_lots ORDER BY id"
+
+def catalogue_and_results(catalogue_date=None):
+    """A catalogue listing lots 1-3 of sale 39, then a results file for lots 1-4 (1 and 4 sold) with other weights."""
+    catalogue = make_lots([1, 2, 3], sale_date=catalogue_date, source='catalogue')
+    offers_df, sales_df = make_lots([1, 2, 3, 4], prices=[2.5, None, None, 3.0], source='results', results=True)
+    offers_df['quantity_kgs'] = sales_df['quantity_kgs'] = 50.0
+    return catalogue, (offers_df, sales_df)
+
+def test_sale_of_a_listed_lot_is_merged_into_the_listing(lots_db):
+    catalogue, results = catalogue_and_results()
+    processor.upsert_lots(lots_db, *catalogue)
+
+    offer_counts, sale_counts = processor.upsert_lots(lots_db, *results)
+
+    assert lots_db.execute(LOT_QUERY).fetchall() == [
+        ('1', 1, 1, 2.5, 'sold', 60.0, 'catalogue'),
+        ('2', 1, 0, None, 'unsold', 60.0, 'catalogue'),
+        ('3', 1, 0, None, 'unsold', 60.0, 'catalogue'),
+        ('4', 1, 1, 3.0, 'sold', 50.0, 'results'),
+    ]
+    # Lot 4 is new to both views; lot 1's sale is new to the sales view; lots 1-3 gained the results file's sale
+    # date (2 and 3 also their outcome)
+    assert offer_counts == {'inserted': 1, 'updated': 3, 'skipped': 0}
+    assert lots_db.execute("SELECT DISTINCT sale_date, sale_year, sale_no FROM auction_lots").fetchall() == [('2025-09-29', 2025, 39)]
+    assert sale_counts == {'inserted': 2, 'updated': 0, 'skipped': 0}
+
+@pytest.mark.parametrize('policy, price, counts', [
+    ('ignore', 2.5, {'inserted': 0, 'updated': 0, 'skipped': 1}),
+    ('replace', 2.75, {'inserted': 0, 'updated': 1, 'skipped': 0}),
+    ('update', 2.75, {'inserted': 0, 'updated': 1, 'skipped': 0}),
+])
+def test_conflict_policy_applies_to_a_stored_sale(lots_db, policy, price, counts):
+    processor.upsert_lots(lots_db, *make_lots([1], prices=[2.5], source='first'))
+
+    _, sale_counts = processor.upsert_lots(lots_db, *make_lots([1], prices=[2.75], source='second'), policy=policy)
+
+    assert sale_counts == counts
+    assert lots_db.execute("SELECT COUNT(*), MAX(price), MAX(outcome) FROM auction_lots").fetchone() == (1, price, 'sold')
+
+def test_update_policy_keeps_stored_values_for_missing_ones(lots_db):
+    processor.upsert_lots(lots_db, *make_lots([1], prices=[2.5]))
+    offers_df, sales_df = make_lots([1], prices=[2.75])
+    offers_df['valuation_or_rp'] = None
+    sales_df['buyer'] = None
+
+    processor.upsert_lots(lots_db, offers_df, sales_df, policy='update')
+
+    row = lots_db.execute("SELECT valuation_or_rp, price, buyer FROM auction_sales JOIN auction_offers USING (id)").fetchone()
+    assert row == (2.0, 2.75, 'BUYER')
+
+def view_rows(conn, view):
+    return pd.read_sql_query(f"SELECT * FROM {view} ORDER BY CAST(lot_number AS INTEGER)", conn).drop(columns='id')
+
+def test_undated_lot_takes_the_date_of_a_dated_row_under_every_policy(lots_db):
+    processor.upsert_lots(lots_db, *make_lots([1, 2], sale_date=None, source='summary'))
+
+    offer_counts, _ = processor.upsert_lots(lots_db, *make_lots([1, 2], source='results'), policy='ignore')
+
+    assert offer_counts == {'inserted': 0, 'updated': 2, 'skipped': 0}
+    rows = lots_db.execute("SELECT sale_date, sale_year, sale_no, source_file_identifier FROM auction_lots").fetchall()
+    assert rows == [('2025-09-29', 2025, 39, 'summary')] * 2
+
+def test_migration_stores_sales_like_the_processor(lots_db, processor_paths, monkeypatch):
+    # A dated catalogue: the legacy listings table ignored the results file's listings, dated or not
+    catalogue, results = catalogue_and_results('2025-09-29')
+    processor.upsert_lots(lots_db, *catalogue)
+    processor.upsert_lots(lots_db, *results)
+
+    # The same files as the processor wrote them to the separate tables, then migrated
+    with monkeypatch.context() as patch:
+        patch.setattr(processor, 'DB_FILE', str(processor_paths / 'legacy.db'))
+        patch.setattr(migrations, 'run_migrations', lambda conn: [])
+        assert processor.initialize_database()
+    legacy = processor.storage.connect(str(processor_paths / 'legacy.db'))
+    for offers_df, sales_df in [catalogue, results]:
+        write_legacy_lots(legacy, 'auction_offers', offers_df)
+        write_legacy_lots(legacy, 'auction_sales', sales_df)
+    legacy.commit()
+    migrations.run_migrations(legacy)
+
+    for view in migrations.LOT_ROLES:
+        pd.testing.assert_frame_equal(view_rows(legacy, view), view_rows(lots_db, view))
+    # One row per lot, the sale on its listing
+    assert legacy.execute("SELECT lot_number, listed, sold, outcome FROM auction_lots ORDER BY id").fetchall() == [
+        ('1', 1, 1, 'sold'), ('2', 1, 0, None), ('3', 1, 0, None), ('4', 1, 1, 'sold')]
+    legacy.close()
@@ -0,0 +1,71 @@
+# Ingestion manifest (user-002): files whose content was already ingested are skipped before any Excel parsing.
+import os
+import shutil
+
+import pytest
+
+import process_mombasa_data as processor
+from conftest import MOMBASA_DIR
+
+DATA_TYPE = processor.DATA_TYPE_SALE
+
+@pytest.fixture
+def workbook(processor_paths):
+    path = processor_paths / 'Mombasa' / 'report.xlsx'
+    path.write_bytes(b'workbook bytes')
+    return str(path)
+
+def ingested(conn, filepath, status='SUCCESS'):
+    fingerprint = processor.prepare_structured_file(filepath, DATA_TYPE, conn)
+    processor.update_ingestion_manifest(conn, fingerprint, filepath, DATA_TYPE, status, 10)
+    return fingerprint
+
+def test_ingested_content_is_skipped_under_any_name(lots_db, workbook):
+    ingested(lots_db, workbook)
+    renamed = workbook.replace('report.xlsx', 'renamed.xlsx')
+    shutil.copy(workbook, renamed)
+
+    assert processor.prepare_structured_file(workbook, DATA_TYPE, lots_db) is None
+    assert processor.prepare_structured_file(renamed, DATA_TYPE, lots_db) is None
+    # The same content is ingested separately for another data type
+    assert processor.prepare_structured_file(workbook, processor.DATA_TYPE_OFFER, lots_db) is not None
+
+def test_changed_content_is_ingested(lots_db, workbook):
+    first = ingested(lots_db, workbook)
+    with open(workbook, 'ab') as f:
+        f.write(b' changed')
+
+    fingerprint = processor.prepare_structured_file(workbook, DATA_TYPE, lots_db)
+
+    assert fingerprint['content_hash'] != first['content_hash']
+
+def test_failed_content_is_retried_on_request_or_by_a_new_processor_version(lots_db, workbook, monkeypatch):
+    ingested(lots_db, workbook, status='FAILURE')
+
+    assert processor.prepare_structured_file(workbook, DATA_TYPE, lots_db) is None
+    assert processor.prepare_structured_file(workbook, DATA_TYPE, lots_db, retry_failed=True) is not None
+    monkeypatch.setattr(processor, 'PROCESSOR_VERSION', processor.PROCESSOR_VERSION + '.1')
+    assert processor.prepare_structured_file(workbook, DATA_TYPE, lots_db) is not None
+
+def test_unchanged_file_is_not_read_again(lots_db, workbook, monkeypatch):
+    first = processor.fingerprint_file(lots_db, workbook)
+    monkeypatch.setattr(processor, 'hash_file_contents', lambda filepath: pytest.fail("file read again"))
+
+    assert processor.fingerprint_file(lots_db, workbook) == first
+    # A new modification time invalidates the stat cache entry
+    stat = os.stat(workbook)
+    os.utime(workbook, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(pytest.fail.Exception):
+        processor.fingerprint_file(lots_db, workbook)
+
+def test_second_run_skips_the_ingested_workbook(lots_db, processor_paths, monkeypatch):
+    shutil.copy(f"{MOMBASA_DIR}/GeneralReport (90).xlsx", processor_paths / 'Mombasa')
+    processor.main([])
+    lots = lots_db.execute("SELECT COUNT(*) FROM auction_lots").fetchone()[0]
+    monkeypatch.setattr(processor, 'parse_structured_file', lambda *args, **kwargs: pytest.fail("workbook parsed again"))
+
+    processor.main([])
+
+    assert lots > 0
+    assert lots_db.execute("SELECT COUNT(*) FROM auction_lots").fetchone()[0] == lots
+    assert lots_db.execute("SELECT filename, status FROM ingestion_manifest").fetchall() == [('GeneralReport (90).xlsx', 'SUCCESS')]
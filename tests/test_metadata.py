@@ -0,0 +1,54 @@
+# Sale metadata of the AuctionSummary workbooks (user-008): their sale keeps its year and, having no sale date, never
+# takes the place of the dated sale of a results file.
+import json
+import shutil
+
+import pandas as pd
+import pytest
+
+import analyze_mombasa as analyzer
+import process_mombasa_data as processor
+from conftest import MOMBASA_DIR
+
+SUMMARY_FILE = 'AuctionSummary_[2025-39]_150925.xlsx'
+RESULTS_FILE = 'GeneralReport (90).xlsx'
+
+def test_auction_summary_filename_keeps_the_year():
+    # The trailing date (15/09/25) is the catalogue date, not the sale date
+    assert processor.extract_metadata_from_filename(SUMMARY_FILE) == ('2025-39', None)
+
+@pytest.mark.parametrize('raw_code, sale_number', [('2025/39', '2025-39'), ('Sale 39 - M2', '39')])
+def test_internal_sale_code(raw_code, sale_number):
+    df = pd.DataFrame({'sale_number_internal': [raw_code, raw_code]})
+
+    assert processor.extract_metadata_from_dataframe(df) == (sale_number, None)
+
+def test_auction_summary_does_not_replace_the_results_of_its_sale(lots_db, processor_paths, monkeypatch):
+    # The summary sorts first, so its lots are stored before the results file's
+    for filename in [SUMMARY_FILE, RESULTS_FILE]:
+        shutil.copy(f"{MOMBASA_DIR}/{filename}", processor_paths / 'Mombasa')
+    processor.main([])
+
+    counts = lots_db.execute("""
+        SELECT SUM(listed), SUM(sold) FROM auction_lots WHERE sale_year = 2025 AND sale_no = 39 AND sale_date IS NOT NULL
+    """).fetchone()
+    assert counts == (2918, 2474)
+
+    output_dir = processor_paths / 'report_data'
+    monkeypatch.setattr(analyzer, 'DB_FILE', processor.DB_FILE)
+    monkeypatch.setattr(analyzer, 'DATA_OUTPUT_DIR', str(output_dir))
+    monkeypatch.setattr(analyzer, 'INDEX_FILE', str(output_dir / 'mombasa_index.json'))
+    analyzer.main([])
+
+    report = json.loads((output_dir / 'mombasa_2025_39.json').read_text())
+    assert report['kpis']['TOTAL_VOLUME'] == '5,984,958'
+    assert report['kpis']['SELL_THROUGH_RATE'] == '84.78%'
+
+# Documents (user-007) carry the calendar label of their sale, as the lots of an AuctionSummary do
+@pytest.mark.parametrize('filename, metadata', [
+    ('Final Market Report Sale  38  2025.pdf', ('2025-38', None, 'MARKET_REPORT')),
+    ('Average Prices Sale 7 - 22nd September 2025.pdf', ('2025-07', '2025-09-22', 'AVERAGE_PRICES')),
+    ('Auction Quantities 39.pdf', ('39', None, 'AUCTION_QUANTITIES')),
+])
+def test_commentary_sale_number_is_labelled_with_its_year(filename, metadata):
+    assert processor.extract_commentary_metadata(filename) == metadata
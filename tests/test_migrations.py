@@ -0,0 +1,78 @@
+# Schema migrations (user-011): a database built through MIGRATIONS, new or from the legacy lot tables, serves the
+# analysis access paths and the analyzer's per-sale reads from their indexes, never from a scan of auction_lots.
+import re
+
+import pandas as pd
+import pytest
+
+import analyze_mombasa as analyzer
+import migrations
+import process_mombasa_data as processor
+from conftest import make_lots, write_legacy_lots
+
+# A full scan of auction_lots (the lot views read it as l)
+LOTS_SCAN = re.compile(rf"^SCAN ({migrations.LOTS_TABLE}|l)\b(?!.*\bINDEX\b)")
+
+def sale_lots(sale_number, sale_date):
+    """Lots 1-40 of a sale from several brokers (most sold, to several buyers): run_migrations() ANALYZEs them, and the
+    planner prefers a scan to an index on a column with a single value."""
+    offers_df, sales_df = make_lots(range(1, 41), sale_number, sale_date, prices=[2.0 + i / 10 if i % 4 else None for i in range(40)],
+                                    source=f"file-{sale_number}")
+    offers_df['broker'] = [f"BROKER{i % 5}" for i in range(len(offers_df))]
+    sales_df['broker'] = offers_df['broker'].loc[sales_df.index]
+    sales_df['buyer'] = [f"BUYER{i % 7}" for i in range(len(sales_df))]
+    return offers_df, sales_df
+
+SALES = [sale_lots('38', '2025-09-22'), sale_lots('39', '2025-09-29')]
+
+@pytest.fixture(params=['new', 'legacy'])
+def migrated_db(request, processor_paths, monkeypatch):
+    """A database migrated to the latest version: created by the processor, or holding the legacy lot tables' rows."""
+    with monkeypatch.context() as patch:
+        if request.param == 'legacy':
+            patch.setattr(migrations, 'run_migrations', lambda conn: [])
+        assert processor.initialize_database()
+    conn = processor.storage.connect(processor.DB_FILE)
+    for offers_df, sales_df in SALES:
+        if request.param == 'legacy':
+            write_legacy_lots(conn, 'auction_offers', offers_df)
+            write_legacy_lots(conn, 'auction_sales', sales_df)
+        else:
+            processor.upsert_lots(conn, offers_df, sales_df)
+    conn.commit()
+    migrations.run_migrations(conn)
+    assert migrations.get_schema_version(conn) == max(version for version, _, _ in migrations.MIGRATIONS)
+    yield conn
+    conn.close()
+    processor.storage.close_pools()
+
+def lots_scans(plan):
+    return [detail for detail in plan if LOTS_SCAN.match(detail)]
+
+@pytest.mark.parametrize('description, sql, params, index_name', migrations.ANALYSIS_ACCESS_PATHS,
+                         ids=[path[0] for path in migrations.ANALYSIS_ACCESS_PATHS])
+def test_access_path_uses_its_index(migrated_db, description, sql, params, index_name):
+    plan = migrations.explain_query_plan(migrated_db, sql, params)
+
+    assert any(index_name in detail for detail in plan), plan
+    assert not lots_scans(plan)
+
+def test_check_query_plans_passes(migrated_db):
+    assert migrations.check_query_plans(migrated_db) == []
+
+def test_analyzer_reads_a_sale_through_its_sale_key_index(migrated_db):
+    history = analyzer.query_history(migrated_db)
+    assert history['weeks'] == ['2025-38', '2025-39']
+    statements = []
+    migrated_db.set_trace_callback(statements.append)
+
+    analyzer.query_sale(migrated_db, history, '2025-39')
+
+    migrated_db.set_trace_callback(None)
+    lot_reads = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT') and migrations.LOTS_TABLE in sql]
+    # The sale's listings and sales, and the previous sale's sales
+    assert len(lot_reads) == 3
+    for sql in lot_reads:
+        plan = migrations.explain_query_plan(migrated_db, sql)
+        assert any(re.search(r"idx_lots_(listed|sold)_sale_key", detail) for detail in plan), plan
+        assert not lots_scans(plan)
@@ -0,0 +1,89 @@
+# Parse cache rebuild (user-006): the lot tables are cleared and rebuilt in one transaction.
+import os
+import shutil
+
+import pytest
+
+import storage
+import process_mombasa_data as processor
+from conftest import MOMBASA_DIR, make_lots
+
+def seed_database(conn, processor_paths):
+    """Two stored lots and a manifest entry for a workbook in the processor's input directory."""
+    processor.upsert_lots(conn, *make_lots([1, 2], prices=[2.5, None]))
+    (processor_paths / 'Mombasa' / 'GeneralReport (90).xlsx').write_bytes(b'')
+    conn.execute("""
+        INSERT INTO ingestion_manifest (content_hash, data_type, file_size, sheet_count, filename, status, records_inserted,
+                                        processor_version, first_seen, last_seen)
+        VALUES ('ab' || hex(randomblob(31)), ?, 0, 1, 'GeneralReport (90).xlsx', 'SUCCESS', 3, ?, '2025-10-01', '2025-10-01')
+    """, (processor.DATA_TYPE_SALE, processor.PROCESSOR_VERSION))
+    conn.commit()
+
+def failing_parse(*args, **kwargs):
+    raise RuntimeError("parse failed")
+
+def lot_count(db_file):
+    conn = storage.connect(db_file)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM auction_lots").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_failed_rebuild_leaves_the_tables_unchanged(lots_db, processor_paths, monkeypatch):
+    seed_database(lots_db, processor_paths)
+    monkeypatch.setattr(processor, 'pyarrow', object())
+    monkeypatch.setattr(processor, 'parse_structured_file', failing_parse)
+
+    with pytest.raises(RuntimeError):
+        processor.rebuild_from_parse_cache(lots_db)
+
+    assert not lots_db.in_transaction
+    assert lot_count(processor.DB_FILE) == 2
+
+def test_main_does_not_commit_a_failed_run(lots_db, processor_paths, monkeypatch):
+    seed_database(lots_db, processor_paths)
+    monkeypatch.setattr(processor, 'pyarrow', object())
+    monkeypatch.setattr(processor, 'parse_structured_file', failing_parse)
+
+    processor.main(['--rebuild-from-cache'])
+
+    assert lot_count(processor.DB_FILE) == 2
+
+def test_rebuild_from_cache_matches_the_ingested_rows(lots_db, processor_paths):
+    pytest.importorskip('pyarrow')
+    shutil.copy(f"{MOMBASA_DIR}/GeneralReport (90).xlsx", processor_paths / 'Mombasa')
+    processor.main([])
+    query = "SELECT sale_number, lot_number, price, listed, sold, outcome FROM auction_lots ORDER BY id"
+    ingested = lots_db.execute(query).fetchall()
+
+    processor.main(['--rebuild-from-cache'])
+
+    assert len(ingested) > 0
+    assert lots_db.execute(query).fetchall() == ingested
+
+def test_rebuild_is_aborted_when_an_entry_cannot_be_rebuilt(lots_db, processor_paths):
+    pytest.importorskip('pyarrow')
+    for filename in ['GeneralReport (87).xlsx', 'GeneralReport (90).xlsx']:
+        shutil.copy(f"{MOMBASA_DIR}/{filename}", processor_paths / 'Mombasa')
+    processor.main([])
+    query = "SELECT sale_number, lot_number, price, listed, sold, outcome FROM auction_lots ORDER BY id"
+    ingested = lots_db.execute(query).fetchall()
+    hashes = dict(lots_db.execute("SELECT filename, content_hash FROM ingestion_manifest").fetchall())
+
+    # Each entry still has its cache file or its workbook
+    (processor_paths / 'Mombasa' / 'GeneralReport (90).xlsx').unlink()
+    os.remove(processor.parse_cache_path(hashes['GeneralReport (87).xlsx'], processor.HEADER_KEYWORDS))
+    processor.main(['--rebuild-from-cache'])
+    assert lots_db.execute(query).fetchall() == ingested
+
+    # (87) now has neither: no entry is rebuilt and the stored rows are kept
+    (processor_paths / 'Mombasa' / 'GeneralReport (87).xlsx').unlink()
+    os.remove(processor.parse_cache_path(hashes['GeneralReport (87).xlsx'], processor.HEADER_KEYWORDS))
+    lots_db.execute("UPDATE auction_lots SET processed_timestamp = 'before rebuild'")
+    lots_db.commit()
+
+    processor.main(['--rebuild-from-cache'])
+
+    assert lots_db.execute(query).fetchall() == ingested
+    assert lots_db.execute("SELECT DISTINCT processed_timestamp FROM auction_lots").fetchall() == [('before rebuild',)]
+    assert set(lots_db.execute("SELECT status FROM ingestion_manifest").fetchall()) == {('SUCCESS',)}
@@ -0,0 +1,46 @@
+# report_json (user-024): NumPy-aware JSON output, with orjson or the standard json module.
+import datetime
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import report_json
+
+@pytest.fixture(params=['orjson', 'json'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(report_json, 'orjson', None)
+    return request.param
+
+def test_columns_round_trip(encoder):
+    df = pd.DataFrame({
+        'price': [2.5, np.nan, 3.0], 'count': np.array([1, 2, 3], dtype='int64'), 'sold': [True, False, True],
+        'grade': ['BP1', None, 'PF1'], 'weight': pd.array([60, None, 40], dtype='Int64'),
+    })
+    report = {'columns': {col: report_json.column_values(df[col]) for col in df.columns},
+              'codes': report_json.code_values(np.array([0, -1, 2], dtype='int8'))}
+
+    assert json.loads(report_json.dumps(report)) == {
+        'columns': {'price': [2.5, None, 3.0], 'count': [1, 2, 3], 'sold': [True, False, True],
+                    'grade': ['BP1', None, 'PF1'], 'weight': [60, None, 40]},
+        'codes': [0, None, 2],
+    }
+
+def test_values_without_a_json_type(encoder):
+    report = {'scalar': np.float64(1.5), 'integer': np.int32(7), 'array': np.array([[1, 2]]), 'missing': pd.NA,
+              'date': datetime.date(2025, 9, 29), 'key': {1: 'one'}}
+
+    assert json.loads(report_json.dumps(report)) == {
+        'scalar': 1.5, 'integer': 7, 'array': [[1, 2]], 'missing': None, 'date': '2025-09-29', 'key': {'1': 'one'}}
+
+def test_pretty_output_is_the_same_json(encoder):
+    report = {'kpis': {'AVG_PRICE': '$2.07'}, 'values': report_json.column_values(pd.Series([1.0, np.nan]))}
+
+    minified, pretty = report_json.dumps(report), report_json.dumps(report, pretty=True)
+
+    assert b'\n' not in minified and pretty.startswith(b'{\n  "')
+    assert json.loads(minified) == json.loads(pretty) == {'kpis': {'AVG_PRICE': '$2.07'}, 'values': [1.0, None]}
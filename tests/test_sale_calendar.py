@@ -0,0 +1,45 @@
+# Sale calendar (user-020): integer sale keys of the stored sale numbers and the calendar table.
+import pandas as pd
+import pytest
+
+import sale_calendar
+import process_mombasa_data as processor
+from conftest import make_lots
+
+@pytest.mark.parametrize('sale_number, sale_date, year, key', [
+    ('2025-39', None, None, (2025, 39)),
+    ('2025/7', None, None, (2025, 7)),
+    ('39', '2025-09-29', None, (2025, 39)),
+    ('39', '2025-09-29', 2024, (2025, 39)),
+    ('39', None, 2025, (2025, 39)),
+    ('39', None, None, None),
+    ('Sale 39', '2025-09-29', None, None),
+    (None, '2025-09-29', 2025, None),
+])
+def test_parse_sale_key(sale_number, sale_date, year, key):
+    assert sale_calendar.parse_sale_key(sale_number, sale_date, year) == key
+
+def test_bare_sale_number_without_a_date_takes_the_filename_year():
+    df = pd.DataFrame({'sale_number_internal': ['Sale 39 - M2']})
+
+    assert processor.determine_final_metadata('Catalogue 2025.xlsx', df) == ('2025-39', None)
+    assert processor.determine_final_metadata('Catalogue.xlsx', df) == ('39', None)
+
+def calendar(conn):
+    return conn.execute("SELECT year, sale_no, ordinal, sale_date FROM sale_calendar ORDER BY ordinal").fetchall()
+
+def test_register_sales_fills_or_replaces_dates(lots_db):
+    assert sale_calendar.register_sales(lots_db, [(2025, 39, None), (2024, 38, '2024-09-24')]) == 2
+    assert sale_calendar.register_sales(lots_db, [(2025, 39, '2025-09-29'), (2024, 38, '2024-09-23')]) == 0
+    assert calendar(lots_db) == [(2024, 38, 1, '2024-09-24'), (2025, 39, 2, '2025-09-29')]
+
+    sale_calendar.register_sales(lots_db, [(2024, 38, '2024-09-23'), (2025, 39, None)], replace_dates=True)
+
+    assert calendar(lots_db) == [(2024, 38, 1, '2024-09-23'), (2025, 39, 2, '2025-09-29')]
+
+def test_remove_unused_sales_keeps_sales_with_lots(lots_db):
+    processor.upsert_lots(lots_db, *make_lots([1, 2], prices=[2.5, None]))
+    sale_calendar.register_sales(lots_db, [(2025, 37, '2025-09-16'), (2025, 38, '2025-09-22')])
+
+    assert sale_calendar.remove_unused_sales(lots_db, 'auction_lots', [(2025, 38), (2025, 39)]) == 1
+    assert calendar(lots_db) == [(2025, 37, 1, '2025-09-16'), (2025, 39, 2, '2025-09-29')]
@@ -0,0 +1,109 @@
+# Shared SQLite access (user-010): connection pragmas, the connection pool and write transactions.
+import shutil
+import sqlite3
+
+import pytest
+
+import storage
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE items (name TEXT PRIMARY KEY)")
+    conn.close()
+    yield db_file
+    storage.close_pools()
+
+def names(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return [row[0] for row in conn.execute("SELECT name FROM items ORDER BY name")]
+    finally:
+        conn.close()
+
+def test_connect_uses_wal(db_file):
+    conn = storage.connect(db_file)
+
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ('wal',)
+    conn.close()
+
+def test_rollback_journal_database_stays_self_contained(db_file, tmp_path):
+    with storage.pooled_connection(db_file, storage.ROLLBACK_JOURNAL_PRAGMAS) as conn, storage.write_transaction(conn):
+        conn.execute("INSERT INTO items VALUES ('a')")
+
+    assert not (tmp_path / 'test.db-wal').exists()
+    with open(db_file, 'rb') as f:
+        # File format write/read versions: 1 for a rollback journal, 2 for WAL
+        assert f.read(20)[18:20] == b'\x01\x01'
+    assert names(db_file) == ['a']
+
+def test_pool_reuses_connections_of_the_same_pragmas(db_file):
+    with storage.pooled_connection(db_file) as conn:
+        pass
+    with storage.pooled_connection(db_file) as reused:
+        assert reused is conn
+    with storage.pooled_connection(db_file, storage.ROLLBACK_JOURNAL_PRAGMAS) as other:
+        assert other is not conn
+        assert other.execute("PRAGMA journal_mode").fetchone() == ('delete',)
+
+def test_pool_rolls_back_uncommitted_work(db_file):
+    with storage.pooled_connection(db_file) as conn:
+        conn.execute("INSERT INTO items VALUES ('a')")
+
+    assert names(db_file) == []
+
+def test_write_transaction_commits_or_rolls_back(db_file):
+    conn = storage.connect(db_file)
+    with storage.write_transaction(conn):
+        conn.execute("INSERT INTO items VALUES ('a')")
+    with pytest.raises(sqlite3.IntegrityError), storage.write_transaction(conn):
+        conn.execute("INSERT INTO items VALUES ('b')")
+        conn.execute("INSERT INTO items VALUES ('a')")
+
+    assert not conn.in_transaction
+    assert names(db_file) == ['a']
+    conn.close()
+
+def test_nested_write_transaction_is_a_savepoint(db_file):
+    conn = storage.connect(db_file)
+    with storage.write_transaction(conn):
+        conn.execute("INSERT INTO items VALUES ('a')")
+        with pytest.raises(RuntimeError), storage.write_transaction(conn):
+            conn.execute("INSERT INTO items VALUES ('b')")
+            raise RuntimeError("file failed")
+        with storage.write_transaction(conn):
+            conn.execute("INSERT INTO items VALUES ('c')")
+        assert conn.in_transaction
+
+    assert names(db_file) == ['a', 'c']
+    conn.close()
+
+def test_checkpoint_to_rollback_journal_folds_in_the_wal(db_file, tmp_path):
+    # A copy taken while a writer is open: its last commit is only in the -wal file
+    conn = storage.connect(db_file)
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    with storage.write_transaction(conn):
+        conn.execute("INSERT INTO items VALUES ('a')")
+    copy = str(tmp_path / 'copy.db')
+    shutil.copy(db_file, copy)
+    shutil.copy(db_file + '-wal', copy + '-wal')
+    conn.close()
+
+    storage.checkpoint_to_rollback_journal(copy)
+
+    assert not (tmp_path / 'copy.db-wal').exists()
+    with open(copy, 'rb') as f:
+        assert f.read(20)[18:20] == b'\x01\x01'
+    assert names(copy) == ['a']
+
+def test_checkpoint_to_rollback_journal_fails_while_the_database_is_open(db_file, monkeypatch):
+    monkeypatch.setattr(storage, 'BUSY_TIMEOUT_SECONDS', 0)
+    reader = storage.connect(db_file)
+    reader.execute("BEGIN")
+    reader.execute("SELECT * FROM items").fetchall()
+
+    with pytest.raises(sqlite3.OperationalError):
+        storage.checkpoint_to_rollback_journal(db_file)
+    reader.rollback()
+    reader.close()
@@ -0,0 +1,68 @@
+# Streaming ingestion (user-003): whole-file metadata reconciliation of the rows written chunk by chunk.
+from collections import Counter
+
+import pandas as pd
+
+import process_mombasa_data as processor
+from conftest import make_lots
+
+RUN = {'file_identifier': 'file-a', 'filename': 'GeneralReport (90).xlsx', 'timestamp': '2025-10-01T00:00:00'}
+
+def stream_run(conn, lot_numbers, prices, sale_number, sale_date):
+    """Writes a streamed file's rows under the first chunk's metadata, as process_structured_data_streaming() does."""
+    metadata = dict(RUN, sale_number=sale_number, sale_date=sale_date)
+    offers_df, sales_df = make_lots(lot_numbers, sale_number, sale_date, prices, source=RUN['file_identifier'], timestamp=RUN['timestamp'])
+    processor.upsert_lots(conn, offers_df, sales_df)
+    return metadata
+
+def whole_file_counts(sale_code, sale_date):
+    return {'sale_number_internal': Counter({sale_code: 10}), 'sale_date_internal': Counter({sale_date: 10})}
+
+def view_lots(conn, view, sale_number):
+    return pd.read_sql_query(f"SELECT lot_number, source_file_identifier FROM {view} WHERE sale_number = ? ORDER BY CAST(lot_number AS INTEGER)",
+                             conn, params=(sale_number,))
+
+def test_reconcile_moves_rows_to_the_whole_file_sale(lots_db):
+    metadata = stream_run(lots_db, [1, 2, 3], [2.5, None, 3.0], '39', '2025-09-29')
+
+    delta = processor.reconcile_streamed_metadata(lots_db, metadata, whole_file_counts('Sale 40 - M2', '2025-10-06'))
+
+    assert delta == 0
+    assert (metadata['sale_number'], metadata['sale_date']) == ('40', '2025-10-06')
+    rows = lots_db.execute("SELECT DISTINCT sale_number, sale_date, sale_year, sale_no FROM auction_lots").fetchall()
+    assert rows == [('40', '2025-10-06', 2025, 40)]
+
+def test_reconcile_merges_rows_whose_corrected_key_is_taken(lots_db):
+    # Another file already listed lots 1-3 of sale 40
+    offers_df, sales_df = make_lots([1, 2, 3], '40', '2025-10-06', source='file-b')
+    processor.upsert_lots(lots_db, offers_df, sales_df)
+    # The streamed file lists lots 2-5 (3 and 5 sold) under the first chunk's sale 39
+    metadata = stream_run(lots_db, [2, 3, 4, 5], [None, 3.0, None, 2.0], '39', '2025-10-06')
+
+    delta = processor.reconcile_streamed_metadata(lots_db, metadata, whole_file_counts('Sale 40 - M2', '2025-10-06'))
+
+    assert lots_db.execute("SELECT COUNT(*) FROM auction_lots WHERE sale_number = '39'").fetchone()[0] == 0
+    offers = view_lots(lots_db, 'auction_offers', '40')
+    assert offers['lot_number'].tolist() == ['1', '2', '3', '4', '5']
+    assert offers['source_file_identifier'].tolist() == ['file-b'] * 3 + ['file-a'] * 2
+    assert view_lots(lots_db, 'auction_sales', '40')['lot_number'].tolist() == ['3', '5']
+    # Lots 2 and 3 were counted as new listings (and 3 as a new sale); only the sale of lot 3 remains new
+    assert delta == -2
+
+def calendar(conn):
+    return conn.execute("SELECT year, sale_no, ordinal, sale_date FROM sale_calendar ORDER BY ordinal").fetchall()
+
+def test_reconcile_replaces_the_first_chunks_calendar_date(lots_db):
+    metadata = stream_run(lots_db, [1, 2, 3], [2.5, None, 3.0], '37', '2025-09-15')
+
+    processor.reconcile_streamed_metadata(lots_db, metadata, whole_file_counts('Sale 37 - M2', '2025-09-16'))
+
+    assert calendar(lots_db) == [(2025, 37, 1, '2025-09-16')]
+
+def test_reconcile_removes_the_first_chunks_sale_when_no_lot_is_left(lots_db):
+    processor.upsert_lots(lots_db, *make_lots([1], '41', '2025-10-13', source='file-b'))
+    metadata = stream_run(lots_db, [1, 2, 3], [2.5, None, 3.0], '39', '2025-09-29')
+
+    processor.reconcile_streamed_metadata(lots_db, metadata, whole_file_counts('Sale 40 - M2', '2025-10-06'))
+
+    assert calendar(lots_db) == [(2025, 40, 1, '2025-10-06'), (2025, 41, 2, '2025-10-13')]